@@ -12,6 +12,7 @@
 #  See the License for the specific language governing permissions and
 #  limitations under the License.
 CACHE_FOREVER_TIMEOUT = 86400 * 365
+CACHE_DOES_NOT_EXIST_TIMEOUT = 60
 #
 # from cachemodel.decorators import *
 # from cachemodel.managers import *
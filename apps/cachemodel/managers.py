@@ -1,15 +1,28 @@
+from django.conf import settings
 from django.core.cache import cache
 from django.db import models
-from cachemodel import CACHE_FOREVER_TIMEOUT
+from cachemodel import CACHE_FOREVER_TIMEOUT, CACHE_DOES_NOT_EXIST_TIMEOUT
 from cachemodel.utils import generate_cache_key
 
+# cached in place of an object that does not exist, until an object is published under the same key
+DOES_NOT_EXIST = '__cachemodel_does_not_exist__'
+
 
 class CacheModelManager(models.Manager):
     def get(self, **kwargs):
         key = generate_cache_key([self.model.__name__, "get"], **kwargs)
         obj = cache.get(key)
+        if obj == DOES_NOT_EXIST:
+            self._count_negative_hit()
+            raise self.model.DoesNotExist("%s matching query does not exist." % self.model._meta.object_name)
         if obj is None:
-            obj = super(CacheModelManager, self).get(**kwargs)
+            try:
+                obj = super(CacheModelManager, self).get(**kwargs)
+            except self.model.DoesNotExist:
+                # add, so an object published under the key while we were querying is not overwritten
+                cache.add(key, DOES_NOT_EXIST,
+                          getattr(settings, 'CACHEMODEL_DOES_NOT_EXIST_TIMEOUT', CACHE_DOES_NOT_EXIST_TIMEOUT))
+                raise
             cache.set(key, obj, CACHE_FOREVER_TIMEOUT)
 
             # update cache_key_index with obj.pk <- key
@@ -18,11 +31,26 @@ class CacheModelManager(models.Manager):
     def get_or_create(self, **kwargs):
         key = generate_cache_key([self.model.__name__, "get"], **kwargs)
         obj = cache.get(key)
-        if obj is None:
+        if obj is None or obj == DOES_NOT_EXIST:
             return super(CacheModelManager, self).get_or_create(**kwargs)
         else:
             return obj, False
 
+    def _negative_hits_key(self):
+        return generate_cache_key([self.model.__name__, "negative_hits"])
+
+    def _count_negative_hit(self):
+        key = self._negative_hits_key()
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            pass
+
+    def negative_hits(self):
+        """number of get() calls answered from the cached DoesNotExist results of this model"""
+        return cache.get(self._negative_hits_key(), 0)
+
     def get_by(self, *args, **kwargs):
         raise DeprecationWarning("get_by() has been deprecated, use .get() instead.")
         raise NotImplementedError
@@ -29,6 +29,9 @@ class DirectAwardBundleAdmin(admin.ModelAdmin):
     list_filter = ('created_at', 'badgeclass__issuer__faculty__institution__identifier')
     search_fields = ('badgeclass__name',)
 
+    def get_queryset(self, request):
+        return super(DirectAwardBundleAdmin, self).get_queryset(request).with_counts()
+
     def institution_identifier(self, obj):
         return obj.badgeclass.issuer.faculty.institution.identifier
 
@@ -1,21 +1,57 @@
-import threading
+from django.db import transaction
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
 from rest_framework.views import APIView
 from rest_framework import status
 from rest_framework.response import Response
 from drf_spectacular.utils import extend_schema, inline_serializer
-from directaward.models import DirectAward, DirectAwardBundle
+from directaward.models import DirectAward, DirectAwardBundle, BATCH_SIZE, delete_direct_awards, \
+    update_direct_awards
 from directaward.permissions import IsDirectAwardOwner
 from directaward.serializer import DirectAwardSerializer, DirectAwardBundleSerializer
 from entity.api import BaseEntityListView, BaseEntityDetailView, VersionedObjectMixin
 from mainsite import settings
 from mainsite.exceptions import BadgrValidationError, BadgrValidationFieldError, BadgrApiException400
 from mainsite.permissions import AuthenticatedWithVerifiedEmail
-from mainsite.utils import EmailMessageMaker, send_mail
+from mainsite.models import QueuedEmail
+from mainsite.outbox import queued_email
+from mainsite.pagination import EncryptedCursorPagination
+from mainsite.renderers import stream_json
+from mainsite.utils import EmailMessageMaker
 from staff.permissions import HasObjectPermission
 from rest_framework import serializers
 import datetime
 
 
+def direct_award_entity_ids(direct_awards):
+    """The distinct entity_ids of the direct_awards of a bulk request, which must be a list of objects with one"""
+    if not isinstance(direct_awards, list) or \
+            not all(isinstance(direct_award, dict) and isinstance(direct_award.get('entity_id'), str)
+                    for direct_award in direct_awards):
+        raise BadgrValidationFieldError('direct_awards', "Each direct award must have an entity_id", 999)
+    return {direct_award['entity_id'] for direct_award in direct_awards}
+
+
+def load_direct_awards(request, direct_awards):
+    """
+    Loads the referenced direct awards with one query and checks the may_award permission of the user once per
+    badgeclass, instead of once per direct award
+    """
+    entity_ids = direct_award_entity_ids(direct_awards)
+    loaded = []
+    for offset in range(0, len(entity_ids), BATCH_SIZE):
+        loaded += DirectAward.objects \
+            .filter(entity_id__in=list(entity_ids)[offset:offset + BATCH_SIZE]) \
+            .select_related('badgeclass')
+    if len(loaded) != len(entity_ids):
+        raise Http404
+    badgeclasses = {direct_award.badgeclass_id: direct_award.badgeclass for direct_award in loaded}
+    for badgeclass in badgeclasses.values():
+        if not badgeclass.get_permissions(request.user)['may_award']:
+            raise BadgrApiException400("You do not have permission", 100)
+    return loaded
+
+
 class DirectAwardBundleList(VersionedObjectMixin, BaseEntityListView):
     permission_classes = (AuthenticatedWithVerifiedEmail,)  # permissioned in serializer
     v1_serializer_class = DirectAwardBundleSerializer
@@ -28,7 +64,18 @@ class DirectAwardBundleView(APIView):
     permission_map = {'POST': 'may_award'}
 
     def get(self, request, **kwargs):
-        award_bundle = DirectAwardBundle.objects.get(entity_id=kwargs.get("entity_id"))
+        """
+        The bundle with its direct awards and badge assertions. With ?page=direct_awards or ?page=badge_assertions
+        only that list is returned, cursor paginated with ?cursor and ?page_size. With ?stream=true the whole bundle is
+        streamed.
+        """
+        award_bundle = DirectAwardBundle.objects.with_counts().select_related('badgeclass') \
+            .get(entity_id=kwargs.get("entity_id"))
+        direct_awards = award_bundle.directaward_set \
+            .only('pk', 'recipient_email', 'eppn', 'status', 'entity_id').order_by('pk')
+        badge_assertions = award_bundle.badgeinstance_set.select_related('user') \
+            .only('pk', 'public', 'revoked', 'entity_id', 'user__first_name', 'user__last_name', 'user__email') \
+            .order_by('pk')
 
         def convert_direct_award(direct_award):
             return {
@@ -47,6 +94,24 @@ class DirectAwardBundleView(APIView):
                 "entity_id": badge_instance.entity_id
             }
 
+        lists = {
+            "direct_awards": (direct_awards, convert_direct_award),
+            "badge_assertions": (badge_assertions, convert_badge_assertion),
+        }
+        page = request.query_params.get('page')
+        if page:
+            if page not in lists:
+                raise BadgrValidationFieldError('page', f"Must be one of {', '.join(lists)}", 999)
+            queryset, convert = lists[page]
+            paginator = EncryptedCursorPagination()
+            page_size = request.query_params.get('page_size')
+            if page_size:
+                if not page_size.isdigit() or not 0 < int(page_size) <= BATCH_SIZE:
+                    raise BadgrValidationFieldError('page_size', f"Must be between 1 and {BATCH_SIZE}", 999)
+                paginator.page_size = int(page_size)
+            return paginator.get_paginated_response([convert(item) for item in
+                                                     paginator.paginate_queryset(queryset, request, view=self)])
+
         results = {
             "initial_total": award_bundle.initial_total,
             "status": award_bundle.status,
@@ -57,10 +122,13 @@ class DirectAwardBundleView(APIView):
             "direct_award_scheduled_count": award_bundle.direct_award_scheduled_count,
             "direct_award_deleted_count": award_bundle.direct_award_deleted_count,
             "direct_award_revoked_count": award_bundle.direct_award_revoked_count,
-            "direct_awards": [convert_direct_award(da) for da in award_bundle.directaward_set.all()],
-            "badge_assertions": [convert_badge_assertion(ba) for ba in award_bundle.badgeinstance_set.all()]
         }
-
+        if request.query_params.get('stream') == 'true':
+            return StreamingHttpResponse(stream_json(results, {
+                name: map(convert, queryset.iterator(chunk_size=BATCH_SIZE))
+                for name, (queryset, convert) in lists.items()}), content_type='application/json')
+        for name, (queryset, convert) in lists.items():
+            results[name] = [convert(item) for item in queryset]
         return Response(results, status=status.HTTP_200_OK)
 
 
@@ -96,15 +164,10 @@ class DirectAwardRevoke(BaseEntityDetailView):
             raise BadgrValidationFieldError('revocation_reason', "This field is required", 999)
         if not direct_awards:
             raise BadgrValidationFieldError('direct_awards', "This field is required", 999)
-        for direct_award in direct_awards:
-            direct_award = DirectAward.objects.get(entity_id=direct_award['entity_id'])
-            if direct_award.get_permissions(request.user)['may_award']:
-                direct_award.revoke(revocation_reason)
-                direct_award.bundle.remove_cached_data(['cached_direct_awards'])
-                direct_award.badgeclass.remove_cached_data(['cached_direct_awards'])
-                direct_award.badgeclass.remove_cached_data(['cached_direct_award_bundles'])
-            else:
-                raise BadgrApiException400("You do not have permission", 100)
+        direct_awards = load_direct_awards(request, direct_awards)
+        if any(direct_award.status == DirectAward.STATUS_REVOKED for direct_award in direct_awards):
+            raise BadgrValidationError("DirectAward is already revoked", 999)
+        update_direct_awards(direct_awards, status=DirectAward.STATUS_REVOKED, revocation_reason=revocation_reason)
         return Response({"result": "ok"}, status=status.HTTP_200_OK)
 
 
@@ -133,24 +196,10 @@ class DirectAwardResend(BaseEntityDetailView):
         direct_awards = request.data.get('direct_awards', None)
         if not direct_awards:
             raise BadgrValidationFieldError('direct_awards', "This field is required", 999)
-        successful_direct_awards = []
-        for direct_award in direct_awards:
-            direct_award = DirectAward.objects.get(entity_id=direct_award['entity_id'])
-            direct_award.resend_at = datetime.datetime.now()
-            direct_award.save()
-            direct_award.badgeclass.remove_cached_data(['cached_direct_awards'])
-            direct_award.bundle.remove_cached_data(['cached_direct_awards'])
-            if direct_award.get_permissions(request.user)['may_award']:
-                successful_direct_awards.append(direct_award)
-            else:
-                raise BadgrApiException400("You do not have permission", 100)
-
-        def send_mail(awards):
-            for da in awards:
-                da.notify_recipient()
-
-        thread = threading.Thread(target=send_mail, args=(successful_direct_awards,))
-        thread.start()
+        direct_awards = load_direct_awards(request, direct_awards)
+        with transaction.atomic():
+            update_direct_awards(direct_awards, resend_at=timezone.now(), warning_email_send=False)
+            DirectAward.queue_notifications(direct_awards)
 
         return Response({"result": "ok"}, status=status.HTTP_200_OK)
 
@@ -189,6 +238,51 @@ class DirectAwardAccept(BaseEntityDetailView):
         raise BadgrValidationError('Neither accepted or rejected the direct award', 999)
 
 
+class DirectAwardAcceptMany(APIView):
+    permission_classes = (AuthenticatedWithVerifiedEmail,)
+    http_method_names = ['post']
+
+    @extend_schema(
+        request=inline_serializer(
+            name="DirectAwardAcceptManySerializer",
+            fields={
+                "direct_awards": serializers.ListField(
+                    child=inline_serializer(
+                        name='NestedInlineAcceptSerializer',
+                        fields={
+                            'entity_id': serializers.CharField(),
+                        },
+                        allow_null=False,
+                    )
+                )
+            },
+        ),
+    )
+    def post(self, request, **kwargs):
+        """
+        Accept multiple unaccepted direct awards of the user at once
+        """
+        direct_awards = request.data.get('direct_awards', None)
+        if not direct_awards:
+            raise BadgrValidationFieldError('direct_awards', "This field is required", 999)
+        entity_ids = direct_award_entity_ids(direct_awards)
+        direct_awards = list(DirectAward.objects
+                             .filter(entity_id__in=entity_ids, eppn__in=request.user.eppns,
+                                     status=DirectAward.STATUS_UNACCEPTED)
+                             .select_related('badgeclass', 'bundle', 'created_by'))
+        if len(direct_awards) != len(entity_ids):
+            raise Http404
+        badgeclasses = {direct_award.badgeclass_id: direct_award.badgeclass for direct_award in direct_awards}
+        for badgeclass in badgeclasses.values():
+            if not badgeclass.terms_accepted(request.user):
+                raise BadgrValidationError("Cannot accept direct award, must accept badgeclass terms first", 999)
+        with transaction.atomic():
+            assertions = DirectAward.award_many(direct_awards, request.user)
+            delete_direct_awards(direct_awards)
+        return Response({'entity_ids': [assertion.entity_id for assertion in assertions]},
+                        status=status.HTTP_201_CREATED)
+
+
 class DirectAwardDelete(BaseEntityDetailView):
     permission_classes = (AuthenticatedWithVerifiedEmail,)
     http_method_names = ['put']
@@ -216,22 +310,15 @@ class DirectAwardDelete(BaseEntityDetailView):
         revocation_reason = request.data.get('revocation_reason', None)
         if not direct_awards:
             raise BadgrValidationFieldError('direct_awards', "This field is required", 999)
-        delete_at = datetime.datetime.utcnow() + datetime.timedelta(days=settings.DIRECT_AWARDS_DELETION_THRESHOLD_DAYS)
-        for direct_award in direct_awards:
-            direct_award = DirectAward.objects.get(entity_id=direct_award['entity_id'])
-            if direct_award.get_permissions(request.user)['may_award']:
-                direct_award.delete_at = delete_at
-                direct_award.status = DirectAward.STATUS_DELETED
-                direct_award.revocation_reason = revocation_reason
-                direct_award.save()
-                direct_award.badgeclass.remove_cached_data(['cached_direct_awards'])
-                direct_award.bundle.remove_cached_data(['cached_direct_awards'])
-                html_message = EmailMessageMaker.create_direct_award_deleted_email(direct_award)
-                send_mail(subject='Awarded eduBadge has been deleted',
-                          message=None,
-                          html_message=html_message,
-                          recipient_list=[direct_award.recipient_email])
-
-            else:
-                raise BadgrApiException400("You do not have permission", 100)
+        delete_at = timezone.now() + datetime.timedelta(days=settings.DIRECT_AWARDS_DELETION_THRESHOLD_DAYS)
+        direct_awards = load_direct_awards(request, direct_awards)
+        with transaction.atomic():
+            update_direct_awards(direct_awards, delete_at=delete_at, status=DirectAward.STATUS_DELETED,
+                                 revocation_reason=revocation_reason)
+            QueuedEmail.objects.bulk_create([
+                queued_email(subject='Awarded eduBadge has been deleted',
+                             message=None,
+                             html_message=EmailMessageMaker.create_direct_award_deleted_email(direct_award),
+                             recipient_list=[direct_award.recipient_email])
+                for direct_award in direct_awards], batch_size=BATCH_SIZE)
         return Response({"result": "ok"}, status=status.HTTP_200_OK)
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.24 on 2026-10-19 15:02
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('directaward', '0016_directaward_grade_achieved'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='directaward',
+            index_together={('status', 'created_at'), ('badgeclass', 'status'), ('badgeclass', 'created_at'),
+                            ('updated_at',)},
+        ),
+    ]
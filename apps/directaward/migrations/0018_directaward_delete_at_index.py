@@ -0,0 +1,18 @@
+# Generated by Django 3.2.24 on 2026-10-19 16:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('directaward', '0017_insights_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='directaward',
+            index_together={('status', 'created_at'), ('badgeclass', 'status'), ('badgeclass', 'created_at'),
+                            ('updated_at',), ('status', 'delete_at')},
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.24 on 2026-10-19 17:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('directaward', '0018_directaward_delete_at_index'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='directaward',
+            index_together={('status', 'created_at'), ('badgeclass', 'status'), ('badgeclass', 'created_at'),
+                            ('updated_at',), ('status', 'delete_at'), ('status', 'resend_at')},
+        ),
+    ]
@@ -1,15 +1,21 @@
 import urllib
 
 from django.conf import settings
-from django.db import models, IntegrityError
+from django.db import models, transaction, IntegrityError
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from django.utils.html import strip_tags
 
 from cachemodel.decorators import cached_method
 from cachemodel.models import CacheModel
 from entity.models import BaseVersionedEntity
 from mainsite.exceptions import BadgrValidationError
-from mainsite.models import BaseAuditedModel, EmailBlacklist
-from mainsite.utils import send_mail, EmailMessageMaker
+from mainsite.models import BaseAuditedModel, EmailBlacklist, QueuedEmail
+from mainsite.outbox import queue_mail, queued_email
+from mainsite.utils import send_mail, EmailMessageMaker, generate_entity_uri
+
+BATCH_SIZE = 1000
 
 
 class DirectAward(BaseAuditedModel, BaseVersionedEntity, CacheModel):
@@ -43,6 +49,16 @@ class DirectAward(BaseAuditedModel, BaseVersionedEntity, CacheModel):
     resend_at = models.DateTimeField(blank=True, null=True, default=None)
     delete_at = models.DateTimeField(blank=True, null=True, default=None)
 
+    class Meta:
+        index_together = (
+            ('status', 'created_at'),
+            ('badgeclass', 'status'),
+            ('badgeclass', 'created_at'),
+            ('updated_at',),
+            ('status', 'delete_at'),
+            ('status', 'resend_at'),
+        )
+
     def validate_unique(self, exclude=None):
         if self.__class__.objects \
                 .filter(eppn=self.eppn, badgeclass=self.badgeclass, status='Unaccepted') \
@@ -53,8 +69,29 @@ class DirectAward(BaseAuditedModel, BaseVersionedEntity, CacheModel):
         return super(DirectAward, self).validate_unique(exclude=exclude)
 
     def save(self, *args, **kwargs):
+        from insights.rollups import DIRECT_AWARDS, mark_bucket_dirty
         self.validate_unique()
-        return super(DirectAward, self).save(*args, **kwargs)
+        result = super(DirectAward, self).save(*args, **kwargs)
+        mark_bucket_dirty(DIRECT_AWARDS, self.badgeclass_id, self.created_at)
+        return result
+
+    def delete(self, *args, **kwargs):
+        from insights.rollups import DIRECT_AWARDS, mark_bucket_dirty
+        result = super(DirectAward, self).delete(*args, **kwargs)
+        mark_bucket_dirty(DIRECT_AWARDS, self.badgeclass_id, self.created_at)
+        return result
+
+    @staticmethod
+    def unaccepted_eppns(badgeclass_id, eppns):
+        """The lowercased eppns that have an unaccepted direct award of the badgeclass, with one query per batch"""
+        eppns = list(set(eppns))
+        unaccepted = set()
+        for offset in range(0, len(eppns), BATCH_SIZE):
+            unaccepted.update(eppn.lower() for eppn in DirectAward.objects
+                              .filter(badgeclass_id=badgeclass_id, status=DirectAward.STATUS_UNACCEPTED,
+                                      eppn__in=eppns[offset:offset + BATCH_SIZE])
+                              .values_list('eppn', flat=True))
+        return unaccepted
 
     def revoke(self, revocation_reason):
         if self.status == DirectAward.STATUS_REVOKED:
@@ -65,24 +102,23 @@ class DirectAward(BaseAuditedModel, BaseVersionedEntity, CacheModel):
         self.revocation_reason = revocation_reason
         self.save()
 
-    def award(self, recipient):
-        """Accept the direct award and make an assertion out of it"""
-        from issuer.models import BadgeInstance
+    def check_eligibility(self, recipient):
+        """Raises when the recipient may not accept this direct award"""
         if self.eppn not in recipient.eppns:
             raise BadgrValidationError('Cannot award, eppn does not match', 999)
-
-        institution = self.badgeclass.institution
-        identifiers = [inst.identifier for inst in self.badgeclass.award_allowed_institutions.all()] + [
-            institution.identifier]
-        if institution.alternative_identifier:
-            identifiers.append(institution.alternative_identifier)
+        eligibility = self.badgeclass.cached_award_eligibility()
         schac_homes = recipient.schac_homes
-        if self.badgeclass.formal:
-            allowed = institution.identifier in schac_homes or institution.alternative_identifier in schac_homes
+        if eligibility['formal']:
+            allowed = any(identifier in schac_homes for identifier in eligibility['institution_identifiers'])
         else:
-            allowed = any(identifier in schac_homes for identifier in identifiers) or recipient.validated_name
+            allowed = any(identifier in schac_homes for identifier in eligibility['identifiers']) \
+                      or recipient.validated_name
         if not allowed:
             raise BadgrValidationError('Cannot award, you are not a member of the institution of the badgeclass', 999)
+
+    def issue(self, recipient):
+        """Make an assertion out of the direct award, without any checks"""
+        from issuer.models import BadgeInstance
         evidence = None
         if self.evidence_url or self.narrative:
             evidence = [{
@@ -91,21 +127,42 @@ class DirectAward(BaseAuditedModel, BaseVersionedEntity, CacheModel):
                 'description': self.description,
                 'name': self.name
             }]
-        assertion = self.badgeclass.issue(recipient=recipient,
-                                          created_by=self.created_by,
-                                          acceptance=BadgeInstance.ACCEPTANCE_ACCEPTED,
-                                          recipient_type=BadgeInstance.RECIPIENT_TYPE_EDUID,
-                                          send_email=False,
-                                          issued_on=self.created_at,
-                                          award_type=BadgeInstance.AWARD_TYPE_DIRECT_AWARD,
-                                          direct_award_bundle=self.bundle,
-                                          evidence=evidence,
-                                          include_evidence=evidence is not None,
-                                          grade_achieved=self.grade_achieved,)
-        # delete any pending enrollments for this badgeclass and user
-        recipient.cached_pending_enrollments().filter(badge_class=self.badgeclass).delete()
+        return self.badgeclass.issue(recipient=recipient,
+                                     created_by=self.created_by,
+                                     acceptance=BadgeInstance.ACCEPTANCE_ACCEPTED,
+                                     recipient_type=BadgeInstance.RECIPIENT_TYPE_EDUID,
+                                     send_email=False,
+                                     issued_on=self.created_at,
+                                     award_type=BadgeInstance.AWARD_TYPE_DIRECT_AWARD,
+                                     direct_award_bundle=self.bundle,
+                                     evidence=evidence,
+                                     include_evidence=evidence is not None,
+                                     grade_achieved=self.grade_achieved,)
+
+    def award(self, recipient):
+        """Accept the direct award and make an assertion out of it"""
+        return DirectAward.award_many([self], recipient)[0]
+
+    @staticmethod
+    def award_many(direct_awards, recipient):
+        """
+        Accept the direct awards and make assertions out of them, all or none. The pending enrollments of the recipient
+        for the badgeclasses are deleted at once. Returns the assertions in the order of the direct awards.
+        """
+        from insights.rollups import ENROLLMENTS, mark_buckets_dirty
+        from lti_edu.models import StudentsEnrolled
+        for direct_award in direct_awards:
+            direct_award.check_eligibility(recipient)
+        with transaction.atomic():
+            assertions = [direct_award.issue(recipient) for direct_award in direct_awards]
+            # delete any pending enrollments for these badgeclasses and user
+            pending_enrollments = StudentsEnrolled.objects \
+                .filter(user=recipient, badge_instance=None,
+                        badge_class_id__in={direct_award.badgeclass_id for direct_award in direct_awards})
+            mark_buckets_dirty(ENROLLMENTS, pending_enrollments)
+            pending_enrollments.delete()
         recipient.remove_cached_data(['cached_pending_enrollments'])
-        return assertion
+        return assertions
 
     def get_permissions(self, user):
         """
@@ -115,14 +172,135 @@ class DirectAward(BaseAuditedModel, BaseVersionedEntity, CacheModel):
         return self.badgeclass.get_permissions(user)
 
     def notify_recipient(self):
-        html_message = EmailMessageMaker.create_direct_award_student_mail(self)
-        try:
-            EmailBlacklist.objects.get(email=self.recipient_email)
-        except EmailBlacklist.DoesNotExist:
-            # Allow sending, as this email is not blacklisted.
-            plain_text = strip_tags(html_message)
-            send_mail(subject='Je hebt een edubadge ontvangen. You received an edubadge. Claim it now!',
-                      message=plain_text, html_message=html_message, recipient_list=[self.recipient_email])
+        DirectAward.queue_notifications([self])
+
+    @staticmethod
+    def queue_notifications(direct_awards, subject=None, mail_maker=None):
+        """
+        Adds the mails to the recipients of the direct awards to the outbox, except for blacklisted emails.
+        The mail is rendered once per badgeclass and all mails are inserted at once. Without a subject and mail_maker
+        this is the mail that the badge was awarded.
+        """
+        subject = subject or 'Je hebt een edubadge ontvangen. You received an edubadge. Claim it now!'
+        mail_maker = mail_maker or EmailMessageMaker.create_direct_award_student_mail
+        emails = [direct_award.recipient_email for direct_award in direct_awards]
+        blacklisted = set()
+        for offset in range(0, len(emails), BATCH_SIZE):
+            blacklisted.update(email.lower() for email in EmailBlacklist.objects
+                               .filter(email__in=emails[offset:offset + BATCH_SIZE])
+                               .values_list('email', flat=True))
+        html_messages = {}
+        queued_emails = []
+        for direct_award in direct_awards:
+            if direct_award.recipient_email.lower() in blacklisted:
+                continue
+            html_message = html_messages.get(direct_award.badgeclass_id)
+            if html_message is None:
+                html_message = html_messages[direct_award.badgeclass_id] = mail_maker(direct_award)
+            queued_emails.append(queued_email(subject=subject, message=strip_tags(html_message),
+                                              html_message=html_message,
+                                              recipient_list=[direct_award.recipient_email]))
+        QueuedEmail.objects.bulk_create(queued_emails, batch_size=BATCH_SIZE)
+
+
+def remove_direct_award_caches(badgeclass_ids, bundle_ids):
+    """
+    Removes the cached direct awards once per badgeclass and bundle after a bulk change, when the current transaction
+    commits.
+    """
+    from issuer.models import BadgeClass
+    badgeclass_ids = set(badgeclass_ids)
+    bundle_ids = set(bundle_ids) - {None}
+
+    def _remove():
+        for badgeclass_id in badgeclass_ids:
+            BadgeClass(pk=badgeclass_id).remove_cached_data(['cached_direct_awards', 'cached_direct_award_bundles'])
+        for bundle_id in bundle_ids:
+            DirectAwardBundle(pk=bundle_id).remove_cached_data(['cached_direct_awards'])
+
+    transaction.on_commit(_remove)
+
+
+def mark_direct_award_rollups(direct_awards):
+    """Marks the insights rollups dirty for direct awards changed in bulk, once per badgeclass and month"""
+    from insights.rollups import DIRECT_AWARDS, mark_bucket_dirty
+    buckets = {}
+    for direct_award in direct_awards:
+        created_at = timezone.localtime(direct_award.created_at)
+        buckets[(direct_award.badgeclass_id, created_at.year, created_at.month)] = created_at
+    for (badgeclass_id, _, _), created_at in buckets.items():
+        mark_bucket_dirty(DIRECT_AWARDS, badgeclass_id, created_at)
+
+
+def update_direct_awards(direct_awards, **values):
+    """
+    Updates the direct awards in bulk, removes the cached direct awards and the caches of their badgeclasses and
+    bundles once
+    """
+    from django.core.cache import cache
+    values['updated_at'] = timezone.now()
+    with transaction.atomic():
+        pks = [direct_award.pk for direct_award in direct_awards]
+        for offset in range(0, len(pks), BATCH_SIZE):
+            DirectAward.objects.filter(pk__in=pks[offset:offset + BATCH_SIZE]).update(**values)
+        for direct_award in direct_awards:
+            for field, value in values.items():
+                setattr(direct_award, field, value)
+        keys = [direct_award.publish_key(field) for direct_award in direct_awards for field in ('pk', 'entity_id')]
+        transaction.on_commit(lambda: cache.delete_many(keys))
+        mark_direct_award_rollups(direct_awards)
+        remove_direct_award_caches([direct_award.badgeclass_id for direct_award in direct_awards],
+                                   [direct_award.bundle_id for direct_award in direct_awards])
+
+
+def delete_direct_awards(direct_awards):
+    """
+    Deletes the direct awards in bulk, removes the cached direct awards and the caches of their badgeclasses and
+    bundles once
+    """
+    from django.core.cache import cache
+    with transaction.atomic():
+        pks = [direct_award.pk for direct_award in direct_awards]
+        for offset in range(0, len(pks), BATCH_SIZE):
+            DirectAward.objects.filter(pk__in=pks[offset:offset + BATCH_SIZE]).delete()
+        keys = [direct_award.publish_key(field) for direct_award in direct_awards for field in ('pk', 'entity_id')]
+        transaction.on_commit(lambda: cache.delete_many(keys))
+        mark_direct_award_rollups(direct_awards)
+        remove_direct_award_caches([direct_award.badgeclass_id for direct_award in direct_awards],
+                                   [direct_award.bundle_id for direct_award in direct_awards])
+
+
+COUNTED_FIELDS = ('counted_assertions', 'counted_revoked_assertions', 'counted_unaccepted', 'counted_rejected',
+                  'counted_scheduled', 'counted_deleted', 'counted_revoked')
+
+
+class DirectAwardBundleQuerySet(models.QuerySet):
+
+    def with_counts(self):
+        """
+        Annotates the counters of the bundles in the same query. The direct awards are counted per status with
+        conditional aggregation, the assertions with a subquery each so the joins do not multiply the counts.
+        """
+        from issuer.models import BadgeInstance
+
+        def assertions(revoked):
+            return Coalesce(Subquery(BadgeInstance.objects
+                                     .filter(direct_award_bundle=OuterRef('pk'), revoked=revoked)
+                                     .order_by()
+                                     .values('direct_award_bundle')
+                                     .annotate(count=Count('pk'))
+                                     .values('count')), 0)
+
+        def direct_awards(status):
+            return Count('directaward', filter=Q(directaward__status=status))
+
+        return self.annotate(counted_assertions=assertions(False),
+                             counted_revoked_assertions=assertions(True),
+                             counted_unaccepted=direct_awards(DirectAward.STATUS_UNACCEPTED),
+                             counted_rejected=direct_awards(DirectAward.STATUS_REJECTED),
+                             counted_scheduled=direct_awards(DirectAward.STATUS_SCHEDULED),
+                             counted_deleted=direct_awards(DirectAward.STATUS_DELETED),
+                             counted_revoked=direct_awards(DirectAward.STATUS_REVOKED))
 
 
 class DirectAwardBundle(BaseAuditedModel, BaseVersionedEntity, CacheModel):
@@ -142,32 +320,100 @@ class DirectAwardBundle(BaseAuditedModel, BaseVersionedEntity, CacheModel):
     status = models.CharField(max_length=254, choices=STATUS_CHOICES, default=STATUS_ACTIVE)
     scheduled_at = models.DateTimeField(blank=True, null=True, default=None)
 
+    objects = DirectAwardBundleQuerySet.as_manager()
+
+    def create_direct_awards(self, direct_awards, status):
+        """
+        Creates the direct awards of the bundle with bulk inserts. Like validate_unique, rows with the eppn of an
+        unaccepted direct award of the badgeclass are skipped, which are found with one query per batch of rows.
+        Returns the created direct awards and the result of every row.
+        """
+        unaccepted = DirectAward.unaccepted_eppns(self.badgeclass_id,
+                                                  [direct_award['eppn'] for direct_award in direct_awards])
+        created, results = [], []
+        for direct_award in direct_awards:
+            eppn = direct_award['eppn']
+            result = {'eppn': eppn, 'recipient_email': direct_award.get('recipient_email')}
+            if eppn.lower() in unaccepted:
+                results.append({**result, 'result': 'skipped',
+                                'reason': 'DirectAward with this eppn and status Unaccepted already exists'})
+                continue
+            new_direct_award = DirectAward(**{**direct_award, 'bundle': self, 'badgeclass': self.badgeclass,
+                                              'status': status, 'entity_id': generate_entity_uri()})
+            if status == DirectAward.STATUS_UNACCEPTED:
+                unaccepted.add(eppn.lower())
+            created.append(new_direct_award)
+            results.append({**result, 'result': 'created', 'entity_id': new_direct_award.entity_id})
+        DirectAward.objects.bulk_create(created, batch_size=BATCH_SIZE)
+        if created:
+            from insights.rollups import DIRECT_AWARDS, mark_bucket_dirty
+            mark_bucket_dirty(DIRECT_AWARDS, self.badgeclass_id, timezone.now())
+        return created, results
+
+    def award_scheduled(self):
+        """
+        Activates the scheduled direct awards of the bundle with bulk updates and queues the notifications. Like
+        validate_unique, direct awards for an eppn with an unaccepted direct award of the badgeclass stay scheduled.
+        Returns the activated direct awards.
+        """
+        scheduled = list(self.directaward_set.filter(status=DirectAward.STATUS_SCHEDULED).order_by('pk'))
+        unaccepted = DirectAward.unaccepted_eppns(self.badgeclass_id, [da.eppn for da in scheduled])
+        activated = []
+        for direct_award in scheduled:
+            if direct_award.eppn.lower() in unaccepted:
+                continue
+            unaccepted.add(direct_award.eppn.lower())
+            activated.append(direct_award)
+        update_direct_awards(activated, status=DirectAward.STATUS_UNACCEPTED)
+        self.status = DirectAwardBundle.STATUS_ACTIVE
+        self.scheduled_at = None
+        self.save()
+        self.clear_counts()
+        DirectAward.queue_notifications(activated)
+        self.notify_awarder()
+        return activated
+
+    @property
+    def counts(self):
+        """
+        The counters of with_counts, queried once when the bundle was not loaded with them. The counters are those of
+        the moment the bundle was loaded or first counted, changes to its direct awards and assertions are only seen
+        after clear_counts.
+        """
+        if not hasattr(self, 'counted_assertions'):
+            counted = DirectAwardBundle.objects.filter(pk=self.pk).with_counts().values(*COUNTED_FIELDS).get()
+            for field, value in counted.items():
+                setattr(self, field, value)
+        return {field: getattr(self, field) for field in COUNTED_FIELDS}
+
+    def clear_counts(self):
+        """Forgets the counters, so they are queried again on the next use"""
+        for field in COUNTED_FIELDS:
+            self.__dict__.pop(field, None)
+
     @property
     def assertion_count(self):
-        from issuer.models import BadgeInstance
-        return BadgeInstance.objects.filter(direct_award_bundle=self, revoked=False).count()
+        return self.counts['counted_assertions']
 
     @property
     def direct_award_count(self):
-        return DirectAward.objects.filter(bundle=self, status='Unaccepted').count()
+        return self.counts['counted_unaccepted']
 
     @property
     def direct_award_rejected_count(self):
-        return DirectAward.objects.filter(bundle=self, status='Rejected').count()
+        return self.counts['counted_rejected']
 
     @property
     def direct_award_scheduled_count(self):
-        return DirectAward.objects.filter(bundle=self, status='Scheduled').count()
+        return self.counts['counted_scheduled']
 
     @property
     def direct_award_deleted_count(self):
-        return DirectAward.objects.filter(bundle=self, status='Deleted').count()
+        return self.counts['counted_deleted']
 
     @property
     def direct_award_revoked_count(self):
-        from issuer.models import BadgeInstance
-        revoked_count = BadgeInstance.objects.filter(direct_award_bundle=self, revoked=True).count()
-        return revoked_count + DirectAward.objects.filter(bundle=self, status='Revoked').count()
+        return self.counts['counted_revoked_assertions'] + self.counts['counted_revoked']
 
     @property
     def url(self):
@@ -191,10 +437,10 @@ class DirectAwardBundle(BaseAuditedModel, BaseVersionedEntity, CacheModel):
     def notify_awarder(self):
         html_message = EmailMessageMaker.create_direct_award_bundle_mail(self)
         plain_text = strip_tags(html_message)
-        send_mail(subject='You have awarded Edubadges!',
-                  message=plain_text, html_message=html_message, recipient_list=[self.created_by.email])
+        queue_mail(subject='You have awarded Edubadges!',
+                   message=plain_text, html_message=html_message, recipient_list=[self.created_by.email])
 
     def notify_awarder_for_scheduled(self):
         html_message = EmailMessageMaker.create_scheduled_direct_award_bundle_mail(self)
-        send_mail(subject='You have scheduled to award Edubadges!',
-                  message=None, html_message=html_message, recipient_list=[self.created_by.email])
+        queue_mail(subject='You have scheduled to award Edubadges!',
+                   message=None, html_message=html_message, recipient_list=[self.created_by.email])
@@ -1,6 +1,4 @@
-import threading
-
-from django.db import IntegrityError, transaction
+from django.db import transaction
 from rest_framework import serializers
 
 from directaward.models import DirectAward, DirectAwardBundle
@@ -41,6 +39,11 @@ class DirectAwardBundleSerializer(serializers.Serializer):
     status = serializers.CharField(write_only=True, default='Active', required=False, allow_null=True)
     scheduled_at = serializers.DateTimeField(write_only=True, required=False, allow_null=True)
     notify_recipients = serializers.BooleanField(write_only=True)
+    direct_award_results = serializers.SerializerMethodField()
+
+    def get_direct_award_results(self, obj):
+        # The created and skipped rows, only known right after creating the bundle
+        return getattr(obj, 'direct_award_results', None)
 
     def create(self, validated_data):
         badgeclass = validated_data['badgeclass']
@@ -52,7 +55,6 @@ class DirectAwardBundleSerializer(serializers.Serializer):
         direct_awards = validated_data.pop('direct_awards')
         user_permissions = badgeclass.get_permissions(validated_data['created_by'])
         if user_permissions['may_award']:
-            successfull_direct_awards = []
             if hasattr(self.context['request'], 'sis_api_call') and getattr(self.context['request'], 'sis_api_call'):
                 validated_data['sis_import'] = True
                 validated_data['sis_client_id'] = badgeclass.issuer.faculty.institution.manage_client_id
@@ -62,21 +64,11 @@ class DirectAwardBundleSerializer(serializers.Serializer):
                                                                        **validated_data)
                 for direct_award in direct_awards:
                     direct_award['eppn'] = direct_award['eppn'].lower()
-                    status = DirectAward.STATUS_SCHEDULED if scheduled_at else DirectAward.STATUS_UNACCEPTED
-                    direct_award['status'] = status
-                    try:
-                        da_created = DirectAward.objects.create(bundle=direct_award_bundle, badgeclass=badgeclass,
-                                                                **direct_award)
-                        successfull_direct_awards.append(da_created)
-                    except IntegrityError:
-                        pass
+                status = DirectAward.STATUS_SCHEDULED if scheduled_at else DirectAward.STATUS_UNACCEPTED
+                successfull_direct_awards, direct_award_bundle.direct_award_results = \
+                    direct_award_bundle.create_direct_awards(direct_awards, status)
             if notify_recipients and not scheduled_at:
-                def send_mail(awards):
-                    for da in awards:
-                        da.notify_recipient()
-
-                thread = threading.Thread(target=send_mail, args=(successfull_direct_awards,))
-                thread.start()
+                DirectAward.queue_notifications(successfull_direct_awards)
             if batch_mode and not scheduled_at:
                 direct_award_bundle.notify_awarder()
             if batch_mode and scheduled_at:
@@ -1,7 +1,22 @@
 import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from mainsite.exceptions import BadgrValidationError
+from mainsite.management.commands.award_scheduled_direct_awards import award_scheduled_bundles
+from mainsite.management.commands.delete_direct_awards import delete_expired_direct_awards
+from mainsite.management.commands.remind_direct_awards import sweep_direct_awards
+from mainsite.models import QueuedEmail
 from mainsite.tests import BadgrTestCase
 
 from directaward.models import DirectAward, DirectAwardBundle
+from insights.models import DirectAwardRollup, EnrollmentRollup, RollupRefresh
+from insights.rollups import DIRECT_AWARDS, ENROLLMENTS, backfill, backfill_state_name, refresh_dirty_buckets, \
+    refresh_touched_buckets
 from issuer.models import BadgeInstance
 from lti_edu.models import StudentsEnrolled
 
@@ -38,6 +53,159 @@ class DirectAwardTest(BadgrTestCase):
         self.assertEqual(response.status_code, 400)
         self.assertFalse(DirectAward.objects.filter(eppn='unique_eppn').exists())  # if atomic, this one was not created
 
+    def test_create_direct_award_bundle_skips_duplicates(self):
+        teacher1 = self.setup_teacher(authenticate=True, )
+        self.setup_staff_membership(teacher1, teacher1.institution, may_award=True)
+        faculty = self.setup_faculty(institution=teacher1.institution)
+        issuer = self.setup_issuer(created_by=teacher1, faculty=faculty)
+        badgeclass = self.setup_badgeclass(issuer=issuer)
+        self.setup_direct_award(badgeclass=badgeclass, eppn='existing_eppn')
+        post_data = {'badgeclass': badgeclass.entity_id,
+                     'batch_mode': False,
+                     'notify_recipients': False,
+                     'direct_awards': [{'recipient_email': 'some@email.com', 'eppn': 'New_Eppn'},
+                                       {'recipient_email': 'some@email2.com', 'eppn': 'existing_eppn'},
+                                       {'recipient_email': 'some@email3.com', 'eppn': 'new_eppn'}]}
+        response = self.client.post('/directaward/create', json.dumps(post_data),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        results = response.data['direct_award_results']
+        self.assertEqual([result['result'] for result in results], ['created', 'skipped', 'skipped'])
+        bundle = DirectAwardBundle.objects.get(entity_id=response.data['entity_id'])
+        direct_award = DirectAward.objects.get(bundle=bundle)
+        self.assertEqual(direct_award.eppn, 'new_eppn')
+        self.assertEqual(direct_award.entity_id, results[0]['entity_id'])
+        self.assertEqual(bundle.initial_total, 3)
+
+    def test_award_scheduled_direct_awards(self):
+        teacher1 = self.setup_teacher(authenticate=True, )
+        self.setup_staff_membership(teacher1, teacher1.institution, may_award=True)
+        faculty = self.setup_faculty(institution=teacher1.institution)
+        issuer = self.setup_issuer(created_by=teacher1, faculty=faculty)
+        badgeclass = self.setup_badgeclass(issuer=issuer)
+        post_data = {'badgeclass': badgeclass.entity_id,
+                     'batch_mode': False,
+                     'notify_recipients': True,
+                     'scheduled_at': (timezone.now() + timedelta(hours=1)).isoformat(),
+                     'direct_awards': [{'recipient_email': 'some@email.com', 'eppn': 'some_eppn'},
+                                       {'recipient_email': 'some@email2.com', 'eppn': 'existing_eppn'}]}
+        response = self.client.post('/directaward/create', json.dumps(post_data),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.setup_direct_award(badgeclass=badgeclass, eppn='existing_eppn')
+        self.assertEqual(award_scheduled_bundles(timezone.now()), [])
+        queued = QueuedEmail.objects.count()
+        bundles = award_scheduled_bundles(timezone.now() + timedelta(hours=2))
+        self.assertEqual(len(bundles), 1)
+        self.assertEqual(bundles[0].status, DirectAwardBundle.STATUS_ACTIVE)
+        statuses = dict(DirectAward.objects.filter(bundle=bundles[0]).values_list('eppn', 'status'))
+        self.assertEqual(statuses, {'some_eppn': DirectAward.STATUS_UNACCEPTED,
+                                    'existing_eppn': DirectAward.STATUS_SCHEDULED})
+        self.assertEqual(bundles[0].direct_award_count, 1)
+        self.assertEqual(bundles[0].direct_award_scheduled_count, 1)
+        # The recipient and the awarder are notified
+        self.assertEqual(QueuedEmail.objects.count(), queued + 2)
+        self.assertEqual(award_scheduled_bundles(timezone.now() + timedelta(hours=2)), [])
+
+    def test_delete_expired_direct_awards_in_batches(self):
+        teacher1 = self.setup_teacher()
+        badgeclass = self.setup_badgeclass(issuer=self.setup_issuer(created_by=teacher1))
+        bundle = self.setup_direct_award_bundle(badgeclass=badgeclass)
+        past, future = timezone.now() - timedelta(days=1), timezone.now() + timedelta(days=1)
+        for _ in range(3):
+            self.setup_direct_award(badgeclass=badgeclass, bundle=bundle, status=DirectAward.STATUS_DELETED,
+                                    delete_at=past)
+        kept = self.setup_direct_award(badgeclass=badgeclass, bundle=bundle, status=DirectAward.STATUS_DELETED,
+                                       delete_at=future)
+        self.assertEqual(len(badgeclass.cached_direct_awards()), 4)
+        self.assertEqual(delete_expired_direct_awards(timezone.now(), batch_size=2), 3)
+        self.assertEqual(list(DirectAward.objects.filter(bundle=bundle)), [kept])
+        self.assertEqual(badgeclass.cached_direct_awards(), [kept])
+
+    def test_remind_and_expire_unaccepted_direct_awards(self):
+        teacher1 = self.setup_teacher()
+        badgeclass = self.setup_badgeclass(issuer=self.setup_issuer(created_by=teacher1))
+        bundle = self.setup_direct_award_bundle(badgeclass=badgeclass)
+        now = timezone.now()
+        direct_awards = {name: self.setup_direct_award(badgeclass=badgeclass, bundle=bundle)
+                         for name in ('new', 'reminder', 'reminded', 'expired', 'resent', 'revoked')}
+        for name, days in (('reminder', 160), ('reminded', 170), ('expired', 200), ('resent', 200)):
+            DirectAward.objects.filter(pk=direct_awards[name].pk).update(created_at=now - timedelta(days=days))
+        DirectAward.objects.filter(pk=direct_awards['reminded'].pk).update(warning_email_send=True)
+        DirectAward.objects.filter(pk=direct_awards['resent'].pk).update(resend_at=now - timedelta(days=10))
+        DirectAward.objects.filter(pk=direct_awards['revoked'].pk).update(created_at=now - timedelta(days=200),
+                                                                          status=DirectAward.STATUS_REVOKED)
+        queued = QueuedEmail.objects.count()
+        self.assertEqual(sweep_direct_awards(now, batch_size=1), {'expired': 1, 'reminded': 1})
+        self.assertEqual(QueuedEmail.objects.count(), queued + 2)
+        statuses = {name: DirectAward.objects.values_list('status', 'warning_email_send').get(pk=direct_award.pk)
+                    for name, direct_award in direct_awards.items()}
+        self.assertEqual(statuses, {'new': (DirectAward.STATUS_UNACCEPTED, False),
+                                    'reminder': (DirectAward.STATUS_UNACCEPTED, True),
+                                    'reminded': (DirectAward.STATUS_UNACCEPTED, True),
+                                    'expired': (DirectAward.STATUS_DELETED, False),
+                                    'resent': (DirectAward.STATUS_UNACCEPTED, False),
+                                    'revoked': (DirectAward.STATUS_REVOKED, False)})
+        self.assertEqual(sweep_direct_awards(now), {'expired': 0, 'reminded': 0})
+
+    def test_direct_award_bundle_counts(self):
+        teacher1 = self.setup_teacher()
+        badgeclass = self.setup_badgeclass(issuer=self.setup_issuer(created_by=teacher1))
+        bundle = self.setup_direct_award_bundle(badgeclass=badgeclass)
+        other_bundle = self.setup_direct_award_bundle(badgeclass=badgeclass)
+        for status in (DirectAward.STATUS_UNACCEPTED, DirectAward.STATUS_UNACCEPTED, DirectAward.STATUS_REJECTED,
+                       DirectAward.STATUS_SCHEDULED, DirectAward.STATUS_DELETED, DirectAward.STATUS_REVOKED):
+            self.setup_direct_award(badgeclass=badgeclass, bundle=bundle, status=status)
+        self.setup_assertion(recipient=self.setup_student(), badgeclass=badgeclass, created_by=teacher1,
+                             direct_award_bundle=bundle)
+        self.setup_assertion(recipient=self.setup_student(), badgeclass=badgeclass, created_by=teacher1,
+                             direct_award_bundle=bundle).revoke('reason')
+        with self.assertNumQueries(1):
+            bundles = {b.pk: b for b in DirectAwardBundle.objects.filter(badgeclass=badgeclass).with_counts()}
+            counts = [(b.assertion_count, b.direct_award_count, b.direct_award_rejected_count,
+                       b.direct_award_scheduled_count, b.direct_award_deleted_count, b.direct_award_revoked_count)
+                      for b in (bundles[bundle.pk], bundles[other_bundle.pk])]
+        self.assertEqual(counts, [(1, 2, 1, 1, 1, 2), (0, 0, 0, 0, 0, 0)])
+        bundle = DirectAwardBundle.objects.get(pk=bundle.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual((bundle.assertion_count, bundle.direct_award_revoked_count), (1, 2))
+
+    def test_direct_award_bundle_detail_pages(self):
+        teacher1 = self.setup_teacher(authenticate=True)
+        badgeclass = self.setup_badgeclass(issuer=self.setup_issuer(created_by=teacher1))
+        bundle = self.setup_direct_award_bundle(badgeclass=badgeclass)
+        for i in range(5):
+            self.setup_direct_award(badgeclass=badgeclass, bundle=bundle)
+        for i in range(2):
+            self.setup_assertion(recipient=self.setup_student(), badgeclass=badgeclass, created_by=teacher1,
+                                 direct_award_bundle=bundle)
+        url = '/directaward/bundle/{}'.format(bundle.entity_id)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['badge_assertions']), 2)
+        self.assertEqual(len(response.data['direct_awards']), 5)
+        for i in range(3):
+            self.setup_assertion(recipient=self.setup_student(), badgeclass=badgeclass, created_by=teacher1,
+                                 direct_award_bundle=bundle)
+        with CaptureQueriesContext(connection) as more_queries:
+            response = self.client.get(url)
+        self.assertEqual(len(response.data['badge_assertions']), 5)
+        self.assertEqual(len(more_queries), len(queries))
+        streamed = json.loads(b''.join(self.client.get(url, {'stream': 'true'}).streaming_content))
+        self.assertEqual(streamed, json.loads(json.dumps(response.data)))
+        entity_ids, cursor = [], None
+        while True:
+            response = self.client.get(url, {'page': 'direct_awards', 'page_size': 2, **({'cursor': cursor}
+                                                                                          if cursor else {})})
+            self.assertEqual(response.status_code, 200)
+            entity_ids += [direct_award['entity_id'] for direct_award in response.data['results']]
+            if not response.data['hasNext']:
+                break
+            cursor = response.data['nextCursor']
+        self.assertEqual(entity_ids, [direct_award['entity_id'] for direct_award in streamed['direct_awards']])
+        self.assertEqual(self.client.get(url, {'page': 'other'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'page': 'direct_awards', 'cursor': 'invalid'}).status_code, 404)
+
     def test_accept_direct_award_from_bundle(self):
         institution = self.setup_institution(identifier='some_home')
         teacher1 = self.setup_teacher(authenticate=True, institution=institution)
@@ -74,6 +242,84 @@ class DirectAwardTest(BadgrTestCase):
         # test that enrollment was removed
         self.assertFalse(StudentsEnrolled.objects.filter(pk=enrollment.pk).exists())
 
+    def test_accept_many_direct_awards(self):
+        institution = self.setup_institution(identifier='many_home')
+        teacher1 = self.setup_teacher(authenticate=False, institution=institution)
+        issuer = self.setup_issuer(created_by=teacher1, faculty=self.setup_faculty(institution=institution))
+        badgeclasses = [self.setup_badgeclass(issuer=issuer) for i in range(2)]
+        # A formal badgeclass has other terms than an informal one
+        badgeclasses[1].formal = True
+        badgeclasses[1].save()
+        student = self.setup_student(authenticate=True, affiliated_institutions=[institution])
+        student.add_affiliations([{'eppn': 'many_eppn', 'schac_home': 'many_home'}])
+        direct_awards = [self.setup_direct_award(badgeclass, eppn='many_eppn') for badgeclass in badgeclasses]
+        enrollment = self.enroll_user(student, badgeclasses[0])
+        refresh_dirty_buckets(ENROLLMENTS)
+        self.assertEqual(EnrollmentRollup.objects.get(badge_class=badgeclasses[0], pending=True).count, 1)
+        payload = [{'entity_id': direct_award.entity_id} for direct_award in direct_awards]
+        for badgeclass in badgeclasses:
+            response = self.client.post('/directaward/accept-direct-awards', json.dumps({'direct_awards': payload}),
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 400)  # terms of this badgeclass not accepted
+            terms = badgeclass._get_terms()
+            response = self.client.post("/user/terms/accept",
+                                        json.dumps([{'terms_entity_id': terms.entity_id, 'accepted': True}]),
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 201)
+            self.assertTrue(badgeclass.terms_accepted(student))
+        other = self.setup_direct_award(badgeclasses[0], eppn='other_eppn')
+        response = self.client.post('/directaward/accept-direct-awards',
+                                    json.dumps({'direct_awards': payload + [{'entity_id': other.entity_id}]}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        for malformed in ({'entity_id': other.entity_id}, ['not an object'], [{'eppn': 'no_entity_id'}]):
+            response = self.client.post('/directaward/accept-direct-awards', json.dumps({'direct_awards': malformed}),
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+        response = self.client.post('/directaward/accept-direct-awards', json.dumps({'direct_awards': payload}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        assertions = BadgeInstance.objects.filter(entity_id__in=response.data['entity_ids'])
+        self.assertEqual({assertion.badgeclass_id for assertion in assertions},
+                         {badgeclass.pk for badgeclass in badgeclasses})
+        self.assertFalse(DirectAward.objects.filter(pk__in=[direct_award.pk for direct_award in direct_awards])
+                         .exists())
+        self.assertFalse(StudentsEnrolled.objects.filter(pk=enrollment.pk).exists())
+        # the queryset delete of the pending enrollment marks the rollup dirty as well
+        self.assertEqual(refresh_dirty_buckets(ENROLLMENTS), 1)
+        self.assertFalse(EnrollmentRollup.objects.filter(badge_class=badgeclasses[0], pending=True).exists())
+
+    def test_award_eligibility_cache_is_removed_on_institution_change(self):
+        institution = self.setup_institution(identifier='cached_home')
+        teacher1 = self.setup_teacher(authenticate=False, institution=institution)
+        issuer = self.setup_issuer(created_by=teacher1, faculty=self.setup_faculty(institution=institution))
+        badgeclass = self.setup_badgeclass(issuer=issuer)
+        badgeclass.formal = True
+        badgeclass.save()
+        self.assertEqual(badgeclass.cached_award_eligibility(),
+                         {'formal': True, 'institution_identifiers': {'cached_home'}, 'identifiers': {'cached_home'}})
+        student = self.setup_student(authenticate=True)
+        student.add_affiliations([{'eppn': 'cached_eppn', 'schac_home': 'alternative_home'}])
+        direct_award = self.setup_direct_award(badgeclass, eppn='cached_eppn')
+        with self.assertRaises(BadgrValidationError):
+            direct_award.check_eligibility(student)
+        institution.alternative_identifier = 'alternative_home'
+        institution.save()
+        self.assertEqual(badgeclass.cached_award_eligibility()['institution_identifiers'],
+                         {'cached_home', 'alternative_home'})
+        direct_award.check_eligibility(student)
+
+    def test_award_eligibility_cache_is_removed_when_issuer_moves(self):
+        institution = self.setup_institution(identifier='old_home')
+        teacher1 = self.setup_teacher(authenticate=False, institution=institution)
+        issuer = self.setup_issuer(created_by=teacher1, faculty=self.setup_faculty(institution=institution))
+        badgeclass = self.setup_badgeclass(issuer=issuer)
+        self.assertEqual(badgeclass.cached_award_eligibility()['institution_identifiers'], {'old_home'})
+        issuer.faculty = self.setup_faculty(institution=self.setup_institution(identifier='new_home'))
+        issuer.save()
+        badgeclass = issuer.badgeclasses.get()
+        self.assertEqual(badgeclass.cached_award_eligibility()['institution_identifiers'], {'new_home'})
+
     def test_accept_direct_award_failures(self):
         institution = self.setup_institution(identifier='right_home')
         teacher1 = self.setup_teacher(authenticate=False, institution=institution)
@@ -115,6 +361,89 @@ class DirectAwardTest(BadgrTestCase):
                                       content_type='application/json')
         self.assertEqual(response.status_code, 200)
 
+    def test_revoke_resend_and_delete_direct_awards_in_bulk(self):
+        teacher1 = self.setup_teacher(authenticate=True)
+        self.setup_staff_membership(teacher1, teacher1.institution, may_award=True)
+        faculty = self.setup_faculty(institution=teacher1.institution)
+        issuer = self.setup_issuer(created_by=teacher1, faculty=faculty)
+        badgeclass = self.setup_badgeclass(issuer=issuer)
+        bundle = self.setup_direct_award_bundle(badgeclass=badgeclass)
+        direct_awards = [self.setup_direct_award(badgeclass=badgeclass, bundle=bundle) for i in range(4)]
+        payload = [{'entity_id': direct_award.entity_id} for direct_award in direct_awards]
+        queued = QueuedEmail.objects.count()
+        response = self.client.post('/directaward/resend-direct-awards', json.dumps({'direct_awards': payload}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(QueuedEmail.objects.count(), queued + 4)
+        self.assertEqual(DirectAward.objects.filter(bundle=bundle, resend_at__isnull=False).count(), 4)
+        response = self.client.post('/directaward/revoke-direct-awards',
+                                    json.dumps({'revocation_reason': 'reason', 'direct_awards': payload[:2]}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(DirectAward.objects.filter(bundle=bundle, status=DirectAward.STATUS_REVOKED).count(), 2)
+        response = self.client.post('/directaward/revoke-direct-awards',
+                                    json.dumps({'revocation_reason': 'reason', 'direct_awards': payload[1:3]}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(DirectAward.objects.filter(bundle=bundle, status=DirectAward.STATUS_REVOKED).count(), 2)
+        response = self.client.put('/directaward/delete-direct-awards',
+                                   json.dumps({'revocation_reason': 'reason', 'direct_awards': payload[2:]}),
+                                   content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(DirectAward.objects.filter(bundle=bundle, status=DirectAward.STATUS_DELETED,
+                                                    delete_at__isnull=False).count(), 2)
+        self.assertEqual(QueuedEmail.objects.count(), queued + 6)
+        self.assertEqual(DirectAwardBundle.objects.with_counts().get(pk=bundle.pk).direct_award_deleted_count, 2)
+        response = self.client.put('/directaward/delete-direct-awards',
+                                   json.dumps({'direct_awards': [{'entity_id': 'unknown'}]}),
+                                   content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.put('/directaward/delete-direct-awards',
+                                   json.dumps({'direct_awards': [{'eppn': 'no_entity_id'}]}),
+                                   content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_direct_awards_are_counted_in_insights_rollup(self):
+        teacher1 = self.setup_teacher(authenticate=True, )
+        self.setup_staff_membership(teacher1, teacher1.institution, may_award=True)
+        faculty = self.setup_faculty(institution=teacher1.institution)
+        issuer = self.setup_issuer(created_by=teacher1, faculty=faculty)
+        badgeclass = self.setup_badgeclass(issuer=issuer)
+        direct_award_bundle = self.setup_direct_award_bundle(badgeclass=badgeclass)
+        direct_awards = [self.setup_direct_award(badgeclass=badgeclass, bundle=direct_award_bundle) for i in range(3)]
+        self.assertFalse(DirectAwardRollup.objects.filter(badgeclass=badgeclass).exists())
+        # the saves only mark the month, it is recounted once
+        self.assertEqual(refresh_dirty_buckets(DIRECT_AWARDS), 1)
+        rollup = DirectAwardRollup.objects.get(badgeclass=badgeclass, status=DirectAward.STATUS_UNACCEPTED)
+        self.assertEqual(rollup.count, 3)
+        self.assertEqual(rollup.institution_id, teacher1.institution.pk)
+        direct_awards[0].delete()
+        self.assertEqual(refresh_dirty_buckets(DIRECT_AWARDS), 1)
+        self.assertEqual(DirectAwardRollup.objects.get(badgeclass=badgeclass).count, 2)
+
+    def test_refresh_insights_counts_direct_awards_changed_since_last_run(self):
+        teacher1 = self.setup_teacher(authenticate=True, )
+        faculty = self.setup_faculty(institution=teacher1.institution)
+        issuer = self.setup_issuer(created_by=teacher1, faculty=faculty)
+        badgeclass = self.setup_badgeclass(issuer=issuer)
+        direct_award_bundle = self.setup_direct_award_bundle(badgeclass=badgeclass)
+        self.setup_direct_award(badgeclass=badgeclass, bundle=direct_award_bundle)
+        list(backfill(DIRECT_AWARDS))
+        self.assertEqual(DirectAwardRollup.objects.get(badgeclass=badgeclass).count, 1)
+        # bulk_create bypasses the save() that marks the rollup dirty
+        DirectAward.objects.bulk_create([DirectAward(badgeclass=badgeclass, bundle=direct_award_bundle,
+                                                     eppn='bulk_eppn', recipient_email='bulk@email.com')])
+        self.assertEqual(DirectAwardRollup.objects.get(badgeclass=badgeclass).count, 1)
+        self.assertEqual(refresh_touched_buckets(DIRECT_AWARDS), 1)
+        self.assertEqual(DirectAwardRollup.objects.get(badgeclass=badgeclass).count, 2)
+
+    def test_refresh_insights_needs_backfill_after_full_refresh_days(self):
+        list(backfill(DIRECT_AWARDS))
+        self.assertIsNotNone(refresh_touched_buckets(DIRECT_AWARDS))
+        RollupRefresh.objects.filter(rollup=backfill_state_name(DIRECT_AWARDS)) \
+            .update(refreshed_until=timezone.now() - timedelta(days=settings.INSIGHTS_FULL_REFRESH_DAYS + 1))
+        self.assertIsNone(refresh_touched_buckets(DIRECT_AWARDS))
+
 
 class DirectAwardSchemaTest(BadgrTestCase):
 
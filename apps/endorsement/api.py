@@ -1,5 +1,3 @@
-import threading
-
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from endorsement.models import Endorsement
@@ -7,7 +5,8 @@ from endorsement.serializer import EndorsementSerializer
 from entity.api import BaseEntityListView, BaseEntityDetailView, VersionedObjectMixin
 from mainsite.exceptions import BadgrValidationError
 from mainsite.permissions import AuthenticatedWithVerifiedEmail, TeachPermission
-from mainsite.utils import EmailMessageMaker, send_mail
+from mainsite.outbox import queue_mail
+from mainsite.utils import EmailMessageMaker
 from rest_framework import status
 
 # Send notifications to all users who have indicated they want to get notified
@@ -22,9 +21,9 @@ def send_notifications(endorsement: Endorsement, current_user):
             html_message = EmailMessageMaker.create_endorsement_requested_mail(current_user,
                                                                                user_notification.user,
                                                                                endorsement)
-            send_mail(subject='Een endorsement is aangevraagd! An endorsement is requested!',
-                      message=None, html_message=html_message,
-                      recipient_list=[user_notification.user.email])
+            queue_mail(subject='Een endorsement is aangevraagd! An endorsement is requested!',
+                       message=None, html_message=html_message,
+                       recipient_list=[user_notification.user.email])
         else:
             user_notification.delete()
 
@@ -37,8 +36,7 @@ class EndorsementList(VersionedObjectMixin, BaseEntityListView):
         serializer = EndorsementSerializer(data=request.data, context={'request': request})
         if serializer.is_valid():
             endorsement = serializer.save()
-            thread = threading.Thread(target=send_notifications, args=(endorsement, request.user))
-            thread.start()
+            send_notifications(endorsement, request.user)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -87,6 +85,5 @@ class EndorsementResend(APIView):
 
     def post(self, request, **kwargs):
         endorsement = Endorsement.objects.get(entity_id=kwargs['entity_id'])
-        thread = threading.Thread(target=send_notifications, args=(endorsement, request.user))
-        thread.start()
+        send_notifications(endorsement, request.user)
         return Response({}, status=status.HTTP_200_OK)
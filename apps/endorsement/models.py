@@ -51,5 +51,5 @@ class Endorsement(BaseAuditedModel, BaseVersionedEntity, CacheModel):
         return self.endorsee.get_permissions(user)
 
     def clear_endorsement_cache(self):
-        self.endorsee.remove_cached_data(['cached_endorsements'])
+        self.endorsee.remove_cached_data(['cached_endorsements', 'cached_endorsements_json'])
         self.endorser.remove_cached_data(['cached_endorsed'])
@@ -1,11 +1,10 @@
-from datetime import datetime
-from datetime import timedelta
 from django.db import connection
-from itertools import groupby
+from collections import defaultdict
+from datetime import date, timedelta
 from django.conf import settings
-from django.db.models import Count
+from django.db.models import Count, Sum
 from django.db.models import Q
-from django.db.models.functions import ExtractMonth, ExtractYear
+from django.db.models.functions import TruncDay, TruncMonth, TruncQuarter, TruncWeek
 from django.utils import timezone
 from rest_framework import status
 from rest_framework.response import Response
@@ -14,9 +13,11 @@ from rest_framework.views import APIView
 from badgeuser.models import BadgeUser, StudentAffiliation
 from badgrsocialauth.permissions import IsSuperUser
 from directaward.models import DirectAward
+from insights.caching import cached_insights
+from insights.models import AssertionRollup, DirectAwardRollup, EnrollmentRollup
 from institution.models import Faculty, Institution
 from issuer.models import BadgeInstance, Issuer, BadgeClass
-from lti_edu.models import StudentsEnrolled
+from mainsite.exceptions import BadgrValidationError
 from mainsite.permissions import TeachPermission
 from staff.models import InstitutionStaff
 
@@ -28,117 +29,253 @@ def dict_fetch_all(cursor):
     return res
 
 
+def dict_fetch_chunks(cursor, chunk_size, columns=None):
+    """Yields the rows of the cursor as dicts keyed by columns or the column names, chunk_size rows at a time"""
+    columns = columns or [col[0] for col in cursor.description]
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        for row in rows:
+            yield dict(zip(columns, row))
+
+
+def institution_badges_query_set():
+    return BadgeInstance.objects \
+        .values('award_type', 'revoked', 'badgeclass__name', 'badgeclass__issuer__faculty__name_english',
+                'badgeclass__issuer__faculty__institution__name_english') \
+        .annotate(count=Count('id')) \
+        .order_by('count')
+
+
+def institution_micro_credentials_query_set():
+    return BadgeInstance.objects \
+        .values('badgeclass__issuer__faculty__institution__name_english',
+                'badgeclass__issuer__faculty__institution__identifier') \
+        .annotate(count=Count('id')) \
+        .filter(badgeclass__badge_class_type='micro_credential') \
+        .order_by('count')
+
+
+# The extensions are pivoted in one pass over issuer_badgeclassextension instead of a subquery per badgeclass
+MICRO_CREDENTIALS_BADGES_SQL = """
+select b.id, b.name as badgeclass_name, ins.name_english as institution_name, ins.identifier, b.created_at ,
+ext.eqf_value, ext.ects_value, ext.study_load
+ from issuer_badgeclass b
+ inner join issuer_issuer i on i.id = b.issuer_id
+ inner join institution_faculty f on f.id = i.faculty_id
+ inner join institution_institution ins on ins.id = f.institution_id
+ left join (
+  select badgeclass_id,
+  min(case when name = 'extensions:EQFExtension' then original_json end) as eqf_value,
+  min(case when name = 'extensions:ECTSExtension' then original_json end) as ects_value,
+  min(case when name = 'extensions:StudyLoadExtension' then original_json end) as study_load
+  from issuer_badgeclassextension
+  where name in ('extensions:EQFExtension', 'extensions:ECTSExtension', 'extensions:StudyLoadExtension')
+  group by badgeclass_id
+ ) ext on ext.badgeclass_id = b.id
+ where b.badge_class_type = 'micro_credential' and ins.institution_type is not null;
+"""
+
+# The number of assertions per user is counted once per user instead of in a subquery per assertion
+COUNT_MICRO_CREDENTIALS_SQL = """
+select ins.identifier, count(bi.user_id) as user_count, uc.assertion_count
+from issuer_badgeinstance bi
+ inner join (select user_id, count(id) as assertion_count from issuer_badgeinstance
+             where user_id is not null group by user_id) uc on uc.user_id = bi.user_id
+ inner join issuer_badgeclass b on b.id = bi.badgeclass_id
+ inner join issuer_issuer i on i.id = b.issuer_id
+ inner join institution_faculty f on f.id = i.faculty_id
+ inner join institution_institution ins on ins.id = f.institution_id
+ where b.badge_class_type = 'micro_credential' and ins.institution_type is not null
+ group by uc.assertion_count, ins.identifier;
+"""
+
+
+def issuer_members_sql(request):
+    is_super_user = hasattr(request.user, 'is_superuser') and request.user.is_superuser
+    institution_part = "" if is_super_user else f"ins.id = {request.user.institution.id} and "
+    return f"""
+select i.id, u.email, u.first_name, u.last_name, i.name_english as issuer_name_en, i.name_dutch  as issuer_name_nl, 
+si.may_update as issuer_staff
+from users u
+inner join staff_issuerstaff si on u.id = si.user_id
+inner join issuer_issuer i on i.id = si.issuer_id
+inner join institution_faculty f on f.id = i.faculty_id
+inner join institution_institution ins on ins.id = f.institution_id
+where {institution_part} si.may_update is not null and i.id is not null order by i.id;
+"""
+
+
+def issuer_member(row):
+    return {
+        'issuer_name': row['issuer_name_en'] if row['issuer_name_en'] else row['issuer_name_nl'],
+        'email': row['email'],
+        'name': f"{row['first_name']} {row['last_name']}",
+        'role': 'Issuer Admin' if row['issuer_staff'] else 'Issuer Awarder'
+    }
+
+
+def badges_overview_sql(institution_id=None):
+    institution_part = "" if institution_id is None else f"and ins.id = {int(institution_id)}"
+    return f"""
+select b.id as badge_class_id, bi.award_type, b.name as badge_name,  b.badge_class_type, bi.public as public_badge,
+bi.revoked, ins.name_english as institution_name, count(bi.id) as backpack_count, 'N/A' as claim_rate, 0 as total_da_count
+from issuer_badgeinstance bi
+inner join issuer_badgeclass b on b.id = bi.badgeclass_id
+inner join issuer_issuer i on i.id = b.issuer_id
+inner join institution_faculty f on f.id = i.faculty_id
+inner join institution_institution ins on ins.id = f.institution_id
+where (bi.expires_at >= CURDATE() or bi.expires_at is NULL) {institution_part}
+group by b.id, bi.award_type, bi.public, bi.revoked;
+"""
+
+
+DIRECT_AWARDS_OVERVIEW_SQL = """
+select count(id) as da_count, badgeclass_id as badgeclass_id from directaward_directaward
+where  status <>  'Deleted' and status <> 'Revoked' and status <> 'Scheduled' group by badgeclass_id;
+"""
+
+
+def claim_rate(total_direct_award_count, direct_award_accepted):
+    if total_direct_award_count == 0:
+        return "N/A"
+    return round((direct_award_accepted / total_direct_award_count) * 100)
+
+
+def badges_overview(badge_overview, da_overview):
+    """
+    Reports per badgeclass from the assertion counts grouped by badgeclass, award_type, public and revoked and the
+    counts of the unaccepted and rejected direct awards per badgeclass, in one pass over both lists.
+    """
+    da_counts = defaultdict(int)
+    for da in da_overview:
+        da_counts[str(da['badgeclass_id'])] += da['da_count']
+
+    reports = {}
+    for row in badge_overview:
+        key = str(row['badge_class_id'])
+        report = reports.get(key)
+        if report is None:
+            report = reports[key] = {
+                'Institution name': row['institution_name'],
+                'BadgecClass name': row['badge_name'],
+                'Type': row['badge_class_type'],
+                'Total edubadges in backpack': 0,
+                'DA claimed': 0,
+                'Requested accepted': 0,
+                'DA revoked': 0,
+                'Requested revoked': 0,
+                'Public': 0,
+            }
+        count = row['backpack_count']
+        if not row['revoked']:
+            report['Total edubadges in backpack'] += count
+        if row['award_type'] == 'direct_award':
+            report['DA revoked' if row['revoked'] else 'DA claimed'] += count
+        elif row['award_type'] == 'requested':
+            report['Requested revoked' if row['revoked'] else 'Requested accepted'] += count
+        if row['public_badge']:
+            report['Public'] += count
+
+    results = []
+    for key, report in reports.items():
+        direct_awards_accepted = report['DA claimed']
+        direct_awards_assertions_revoked = report['DA revoked']
+        total_da_count = direct_awards_accepted + da_counts[key] + direct_awards_assertions_revoked
+        report['Claim-rate'] = claim_rate(total_da_count - direct_awards_assertions_revoked, direct_awards_accepted)
+        report['Total DA send'] = total_da_count
+        results.append(report)
+    return results
+
+
+def insights_institution(request, params):
+    """Returns whether to filter by institution and the institution, superusers may select one or all institutions"""
+    institution_id = params.get("institution_id")
+    if institution_id and hasattr(request.user, 'is_superuser') and request.user.is_superuser:
+        if institution_id == "all":
+            return False, None
+        return True, Institution.objects.get(entity_id=institution_id)
+    return True, request.user.institution
+
+
+def scoped_rollups(model, filter_by_institution, institution, include_surf, surf_institution):
+    query_set = model.objects
+    if filter_by_institution:
+        query_set = query_set.filter(institution=institution)
+    if not filter_by_institution and not include_surf:
+        query_set = query_set.exclude(institution=surf_institution)
+    return query_set
+
+
+def insights_year_range(year):
+    """
+    The first day and the day after the last day of the year of the insights. Like the weekly charts of the insights,
+    the year starts on its first monday and ends on the first monday of the next year.
+    """
+    start_of_year = date(year, 1, 1)
+    if start_of_year.isoweekday() > 1:
+        start_of_year = start_of_year + timedelta(days=(7 + 1) - start_of_year.isoweekday())
+    end_of_year = date(year, 12, 31)
+    if end_of_year.isoweekday() > 1:
+        end_of_year = end_of_year + timedelta(days=(7 + 1) - end_of_year.isoweekday())
+    return start_of_year, end_of_year
+
+
 class InsightsView(APIView):
+    """
+    The insights of a year, or of all years with a string year. Assertions are counted until the day they expire, the
+    rollups do not know the time of expiry, so assertions expiring later today are no longer counted.
+    """
     permission_classes = (TeachPermission,)
 
+    @cached_insights
     def post(self, request, **kwargs):
         surf_institution = BadgeClass.objects.get(name=settings.EDUID_BADGE_CLASS_NAME).issuer.faculty.institution
         current_date = timezone.now().date()
         year = request.data.get('year', current_date.year)
         total = isinstance(year, str)
-        if not total:
-            start_of_year = current_date.replace(year=year, month=1, day=1)
-            if start_of_year.isoweekday() > 1:
-                start_of_year = (start_of_year + timedelta(days=(7 + 1) - start_of_year.isoweekday()))
-            end_of_year = current_date.replace(year=year, month=12, day=31)
-            if end_of_year.isoweekday() > 1:
-                end_of_year = (end_of_year + timedelta(days=(7 + 1) - end_of_year.isoweekday()))
-        # Superusers may select an institution
-        institution_id = request.data.get("institution_id")
-        filter_by_institution = True
-        if institution_id and hasattr(request.user, 'is_superuser') and request.user.is_superuser:
-            if institution_id == "all":
-                filter_by_institution = False
-            else:
-                institution = Institution.objects.get(entity_id=institution_id)
-        else:
-            institution = request.user.institution
+        filter_by_institution, institution = insights_institution(request, request.data)
         include_surf = request.data.get("include_surf", True)
-        # For now we don't use the student_affiliation_query
-        # student_affiliation_query = StudentAffiliation.objects.values_list('user_id', flat=True).all()
-        # .filter(user__id__in=student_affiliation_query) \
-        today = datetime.utcnow()
-        assertions_query_set = BadgeInstance.objects \
-            .values('award_type', 'badgeclass_id', 'badgeclass__name', 'badgeclass__archived',
-                    'badgeclass__badge_class_type',
-                    'issuer_id', "public", "revoked",
-                    "issuer__name_dutch", "issuer__name_english", 'issuer__faculty_id',
-                    "issuer__faculty__name_english", "issuer__faculty__name_dutch") \
-            .annotate(year=ExtractYear('created_at')) \
-            .annotate(month=ExtractMonth('created_at')) \
-            .annotate(nbr=Count('month')) \
-            .values('year', 'month', 'nbr', 'award_type', 'badgeclass_id', 'badgeclass__name', 'badgeclass__archived',
+
+        def rollup_query_set(model):
+            # The rollups contain daily counts, see insights.rollups
+            query_set = scoped_rollups(model, filter_by_institution, institution, include_surf, surf_institution)
+            if not total:
+                start_of_year, end_of_year = insights_year_range(year)
+                query_set = query_set.filter(day__gte=start_of_year, day__lt=end_of_year)
+            return query_set
+
+        assertions_query_set = rollup_query_set(AssertionRollup) \
+            .filter(Q(expires_on__isnull=True) | Q(expires_on__gt=current_date)) \
+            .values('year', 'month', 'award_type', 'badgeclass_id', 'badgeclass__name', 'badgeclass__archived',
                     'badgeclass__badge_class_type', 'issuer_id',
                     "public", "revoked", "issuer__name_dutch", "issuer__name_english", 'issuer__faculty_id',
                     "issuer__faculty__name_dutch", "issuer__faculty__name_english") \
-            .exclude(expires_at__lte=today) \
+            .annotate(nbr=Sum('count')) \
             .order_by('year', 'month')
-        if not total:
-            assertions_query_set = assertions_query_set \
-                .filter(created_at__gte=start_of_year) \
-                .filter(created_at__lt=end_of_year)
-        if filter_by_institution:
-            assertions_query_set = assertions_query_set \
-                .filter(issuer__faculty__institution=institution)
-        if not filter_by_institution and not include_surf:
-            assertions_query_set = assertions_query_set \
-                .exclude(issuer__faculty__institution=surf_institution)
 
-        direct_awards_query_set = DirectAward.objects \
-            .values('status', 'badgeclass_id', 'badgeclass__name', 'badgeclass__archived', 'badgeclass__issuer__id',
-                    'badgeclass__badge_class_type',
-                    "badgeclass__issuer__name_dutch", "badgeclass__issuer__name_english",
-                    'badgeclass__issuer__faculty_id',
-                    "badgeclass__issuer__faculty__name_english", "badgeclass__issuer__faculty__name_dutch") \
-            .annotate(year=ExtractYear('created_at')) \
-            .annotate(month=ExtractMonth('created_at')) \
-            .annotate(nbr=Count('month')) \
-            .values('month', 'year', 'nbr', 'status', 'badgeclass_id', 'badgeclass__name', 'badgeclass__archived',
+        direct_awards_query_set = rollup_query_set(DirectAwardRollup) \
+            .exclude(status__in=[DirectAward.STATUS_DELETED, DirectAward.STATUS_REVOKED,
+                                 DirectAward.STATUS_SCHEDULED]) \
+            .values('month', 'year', 'status', 'badgeclass_id', 'badgeclass__name', 'badgeclass__archived',
                     'badgeclass__issuer__id', 'badgeclass__badge_class_type',
                     "badgeclass__issuer__name_dutch", "badgeclass__issuer__name_english",
                     'badgeclass__issuer__faculty_id',
                     "badgeclass__issuer__faculty__name_dutch", "badgeclass__issuer__faculty__name_english") \
-            .order_by('year', 'month') \
-            .exclude(status='Deleted').exclude(status='Revoked').exclude(status='Scheduled')
-
-        if not total:
-            direct_awards_query_set = direct_awards_query_set \
-                .filter(created_at__gte=start_of_year) \
-                .filter(created_at__lt=end_of_year)
-        if filter_by_institution:
-            direct_awards_query_set = direct_awards_query_set \
-                .filter(badgeclass__issuer__faculty__institution=institution)
-        if not filter_by_institution and not include_surf:
-            direct_awards_query_set = direct_awards_query_set \
-                .exclude(badgeclass__issuer__faculty__institution=surf_institution)
+            .annotate(nbr=Sum('count')) \
+            .order_by('year', 'month')
 
-        enrollments_query_set = StudentsEnrolled.objects \
-            .filter(Q(badge_instance_id__isnull=True) | Q(denied=True)) \
-            .values('denied', 'badge_class_id', 'badge_class__name', 'badge_class__issuer__id',
-                    "badge_class__issuer__name_dutch", "badge_class__issuer__name_english",
-                    'badge_class__issuer__faculty_id', 'badge_class__badge_class_type',
-                    "badge_class__issuer__faculty__name_dutch", "badge_class__issuer__faculty__name_english") \
-            .annotate(year=ExtractYear('date_created')) \
-            .annotate(month=ExtractMonth('date_created')) \
-            .annotate(nbr=Count('month')) \
-            .values('month', 'year', 'nbr', 'denied', 'badge_class_id', 'badge_class__name',
+        enrollments_query_set = rollup_query_set(EnrollmentRollup) \
+            .filter(Q(pending=True) | Q(denied=True)) \
+            .values('month', 'year', 'denied', 'badge_class_id', 'badge_class__name',
                     'badge_class__issuer__id', 'badge_class__badge_class_type',
                     "badge_class__issuer__name_dutch", "badge_class__issuer__name_english",
                     'badge_class__issuer__faculty_id',
                     "badge_class__issuer__faculty__name_dutch", "badge_class__issuer__faculty__name_english") \
+            .annotate(nbr=Sum('count')) \
             .order_by('year', 'month')
 
-        if not total:
-            enrollments_query_set = enrollments_query_set \
-                .filter(date_created__gte=start_of_year) \
-                .filter(date_created__lt=end_of_year)
-        if filter_by_institution:
-            enrollments_query_set = enrollments_query_set \
-                .filter(badge_class__issuer__faculty__institution=institution)
-        if not filter_by_institution and not include_surf:
-            enrollments_query_set = enrollments_query_set \
-                .exclude(badge_class__issuer__faculty__institution=surf_institution)
-
         assertions = list(assertions_query_set.all())
         direct_awards = list(direct_awards_query_set.all())
         enrollments = list(enrollments_query_set.all())
@@ -191,6 +328,67 @@ class InsightsView(APIView):
         return Response(res, status=status.HTTP_200_OK)
 
 
+class InsightsTimeSeriesView(APIView):
+    """
+    The counts of the insights per day, week, month or quarter between the start and end dates (both included).
+    Any range is a sum over the daily rollups, so rolling windows do not aggregate the source tables.
+    """
+    permission_classes = (TeachPermission,)
+    granularities = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth, 'quarter': TruncQuarter}
+
+    @staticmethod
+    def date_param(request, name, default):
+        value = request.query_params.get(name)
+        if not value:
+            return default
+        try:
+            return date.fromisoformat(value)
+        except ValueError:
+            raise BadgrValidationError(f'{name} must be a date formatted as YYYY-MM-DD', 999)
+
+    @cached_insights
+    def get(self, request, **kwargs):
+        params = request.query_params
+        current_date = timezone.now().date()
+        end = self.date_param(request, 'end', current_date)
+        start = self.date_param(request, 'start', end - timedelta(days=364))
+        if start > end:
+            raise BadgrValidationError('start must not be after end', 999)
+        granularity = params.get('granularity', 'month')
+        if granularity not in self.granularities:
+            raise BadgrValidationError(f'granularity must be one of {", ".join(self.granularities)}', 999)
+        trunc = self.granularities[granularity]
+        filter_by_institution, institution = insights_institution(request, params)
+        include_surf = params.get('include_surf', 'true').lower() != 'false'
+        surf_institution = None
+        if not filter_by_institution and not include_surf:
+            surf_institution = BadgeClass.objects.get(name=settings.EDUID_BADGE_CLASS_NAME).issuer.faculty.institution
+
+        def series(model, condition, *dimensions):
+            return list(scoped_rollups(model, filter_by_institution, institution, include_surf, surf_institution)
+                        .filter(condition, day__gte=start, day__lte=end)
+                        .annotate(period=trunc('day'))
+                        .values('period', *dimensions)
+                        .annotate(nbr=Sum('count'))
+                        .order_by('period', *dimensions))
+
+        # The same selection of rows as InsightsView
+        res = {
+            'start': start,
+            'end': end,
+            'granularity': granularity,
+            'assertions': series(AssertionRollup,
+                                 Q(expires_on__isnull=True) | Q(expires_on__gt=current_date),
+                                 'award_type', 'public', 'revoked'),
+            'direct_awards': series(DirectAwardRollup,
+                                    ~Q(status__in=[DirectAward.STATUS_DELETED, DirectAward.STATUS_REVOKED,
+                                                   DirectAward.STATUS_SCHEDULED]),
+                                    'status'),
+            'enrollments': series(EnrollmentRollup, Q(pending=True) | Q(denied=True), 'denied'),
+        }
+        return Response(res, status=status.HTTP_200_OK)
+
+
 class InstitutionAdminsView(APIView):
     permission_classes = (IsSuperUser,)
 
@@ -208,171 +406,67 @@ class InstitutionAdminsView(APIView):
 class InstitutionBadgesView(APIView):
     permission_classes = (IsSuperUser,)
 
+    @cached_insights
     def get(self, request, **kwargs):
-        query_set = BadgeInstance.objects \
-            .values('award_type', 'revoked', 'badgeclass__name', 'badgeclass__issuer__faculty__name_english',
-                    'badgeclass__issuer__faculty__institution__name_english') \
-            .annotate(count=Count('id')) \
-            .order_by('count') \
-            .all()
-        institution_badges = list(query_set)
+        institution_badges = list(institution_badges_query_set())
         return Response(institution_badges, status=status.HTTP_200_OK)
 
 
 class InstitutionMicroCredentials(APIView):
     permission_classes = (IsSuperUser,)
 
+    @cached_insights
     def get(self, request, **kwargs):
-        query_set = BadgeInstance.objects \
-            .values('badgeclass__issuer__faculty__institution__name_english',
-                    'badgeclass__issuer__faculty__institution__identifier') \
-            .annotate(count=Count('id')) \
-            .filter(badgeclass__badge_class_type='micro_credential') \
-            .order_by('count') \
-            .all()
-        institution_badges = list(query_set)
+        institution_badges = list(institution_micro_credentials_query_set())
         return Response(institution_badges, status=status.HTTP_200_OK)
 
 
 class CountMicroCredentials(APIView):
     permission_classes = (IsSuperUser,)
 
+    @cached_insights
     def get(self, request, **kwargs):
         with connection.cursor() as cursor:
-            cursor.execute("""
-select ins.identifier, count(u.id) as user_count, (select count(bi.id) from issuer_badgeinstance bi where bi.user_id = u.id ) as assertion_count 
-from users u 
- inner join issuer_badgeinstance bi on bi.user_id = u.id
- inner join issuer_badgeclass b on b.id = bi.badgeclass_id
- inner join issuer_issuer i on i.id = b.issuer_id 
- inner join institution_faculty f on f.id = i.faculty_id 
- inner join institution_institution ins on ins.id = f.institution_id 
- where b.badge_class_type = 'micro_credential' and ins.institution_type is not null
- group by assertion_count, ins.identifier ;            
-            """, [])
+            cursor.execute(COUNT_MICRO_CREDENTIALS_SQL, [])
             return Response(dict_fetch_all(cursor), status=status.HTTP_200_OK)
 
 
 class MicroCredentialsBadgeOverview(APIView):
     permission_classes = (IsSuperUser,)
 
+    @cached_insights
     def get(self, request, **kwargs):
         with connection.cursor() as cursor:
-            cursor.execute("""
-select b.id, b.name as badgeclass_name, ins.name_english as institution_name, ins.identifier, b.created_at ,
-(select original_json from issuer_badgeclassextension where name = 'extensions:EQFExtension' and badgeclass_id = b.id limit 1) as eqf_value,
-(select original_json from issuer_badgeclassextension where name = 'extensions:ECTSExtension' and badgeclass_id = b.id limit 1) as ects_value,
- (select original_json from issuer_badgeclassextension where name = 'extensions:StudyLoadExtension' and badgeclass_id = b.id limit 1) as study_load
- from issuer_badgeclass b
- inner join issuer_issuer i on i.id = b.issuer_id
- inner join institution_faculty f on f.id = i.faculty_id
- inner join institution_institution ins on ins.id = f.institution_id
- where b.badge_class_type = 'micro_credential' and ins.institution_type is not null;
-             """, [])
+            cursor.execute(MICRO_CREDENTIALS_BADGES_SQL, [])
             return Response(dict_fetch_all(cursor), status=status.HTTP_200_OK)
 
 
 class InstitutionBadgesOverview(APIView):
     permission_classes = (TeachPermission,)
 
+    @cached_insights
     def get(self, request, **kwargs):
         is_super_user = hasattr(request.user, 'is_superuser') and request.user.is_superuser
-        institution_part = "" if is_super_user else f"and ins.id = {request.user.institution.id}"
+        institution_id = None if is_super_user else request.user.institution.id
 
         with connection.cursor() as cursor:
-            cursor.execute(f"""
-select b.id as badge_class_id, bi.award_type, b.name as badge_name,  b.badge_class_type, bi.public as public_badge,
-bi.revoked, ins.name_english as institution_name, count(bi.id) as backpack_count, 'N/A' as claim_rate, 0 as total_da_count
-from issuer_badgeinstance bi
-inner join issuer_badgeclass b on b.id = bi.badgeclass_id
-inner join issuer_issuer i on i.id = b.issuer_id
-inner join institution_faculty f on f.id = i.faculty_id
-inner join institution_institution ins on ins.id = f.institution_id
-where (bi.expires_at >= CURDATE() or bi.expires_at is NULL) {institution_part}
-group by b.id, bi.award_type, bi.public, bi.revoked;
-            """, [])
+            cursor.execute(badges_overview_sql(institution_id), [])
             badge_overview = dict_fetch_all(cursor)
-            cursor.execute("""
-select count(id) as da_count, badgeclass_id as badgeclass_id from directaward_directaward 
-where  status <>  'Deleted' and status <> 'Revoked' and status <> 'Scheduled' group by badgeclass_id;
-                        """, [])
+            cursor.execute(DIRECT_AWARDS_OVERVIEW_SQL, [])
             da_overview = dict_fetch_all(cursor)
 
-            # Now group by badgeclass_id and create final reporting dict
-            def key_func(k):
-                return str(k['badge_class_id'])
-
-            def claim_rate(total_direct_award_count, direct_award_accepted):
-                if total_direct_award_count == 0:
-                    return "N/A"
-                return round((direct_award_accepted / total_direct_award_count) * 100)
-
-            # Known caveat is to forget sorting before groupby
-            sorted_assertions = sorted(badge_overview, key=key_func)
-            grouped_assertions = groupby(sorted_assertions, key_func)
-            results = []
-            for key, val in grouped_assertions:
-                values = list(val)
-                badge_instance = values[0]
-                direct_awards_accepted = sum(
-                    [b['backpack_count'] for b in values if b['award_type'] == 'direct_award' and not b['revoked']])
-                direct_awards_assertions_revoked = sum(
-                    [b['backpack_count'] for b in values if b['award_type'] == 'direct_award' and b['revoked']])
-                direct_awards_rejected_or_unaccepted = sum(
-                    [da['da_count'] for da in da_overview if str(da['badgeclass_id']) == str(key)])
-                total_da_count = direct_awards_accepted + direct_awards_rejected_or_unaccepted + direct_awards_assertions_revoked
-                results.append({
-                    'Institution name': badge_instance['institution_name'],
-                    'BadgecClass name': badge_instance['badge_name'],
-                    'Type': badge_instance['badge_class_type'],
-                    'Total edubadges in backpack': sum([b['backpack_count'] for b in values if not b['revoked']]),
-                    'DA claimed': direct_awards_accepted,
-                    'Requested accepted': sum(
-                        [b['backpack_count'] for b in values if b['award_type'] == 'requested' and not b['revoked']]),
-                    'DA revoked': direct_awards_assertions_revoked,
-                    'Requested revoked': sum(
-                        [b['backpack_count'] for b in values if b['award_type'] == 'requested' and b['revoked']]),
-                    'Public': sum([b['backpack_count'] for b in values if b['public_badge']]),
-                    'Claim-rate': claim_rate((total_da_count - direct_awards_assertions_revoked),
-                                             direct_awards_accepted),
-                    'Total DA send': total_da_count
-                })
-
-            sorted_results = sorted(results, key=lambda a: (a['Institution name'], a['BadgecClass name']))
-            return Response(sorted_results, status=status.HTTP_200_OK)
+        results = badges_overview(badge_overview, da_overview)
+        sorted_results = sorted(results, key=lambda a: (a['Institution name'], a['BadgecClass name']))
+        return Response(sorted_results, status=status.HTTP_200_OK)
 
 
 class IssuerMembers(APIView):
     permission_classes = (TeachPermission,)
 
+    @cached_insights
     def get(self, request, **kwargs):
-        is_super_user = hasattr(request.user, 'is_superuser') and request.user.is_superuser
-        institution_part = "" if is_super_user else f"ins.id = {request.user.institution.id} and "
-
         with connection.cursor() as cursor:
-            cursor.execute(f"""
-select i.id, u.email, u.first_name, u.last_name, i.name_english as issuer_name_en, i.name_dutch  as issuer_name_nl, 
-si.may_update as issuer_staff
-from users u
-inner join staff_issuerstaff si on u.id = si.user_id
-inner join issuer_issuer i on i.id = si.issuer_id
-inner join institution_faculty f on f.id = i.faculty_id
-inner join institution_institution ins on ins.id = f.institution_id
-where {institution_part} si.may_update is not null and i.id is not null order by i.id;
-                        """, [])
-            issuer_overview = dict_fetch_all(cursor)
-
-            def determine_role(row):
-                return 'Issuer Admin' if row['issuer_staff'] else 'Issuer Awarder'
-
-            results = []
-
-            for row in issuer_overview:
-                results.append({
-                    'issuer_name': row['issuer_name_en'] if row['issuer_name_en'] else row['issuer_name_nl'],
-                    'email': row['email'],
-                    'name': f"{row['first_name']} {row['last_name']}",
-                    'role': determine_role(row)
-                })
-            sorted_results = sorted(results, key=lambda a: (a['issuer_name'],))
-            return Response(sorted_results, status=status.HTTP_200_OK)
+            cursor.execute(issuer_members_sql(request), [])
+            results = [issuer_member(row) for row in dict_fetch_all(cursor)]
+        sorted_results = sorted(results, key=lambda a: (a['issuer_name'],))
+        return Response(sorted_results, status=status.HTTP_200_OK)
@@ -1,10 +1,14 @@
 from django.conf.urls import url
 
-from insights.api import InsightsView, InstitutionAdminsView, InstitutionBadgesView, InstitutionMicroCredentials, \
-    CountMicroCredentials, MicroCredentialsBadgeOverview, InstitutionBadgesOverview, IssuerMembers
+from insights.api import InsightsView, InsightsTimeSeriesView, InstitutionAdminsView, InstitutionBadgesView, \
+    InstitutionMicroCredentials, CountMicroCredentials, MicroCredentialsBadgeOverview, InstitutionBadgesOverview, \
+    IssuerMembers
+from insights.exports import InstitutionBadgesExport, InstitutionMicroCredentialsExport, \
+    MicroCredentialsBadgeOverviewExport, IssuerMembersExport
 
 urlpatterns = [
     url(r'^insight$', InsightsView.as_view(), name='api_insight'),
+    url(r'^insight/time-series$', InsightsTimeSeriesView.as_view(), name='api_insight_time_series'),
     url(r'^institution/admins$', InstitutionAdminsView.as_view(), name='api_institution_admins'),
     url(r'^institution/badges$', InstitutionBadgesView.as_view(), name='api_institution_badges'),
     url(r'^institution/micro-credentials$', InstitutionMicroCredentials.as_view(),
@@ -17,6 +21,14 @@ urlpatterns = [
         name='api_institution_badges_overview'),
     url(r'^institution/issuer-members$', IssuerMembers.as_view(),
         name='api_institution_issuer_members'),
+    url(r'^institution/badges/export\.(?P<export_format>csv|ndjson)$', InstitutionBadgesExport.as_view(),
+        name='api_institution_badges_export'),
+    url(r'^institution/micro-credentials/export\.(?P<export_format>csv|ndjson)$',
+        InstitutionMicroCredentialsExport.as_view(), name='api_institution_micro_credentials_export'),
+    url(r'^institution/micro-credentials-badges/export\.(?P<export_format>csv|ndjson)$',
+        MicroCredentialsBadgeOverviewExport.as_view(), name='api_institution_micro_credentials_badges_export'),
+    url(r'^institution/issuer-members/export\.(?P<export_format>csv|ndjson)$', IssuerMembersExport.as_view(),
+        name='api_institution_issuer_members_export'),
 
 
 ]
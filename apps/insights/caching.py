@@ -0,0 +1,149 @@
+import functools
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.utils.functional import cached_property
+from rest_framework import status
+from rest_framework.response import Response
+
+from cachemodel.utils import generate_cache_key
+
+logger = logging.getLogger('Badgr.Debug')
+
+ALL_INSTITUTIONS = 'all'
+
+
+def _generation_key(scope):
+    return generate_cache_key(['Insights', 'generation'], scope=scope)
+
+
+def _generation(scope):
+    return cache.get(_generation_key(scope), 0)
+
+
+def _bump_generation(scope):
+    key = _generation_key(scope)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def invalidate_insights(institution_id=None):
+    """
+    Marks the cached insights of the institution as stale, or of all institutions without an institution_id.
+    Reports over all institutions are marked stale by every invalidation.
+    """
+    if institution_id is None:
+        _bump_generation('global')
+    else:
+        _bump_generation(institution_id)
+        _bump_generation(ALL_INSTITUTIONS)
+
+
+def _request_param(request, name, default=None):
+    if name in request.query_params:
+        return request.query_params[name]
+    if isinstance(request.data, dict):
+        return request.data.get(name, default)
+    return default
+
+
+def _request_params(request):
+    """All parameters of the request, as a stable string for the cache key"""
+    params = request.query_params.dict()
+    if isinstance(request.data, dict):
+        params.update(request.data)
+    return json.dumps(params, sort_keys=True, default=str)
+
+
+def _scope(request):
+    """Returns the superuser flag and the institution the report is about"""
+    is_super_user = hasattr(request.user, 'is_superuser') and request.user.is_superuser
+    if is_super_user:
+        return True, _request_param(request, 'institution_id') or ALL_INSTITUTIONS
+    return False, request.user.institution.pk
+
+
+class _RequestValues(object):
+    """
+    The values of a request that the insights views use, copied so a background revalidation does not share the
+    request object or its user with the request thread
+    """
+
+    def __init__(self, user_pk, query_params, data):
+        self.user_pk = user_pk
+        self.query_params = query_params
+        self.data = data
+
+    @classmethod
+    def from_request(cls, request):
+        data = request.data.copy() if isinstance(request.data, dict) else None
+        return cls(request.user.pk, request.query_params.copy(), data)
+
+    @cached_property
+    def user(self):
+        return get_user_model().objects.get(pk=self.user_pk)
+
+
+def cached_insights(view_method):
+    """
+    Caches the response data of an insights view per (view, institution, request parameters, superuser scope) for
+    INSIGHTS_CACHE_TIMEOUT seconds or until invalidate_insights is called. With INSIGHTS_CACHE_STALE_TIMEOUT the stale
+    data is served for that many seconds longer while a background thread computes the fresh data.
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        timeout = settings.INSIGHTS_CACHE_TIMEOUT
+        if not timeout:
+            return view_method(self, request, *args, **kwargs)
+        is_super_user, institution = _scope(request)
+        key = generate_cache_key(['Insights', self.__class__.__name__],
+                                 institution=institution,
+                                 params=_request_params(request),
+                                 superuser=is_super_user)
+        # Superusers select institutions by entity_id, their reports are stale after any invalidation
+        institution_scope = ALL_INSTITUTIONS if is_super_user else institution
+        generations = (_generation('global'), _generation(institution_scope))
+        stale_timeout = settings.INSIGHTS_CACHE_STALE_TIMEOUT
+
+        def compute(view, view_request):
+            response = view_method(view, view_request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK:
+                cache.set(key, {'data': response.data, 'computed_at': time.time(), 'generations': generations},
+                          timeout + stale_timeout)
+            return response
+
+        entry = cache.get(key)
+        if entry is None:
+            return compute(self, request)
+        fresh = entry['generations'] == generations and time.time() - entry['computed_at'] < timeout
+        if not fresh:
+            if not stale_timeout:
+                return compute(self, request)
+            # Only one request revalidates, the others keep getting the stale data
+            if cache.add(key + '_revalidating', True, timeout):
+                # The thread gets its own view and a copy of the request values, and closes its own connection
+                request_values = _RequestValues.from_request(request)
+
+                def revalidate():
+                    try:
+                        compute(self.__class__(), request_values)
+                    except Exception:
+                        logger.exception('Revalidating insights {} failed'.format(key))
+                    finally:
+                        cache.delete(key + '_revalidating')
+                        connection.close()
+
+                threading.Thread(target=revalidate, daemon=True).start()
+        return Response(entry['data'], status=status.HTTP_200_OK)
+
+    return wrapper
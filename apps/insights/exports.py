@@ -0,0 +1,110 @@
+from MySQLdb.cursors import SSCursor
+from django.db import connection
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework.views import APIView
+
+from badgrsocialauth.permissions import IsSuperUser
+from insights.api import dict_fetch_chunks, institution_badges_query_set, institution_micro_credentials_query_set, \
+    MICRO_CREDENTIALS_BADGES_SQL, issuer_members_sql, issuer_member
+from mainsite.permissions import TeachPermission
+from mainsite.renderers import stream_csv, stream_ndjson
+
+CHUNK_SIZE = 2000
+
+
+def streamed_rows(sql, params, columns=None):
+    """
+    Yields the rows of the query as dicts while the response is streamed. The default cursor of mysqlclient fetches
+    the whole result before the first row is returned, the server side SSCursor fetches the rows as they are read.
+    The columns are the keys of the dicts, by default the column names of the result.
+    """
+    connection.ensure_connection()
+    cursor = connection.connection.cursor(SSCursor)
+    try:
+        cursor.execute(sql, params)
+        yield from dict_fetch_chunks(cursor, CHUNK_SIZE, columns)
+    finally:
+        cursor.close()
+
+
+class BaseExportView(APIView):
+    """
+    Streams the rows of a report as csv or ndjson, the rows are read from a server side cursor while the response is
+    written so memory does not grow with the size of the report. Subclasses must define the name and fieldnames of
+    the report and get_query, which returns the sql and its parameters or None. The rows are keyed by the columns, or
+    by the column names of the result without them, and turned into the rows of the report by to_row.
+    """
+    name = None
+    fieldnames = ()
+    columns = None
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if not cls.name or not cls.fieldnames or not hasattr(cls, 'get_query'):
+            raise TypeError(f'{cls.__name__} must define name, fieldnames and get_query')
+
+    def to_row(self, row):
+        return row
+
+    def get(self, request, export_format, **kwargs):
+        sql, params = self.get_query(request)
+        rows = (self.to_row(row) for row in streamed_rows(sql, params, self.columns))
+        if export_format == 'csv':
+            response = StreamingHttpResponse(stream_csv(self.fieldnames, rows), content_type='text/csv')
+        else:
+            response = StreamingHttpResponse(stream_ndjson(rows), content_type='application/x-ndjson')
+        filename = '{}_{}.{}'.format(self.name, timezone.now().strftime('%Y-%m-%d'), export_format)
+        response['Content-Disposition'] = 'attachment; filename="{}"'.format(filename)
+        return response
+
+
+class InstitutionBadgesExport(BaseExportView):
+    permission_classes = (IsSuperUser,)
+    name = 'institution_badges'
+    fieldnames = ('award_type', 'revoked', 'badgeclass__name', 'badgeclass__issuer__faculty__name_english',
+                  'badgeclass__issuer__faculty__institution__name_english', 'count')
+
+    # The values of the query set, followed by its count annotation
+    columns = fieldnames
+
+    def get_query(self, request):
+        return institution_badges_query_set().query.sql_with_params()
+
+    def to_row(self, row):
+        return {**row, 'revoked': bool(row['revoked'])}
+
+
+class InstitutionMicroCredentialsExport(BaseExportView):
+    permission_classes = (IsSuperUser,)
+    name = 'institution_micro_credentials'
+    fieldnames = ('badgeclass__issuer__faculty__institution__name_english',
+                  'badgeclass__issuer__faculty__institution__identifier', 'count')
+
+    columns = fieldnames
+
+    def get_query(self, request):
+        return institution_micro_credentials_query_set().query.sql_with_params()
+
+
+class MicroCredentialsBadgeOverviewExport(BaseExportView):
+    permission_classes = (IsSuperUser,)
+    name = 'micro_credentials_badges'
+    fieldnames = ('id', 'badgeclass_name', 'institution_name', 'identifier', 'created_at', 'eqf_value',
+                  'ects_value', 'study_load')
+
+    def get_query(self, request):
+        return MICRO_CREDENTIALS_BADGES_SQL, None
+
+
+class IssuerMembersExport(BaseExportView):
+    permission_classes = (TeachPermission,)
+    name = 'issuer_members'
+    fieldnames = ('issuer_name', 'email', 'name', 'role')
+
+    def get_query(self, request):
+        # Ordered by issuer instead of issuer name, sorting by name would need all rows in memory
+        return issuer_members_sql(request), None
+
+    def to_row(self, row):
+        return issuer_member(row)
@@ -0,0 +1,72 @@
+# Generated by Django 3.2.24 on 2026-10-19 10:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('institution', '0057_institution_country_code'),
+        ('issuer', '0116_migrate_studyLoad_to_timeExtension'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssertionRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('award_type', models.CharField(max_length=255)),
+                ('public', models.BooleanField(default=False)),
+                ('revoked', models.BooleanField(default=False)),
+                ('expires_on', models.DateField(blank=True, default=None, null=True)),
+                ('badgeclass', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='issuer.badgeclass')),
+                ('faculty', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='institution.faculty')),
+                ('institution', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='institution.institution')),
+                ('issuer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='issuer.issuer')),
+            ],
+            options={
+                'index_together': {('institution', 'year', 'month'), ('badgeclass', 'year', 'month')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DirectAwardRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('status', models.CharField(max_length=254)),
+                ('badgeclass', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='issuer.badgeclass')),
+                ('faculty', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='institution.faculty')),
+                ('institution', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='institution.institution')),
+                ('issuer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='issuer.issuer')),
+            ],
+            options={
+                'index_together': {('institution', 'year', 'month'), ('badgeclass', 'year', 'month')},
+            },
+        ),
+        migrations.CreateModel(
+            name='EnrollmentRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('denied', models.BooleanField(default=False)),
+                ('pending', models.BooleanField(default=False, help_text='No assertion has been awarded for the enrollment')),
+                ('badge_class', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='issuer.badgeclass')),
+                ('faculty', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='institution.faculty')),
+                ('institution', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='institution.institution')),
+                ('issuer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='issuer.issuer')),
+            ],
+            options={
+                'index_together': {('institution', 'year', 'month'), ('badge_class', 'year', 'month')},
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.24 on 2026-10-19 11:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insights', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupRefresh',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rollup', models.CharField(max_length=255, unique=True)),
+                ('refreshed_until', models.DateTimeField()),
+            ],
+        ),
+    ]
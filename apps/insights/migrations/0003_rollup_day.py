@@ -0,0 +1,52 @@
+# Generated by Django 3.2.24 on 2026-10-19 14:20
+
+import datetime
+from django.db import migrations, models
+
+
+def clear_rollups(apps, schema_editor):
+    # The existing rows have no day. Without a RollupRefresh the next refresh_insights run counts them again, run
+    # ./manage.py refresh_insights --full after migrating to do so right away
+    for model_name in ('AssertionRollup', 'DirectAwardRollup', 'EnrollmentRollup', 'RollupRefresh'):
+        apps.get_model('insights', model_name).objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insights', '0002_rolluprefresh'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_rollups, reverse_code=migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='assertionrollup',
+            name='day',
+            field=models.DateField(default=datetime.date(1970, 1, 1)),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='directawardrollup',
+            name='day',
+            field=models.DateField(default=datetime.date(1970, 1, 1)),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='enrollmentrollup',
+            name='day',
+            field=models.DateField(default=datetime.date(1970, 1, 1)),
+            preserve_default=False,
+        ),
+        migrations.AlterIndexTogether(
+            name='assertionrollup',
+            index_together={('institution', 'year', 'month'), ('badgeclass', 'year', 'month'), ('badgeclass', 'day'), ('institution', 'day')},
+        ),
+        migrations.AlterIndexTogether(
+            name='directawardrollup',
+            index_together={('institution', 'year', 'month'), ('badgeclass', 'year', 'month'), ('badgeclass', 'day'), ('institution', 'day')},
+        ),
+        migrations.AlterIndexTogether(
+            name='enrollmentrollup',
+            index_together={('institution', 'year', 'month'), ('badge_class', 'year', 'month'), ('badge_class', 'day'), ('institution', 'day')},
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.24 on 2026-10-19 16:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('insights', '0003_rollup_day'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirtyRollupBucket',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rollup', models.CharField(max_length=255)),
+                ('badgeclass_id', models.PositiveIntegerField()),
+                ('year', models.PositiveSmallIntegerField()),
+                ('month', models.PositiveSmallIntegerField()),
+            ],
+            options={
+                'unique_together': {('rollup', 'badgeclass_id', 'year', 'month')},
+            },
+        ),
+    ]
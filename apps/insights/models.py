@@ -0,0 +1,85 @@
+from django.db import models
+
+
+class BaseRollup(models.Model):
+    """
+    Daily counts of a source table per badgeclass. The issuer, faculty and institution of the badgeclass are
+    denormalized to filter without joins. Year and month are kept as well, the rows are recounted per badgeclass and
+    month by insights.rollups and never edited directly.
+    """
+    institution = models.ForeignKey('institution.Institution', on_delete=models.CASCADE, related_name='+')
+    faculty = models.ForeignKey('institution.Faculty', on_delete=models.CASCADE, related_name='+')
+    issuer = models.ForeignKey('issuer.Issuer', on_delete=models.CASCADE, related_name='+')
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class AssertionRollup(BaseRollup):
+    badgeclass = models.ForeignKey('issuer.BadgeClass', on_delete=models.CASCADE, related_name='+')
+    award_type = models.CharField(max_length=255)
+    public = models.BooleanField(default=False)
+    revoked = models.BooleanField(default=False)
+    expires_on = models.DateField(blank=True, null=True, default=None)
+
+    class Meta:
+        index_together = (
+            ('badgeclass', 'year', 'month'),
+            ('institution', 'year', 'month'),
+            ('badgeclass', 'day'),
+            ('institution', 'day'),
+        )
+
+
+class DirectAwardRollup(BaseRollup):
+    badgeclass = models.ForeignKey('issuer.BadgeClass', on_delete=models.CASCADE, related_name='+')
+    status = models.CharField(max_length=254)
+
+    class Meta:
+        index_together = (
+            ('badgeclass', 'year', 'month'),
+            ('institution', 'year', 'month'),
+            ('badgeclass', 'day'),
+            ('institution', 'day'),
+        )
+
+
+class EnrollmentRollup(BaseRollup):
+    badge_class = models.ForeignKey('issuer.BadgeClass', on_delete=models.CASCADE, related_name='+')
+    denied = models.BooleanField(default=False)
+    pending = models.BooleanField(default=False, help_text='No assertion has been awarded for the enrollment')
+
+    class Meta:
+        index_together = (
+            ('badge_class', 'year', 'month'),
+            ('institution', 'year', 'month'),
+            ('badge_class', 'day'),
+            ('institution', 'day'),
+        )
+
+
+class RollupRefresh(models.Model):
+    """High-water mark of the source rows that have been counted into a rollup by the refresh_insights command"""
+    rollup = models.CharField(max_length=255, unique=True)
+    refreshed_until = models.DateTimeField()
+
+    def __str__(self):
+        return '{} {}'.format(self.rollup, self.refreshed_until)
+
+
+class DirtyRollupBucket(models.Model):
+    """A month of a badgeclass with changed source rows, recounted into its rollup by the refresh_insights command"""
+    rollup = models.CharField(max_length=255)
+    badgeclass_id = models.PositiveIntegerField()
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+
+    class Meta:
+        unique_together = ('rollup', 'badgeclass_id', 'year', 'month')
+
+    def __str__(self):
+        return '{} {} {}-{}'.format(self.rollup, self.badgeclass_id, self.year, self.month)
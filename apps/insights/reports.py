@@ -0,0 +1,202 @@
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db.models import Count, Q
+
+logger = logging.getLogger('Badgr.Debug')
+
+
+# How every entity type reaches its badgeclasses, and which of them get_report() leaves out
+BADGECLASS_PATHS = {
+    'BadgeClass': ('', Q()),
+    'Issuer': ('badgeclasses__', Q()),
+    'Faculty': ('issuer__badgeclasses__', Q(issuer__archived=False)),
+    'Institution': ('faculty__issuer__badgeclasses__',
+                    Q(faculty__archived=False, faculty__issuer__archived=False)),
+}
+
+
+def _assertion_counts(path, condition):
+    assertions = f'{path}badgeinstances'
+    return {
+        'total_assertions_formal': Count(assertions, filter=condition & Q(**{f'{path}formal': True})),
+        'total_assertions_informal': Count(assertions, filter=condition & Q(**{f'{path}formal': False})),
+        'total_assertions_revoked': Count(assertions, filter=condition & Q(**{f'{assertions}__revoked': True})),
+        'total_recipients': Count(f'{assertions}__user', filter=condition, distinct=True),
+        # get_report() counts the assertions without a user as one recipient
+        'without_user': Count(assertions, filter=condition & Q(**{f'{assertions}__isnull': False,
+                                                                   f'{assertions}__user__isnull': True})),
+    }
+
+
+def _entity_counts(model):
+    """The number of badgeclasses, issuers and faculties of the entity"""
+    if model.__name__ == 'Issuer':
+        return {'total_badgeclasses': Count('badgeclasses', distinct=True)}
+    if model.__name__ == 'Faculty':
+        condition = Q(issuer__archived=False)
+        return {'total_badgeclasses': Count('issuer__badgeclasses', filter=condition, distinct=True),
+                'total_issuers': Count('issuer', filter=condition, distinct=True)}
+    if model.__name__ == 'Institution':
+        condition = Q(faculty__archived=False, faculty__issuer__archived=False)
+        return {'total_badgeclasses': Count('faculty__issuer__badgeclasses', filter=condition, distinct=True),
+                'total_issuers': Count('faculty__issuer', filter=condition, distinct=True),
+                'total_faculties': Count('faculty', filter=Q(faculty__archived=False), distinct=True)}
+    return {}
+
+
+def _grouped(model, pks, annotations):
+    """Returns the annotations per pk, every call is one grouped query"""
+    if not annotations:
+        return {}
+    return {row['pk']: row for row in model.objects.filter(pk__in=pks).values('pk').annotate(**annotations)}
+
+
+def get_reports(entities):
+    """
+    Returns the get_report() dictionary of every entity, keyed by entity. The entities can be any mix of
+    institutions, faculties, issuers and badgeclasses, each type is counted with a few grouped queries.
+    """
+    by_model = defaultdict(list)
+    for entity in entities:
+        by_model[entity.__class__].append(entity)
+    reports = {}
+    for model, model_entities in by_model.items():
+        path, condition = BADGECLASS_PATHS[model.__name__]
+        pks = [entity.pk for entity in model_entities]
+        # Separate queries, joining the enrollments and assertions in one query would multiply the counts
+        assertions = _grouped(model, pks, _assertion_counts(path, condition))
+        enrollments = _grouped(model, pks, {'total_enrollments': Count(f'{path}lti_students', filter=condition)})
+        entity_counts = _grouped(model, pks, _entity_counts(model))
+        admins = {}
+        if model.__name__ == 'Institution':
+            from staff.models import InstitutionStaff
+            admins = _grouped(model, pks, {'total_admins': Count(
+                'institutionstaff', filter=Q(**{f'institutionstaff__{permission}': True
+                                                for permission in InstitutionStaff.full_permissions()}))})
+        for entity in model_entities:
+            counts = {**assertions[entity.pk], **enrollments[entity.pk], **entity_counts.get(entity.pk, {}),
+                      **admins.get(entity.pk, {})}
+            counts['total_recipients'] += 1 if counts['without_user'] else 0
+            report = {'name': entity.name,
+                      'type': model.__name__.capitalize(),
+                      'id': entity.pk}
+            for field in REPORT_FIELDS[model.__name__]:
+                report[field] = counts[field]
+            reports[entity] = report
+    return reports
+
+
+def get_report(entity):
+    return get_reports([entity])[entity]
+
+
+# The counts of every entity type, in the order of get_report()
+REPORT_FIELDS = {
+    'BadgeClass': ('total_recipients', 'total_enrollments', 'total_assertions_formal', 'total_assertions_informal',
+                   'total_assertions_revoked'),
+    'Issuer': ('total_badgeclasses', 'total_enrollments', 'total_recipients', 'total_assertions_formal',
+               'total_assertions_informal', 'total_assertions_revoked'),
+    'Faculty': ('total_badgeclasses', 'total_issuers', 'total_enrollments', 'total_recipients',
+                'total_assertions_formal', 'total_assertions_informal', 'total_assertions_revoked'),
+    'Institution': ('total_badgeclasses', 'total_issuers', 'total_faculties', 'total_enrollments',
+                    'total_recipients', 'total_admins', 'total_assertions_formal', 'total_assertions_informal',
+                    'total_assertions_revoked'),
+}
+
+
+class InstitutionReportEngine(object):
+    """
+    Computes the get_report() dictionaries of the institutions and every entity in their branches with a fixed number
+    of grouped queries, instead of walking the branches and counting the cached assertions of every badgeclass.
+    The time spent in every stage is kept in timings.
+    """
+
+    def __init__(self, institution_ids):
+        self.institution_ids = list(institution_ids)
+        self.timings = defaultdict(float)
+
+    @contextmanager
+    def stage(self, name):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.timings[name] += time.monotonic() - start
+
+    def load_entities(self):
+        from institution.models import Faculty, Institution
+        from issuer.models import BadgeClass, Issuer
+        # The same branch as Institution.get_all_entities_in_branch, archived faculties and issuers are left out
+        self.institutions = list(Institution.objects.filter(pk__in=self.institution_ids).order_by('pk'))
+        self.faculties = list(Faculty.objects.filter(institution_id__in=self.institution_ids, archived=False))
+        self.issuers = list(Issuer.objects.filter(faculty__in=self.faculties, archived=False))
+        self.badgeclasses = list(BadgeClass.objects.filter(issuer__in=self.issuers))
+        self.faculties_by_institution = defaultdict(list)
+        for faculty in self.faculties:
+            self.faculties_by_institution[faculty.institution_id].append(faculty)
+        self.issuers_by_faculty = defaultdict(list)
+        for issuer in self.issuers:
+            self.issuers_by_faculty[issuer.faculty_id].append(issuer)
+        self.badgeclasses_by_issuer = defaultdict(list)
+        for badgeclass in self.badgeclasses:
+            self.badgeclasses_by_issuer[badgeclass.issuer_id].append(badgeclass)
+
+    def run(self):
+        """Returns the report rows of every entity, in the order of the branches of the institutions"""
+        with self.stage('entities'):
+            self.load_entities()
+        reports = {}
+        for stage, entities in (('institutions', self.institutions), ('faculties', self.faculties),
+                                ('issuers', self.issuers), ('badgeclasses', self.badgeclasses)):
+            with self.stage(stage):
+                reports.update(get_reports(entities))
+        rows = []
+        with self.stage('assemble'):
+            for institution in self.institutions:
+                branch = [institution]
+                for faculty in self.faculties_by_institution[institution.pk]:
+                    branch.append(faculty)
+                    for issuer in self.issuers_by_faculty[faculty.pk]:
+                        branch.append(issuer)
+                        branch += self.badgeclasses_by_issuer[issuer.pk]
+                rows += [{'institution': institution.name, **reports[entity]} for entity in branch]
+        return rows
+
+
+def institution_reports(institution_ids):
+    """Returns the report rows and the stage timings of the institutions, can run in a worker process"""
+    engine = InstitutionReportEngine(institution_ids)
+    rows = engine.run()
+    return rows, dict(engine.timings)
+
+
+def _close_inherited_connections():
+    # Forked workers must not share the database connections of the parent process
+    from django.db import connections
+    connections.close_all()
+
+
+def all_institution_reports(processes=None):
+    """
+    Yields the report rows of all institutions. With processes the institutions are divided over a pool of worker
+    processes, otherwise they are reported together in this process. The stage timings are logged.
+    """
+    from institution.models import Institution
+    institution_ids = list(Institution.objects.order_by('pk').values_list('pk', flat=True))
+    timings = defaultdict(float)
+    if processes and processes > 1:
+        from multiprocessing import Pool
+        _close_inherited_connections()
+        with Pool(processes=processes, initializer=_close_inherited_connections) as pool:
+            for rows, institution_timings in pool.imap(institution_reports, [[pk] for pk in institution_ids]):
+                for stage, duration in institution_timings.items():
+                    timings[stage] += duration
+                yield from rows
+    else:
+        rows, timings = institution_reports(institution_ids)
+        yield from rows
+    for stage, duration in timings.items():
+        logger.info(f"Report stage {stage} took {duration:.2f}s")
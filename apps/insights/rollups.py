@@ -0,0 +1,218 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BooleanField, Case, Count, Q, Value, When
+from django.db.models.functions import ExtractMonth, ExtractYear, TruncDate
+from django.utils import timezone
+
+from insights.models import AssertionRollup, DirectAwardRollup, DirtyRollupBucket, EnrollmentRollup, RollupRefresh
+
+BATCH_SIZE = 1000
+
+
+class RollupSpec(object):
+    """Describes how the rows of a source model are counted into a rollup model"""
+
+    def __init__(self, rollup_model, source_model_name, badgeclass_field, date_field, fields, computed_fields=None,
+                 changed_fields=None):
+        self.rollup_model = rollup_model
+        self.source_model_name = source_model_name
+        self.badgeclass_field = badgeclass_field
+        self.date_field = date_field
+        self.fields = fields
+        self.computed_fields = computed_fields or {}
+        # The timestamps of the source model that change when a counted row changes
+        self.changed_fields = changed_fields or [date_field]
+
+    @property
+    def name(self):
+        return self.rollup_model.__name__
+
+    @property
+    def source_model(self):
+        from django.apps import apps
+        return apps.get_model(self.source_model_name)
+
+    def aggregate(self, queryset):
+        """Yields unsaved rollup rows for the source rows in the queryset"""
+        bc = self.badgeclass_field
+        dimensions = [f'{bc}_id', f'{bc}__issuer_id', f'{bc}__issuer__faculty_id',
+                      f'{bc}__issuer__faculty__institution_id', 'rollup_year', 'rollup_month', 'rollup_day']
+        rows = queryset \
+            .annotate(rollup_year=ExtractYear(self.date_field), rollup_month=ExtractMonth(self.date_field),
+                      rollup_day=TruncDate(self.date_field), **self.computed_fields) \
+            .values(*dimensions, *self.fields, *self.computed_fields.keys()) \
+            .annotate(rollup_count=Count('id')) \
+            .order_by()
+        for row in rows.iterator():
+            yield self.rollup_model(**{f'{bc}_id': row[f'{bc}_id'],
+                                       'issuer_id': row[f'{bc}__issuer_id'],
+                                       'faculty_id': row[f'{bc}__issuer__faculty_id'],
+                                       'institution_id': row[f'{bc}__issuer__faculty__institution_id'],
+                                       'year': row['rollup_year'],
+                                       'month': row['rollup_month'],
+                                       'day': row['rollup_day'],
+                                       'count': row['rollup_count'],
+                                       **{field: row[field] for field in self.fields},
+                                       **{field: row[field] for field in self.computed_fields.keys()}})
+
+    def month_range(self, year, month):
+        start = timezone.make_aware(datetime(year, month, 1))
+        end = timezone.make_aware(datetime(year + month // 12, month % 12 + 1, 1))
+        return start, end
+
+    def refresh_bucket(self, badgeclass_id, year, month):
+        """Recounts the rollup rows of one badgeclass in one month from the source table"""
+        start, end = self.month_range(year, month)
+        source = self.source_model.objects.filter(**{f'{self.badgeclass_field}_id': badgeclass_id,
+                                                     f'{self.date_field}__gte': start,
+                                                     f'{self.date_field}__lt': end})
+        with transaction.atomic():
+            self.rollup_model.objects.filter(**{f'{self.badgeclass_field}_id': badgeclass_id,
+                                                'year': year, 'month': month}).delete()
+            self.rollup_model.objects.bulk_create(self.aggregate(source), batch_size=BATCH_SIZE)
+
+    def buckets(self, queryset):
+        """Returns the distinct (badgeclass_id, year, month) buckets of the source rows in the queryset"""
+        return queryset \
+            .annotate(rollup_year=ExtractYear(self.date_field), rollup_month=ExtractMonth(self.date_field)) \
+            .values_list(f'{self.badgeclass_field}_id', 'rollup_year', 'rollup_month') \
+            .distinct() \
+            .order_by()
+
+    def touched_buckets(self, since):
+        """Returns the distinct (badgeclass_id, year, month) buckets of the source rows changed since the datetime"""
+        changed = Q()
+        for field in self.changed_fields:
+            changed |= Q(**{f'{field}__gte': since})
+        return self.buckets(self.source_model.objects.filter(changed))
+
+    def backfill(self, chunk_size=BATCH_SIZE):
+        """
+        Recounts the complete rollup table, per chunk of badgeclasses so no transaction holds the whole table.
+        Yields the number of badgeclasses done after every chunk.
+        """
+        from issuer.models import BadgeClass
+        badgeclass_ids = list(BadgeClass.objects.order_by('pk').values_list('pk', flat=True))
+        for offset in range(0, len(badgeclass_ids), chunk_size):
+            chunk = badgeclass_ids[offset:offset + chunk_size]
+            source = self.source_model.objects.filter(**{f'{self.badgeclass_field}_id__in': chunk})
+            with transaction.atomic():
+                self.rollup_model.objects.filter(**{f'{self.badgeclass_field}_id__in': chunk}).delete()
+                self.rollup_model.objects.bulk_create(self.aggregate(source), batch_size=BATCH_SIZE)
+            yield offset + len(chunk)
+
+
+ASSERTIONS = RollupSpec(AssertionRollup, 'issuer.BadgeInstance', 'badgeclass', 'created_at',
+                        fields=['award_type', 'public', 'revoked'],
+                        computed_fields={'expires_on': TruncDate('expires_at')},
+                        changed_fields=['updated_at'])
+# updated_at is set when rows are created as well, so it is the only timestamp to check for changes
+DIRECT_AWARDS = RollupSpec(DirectAwardRollup, 'directaward.DirectAward', 'badgeclass', 'created_at',
+                           fields=['status'],
+                           changed_fields=['updated_at'])
+# StudentsEnrolled has no updated_at, an enrollment changes when it is awarded or denied
+ENROLLMENTS = RollupSpec(EnrollmentRollup, 'lti_edu.StudentsEnrolled', 'badge_class', 'date_created',
+                         fields=['denied'],
+                         changed_fields=['date_created', 'date_awarded', 'date_consent_given'],
+                         computed_fields={'pending': Case(When(badge_instance__isnull=True, then=Value(True)),
+                                                          default=Value(False), output_field=BooleanField())})
+ROLLUPS = (ASSERTIONS, DIRECT_AWARDS, ENROLLMENTS)
+
+_last_marked = threading.local()
+# The mark times are only kept to skip duplicate marks within a transaction, forgetting them is harmless
+MAX_MARKED_BUCKETS = 1000
+
+
+def mark_bucket_dirty(spec, badgeclass_id, date):
+    """
+    Marks the month of the date for the badgeclass to be recounted by refresh_dirty_buckets once the current
+    transaction commits. Recounting a whole month on every save is too expensive, the refresh_insights command
+    recounts the marked months in a batch. When one transaction touches the same bucket many times, e.g. while
+    creating a bundle of direct awards, it is marked only once.
+    """
+    if badgeclass_id is None or date is None:
+        return
+    date = timezone.localtime(date) if timezone.is_aware(date) else date
+    bucket = (spec.name, badgeclass_id, date.year, date.month)
+    registered_at = time.monotonic()
+
+    def _mark():
+        marked = getattr(_last_marked, 'buckets', None)
+        if marked is None:
+            marked = _last_marked.buckets = {}
+        if marked.get(bucket, 0) > registered_at:
+            return
+        DirtyRollupBucket.objects.bulk_create([DirtyRollupBucket(rollup=spec.name, badgeclass_id=badgeclass_id,
+                                                                 year=date.year, month=date.month)],
+                                              ignore_conflicts=True)
+        if len(marked) >= MAX_MARKED_BUCKETS:
+            # Long-lived workers would keep every bucket they ever marked
+            marked.clear()
+        marked[bucket] = time.monotonic()
+
+    transaction.on_commit(_mark)
+
+
+def mark_buckets_dirty(spec, queryset):
+    """
+    Marks the buckets of the source rows in the queryset once the current transaction commits. Queryset deletes and
+    updates bypass the save() and delete() that mark the buckets, call this before them.
+    """
+    for badgeclass_id, year, month in list(spec.buckets(queryset)):
+        mark_bucket_dirty(spec, badgeclass_id, datetime(year, month, 1))
+
+
+def refresh_dirty_buckets(spec):
+    """Recounts the buckets marked by mark_bucket_dirty. Returns the number of refreshed buckets."""
+    refreshed = 0
+    for dirty in list(DirtyRollupBucket.objects.filter(rollup=spec.name).order_by('pk')):
+        # The mark is removed before the recount, so changes committed during the recount mark the bucket again
+        deleted, _ = DirtyRollupBucket.objects.filter(pk=dirty.pk).delete()
+        if deleted:
+            spec.refresh_bucket(dirty.badgeclass_id, dirty.year, dirty.month)
+            refreshed += 1
+    return refreshed
+
+
+def refresh_touched_buckets(spec):
+    """
+    Recounts the buckets with source rows changed since the last refresh of the rollup and moves its high-water
+    mark, this finds the changes that bypass mark_bucket_dirty like bulk_create. Returns the number of refreshed
+    buckets, or None when a backfill is needed instead.
+
+    The high-water mark can not see deleted source rows, nor issuers and faculties that moved and changed the
+    denormalized issuer, faculty and institution of the rollups. Deletes through the models and the bulk deletes
+    mark their buckets dirty themselves, the rest is corrected by a full backfill every INSIGHTS_FULL_REFRESH_DAYS.
+    """
+    started_at = timezone.now()
+    state = RollupRefresh.objects.filter(rollup=spec.name).first()
+    if state is None:
+        # Never refreshed, only a backfill can count the existing rows
+        return None
+    backfilled = RollupRefresh.objects.filter(rollup=backfill_state_name(spec)).first()
+    if backfilled is None or \
+            backfilled.refreshed_until < started_at - timedelta(days=settings.INSIGHTS_FULL_REFRESH_DAYS):
+        return None
+    buckets = list(spec.touched_buckets(state.refreshed_until))
+    for badgeclass_id, year, month in buckets:
+        spec.refresh_bucket(badgeclass_id, year, month)
+    state.refreshed_until = started_at
+    state.save()
+    return len(buckets)
+
+
+def backfill_state_name(spec):
+    """The name of the RollupRefresh that holds the start of the last backfill of the rollup"""
+    return f'{spec.name}.backfill'
+
+
+def backfill(spec, chunk_size=BATCH_SIZE):
+    """Recounts the complete rollup in chunks and sets its high-water mark. Yields the progress per chunk."""
+    started_at = timezone.now()
+    yield from spec.backfill(chunk_size=chunk_size)
+    for rollup in (spec.name, backfill_state_name(spec)):
+        RollupRefresh.objects.update_or_create(rollup=rollup, defaults={'refreshed_until': started_at})
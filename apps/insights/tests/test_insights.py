@@ -0,0 +1,271 @@
+import json
+from datetime import date, datetime, timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from directaward.models import DirectAward
+from insights.api import badges_overview, badges_overview_sql, dict_fetch_all, DIRECT_AWARDS_OVERVIEW_SQL, \
+    MICRO_CREDENTIALS_BADGES_SQL, COUNT_MICRO_CREDENTIALS_SQL
+from insights.caching import invalidate_insights
+from insights.models import AssertionRollup
+from insights.rollups import ASSERTIONS, backfill, refresh_dirty_buckets
+from issuer.models import BadgeInstance
+from lti_edu.models import StudentsEnrolled
+from insights.reports import InstitutionReportEngine
+from mainsite.management.commands.benchmark_micro_credentials import badge_overview_rows
+from mainsite.tests import BadgrTestCase
+
+
+class InstitutionBadgesOverviewTest(SimpleTestCase):
+
+    def test_badges_overview_counts(self):
+        da_overview = [{'badgeclass_id': 1, 'da_count': 6}]
+        result = badges_overview(badge_overview_rows(2), da_overview)
+        self.assertEqual(len(result), 2)
+        report = result[0]
+        self.assertEqual(report['Total edubadges in backpack'], 4)
+        self.assertEqual(report['DA claimed'], 2)
+        self.assertEqual(report['DA revoked'], 2)
+        self.assertEqual(report['Requested accepted'], 2)
+        self.assertEqual(report['Requested revoked'], 2)
+        self.assertEqual(report['Public'], 4)
+        self.assertEqual(report['Total DA send'], 10)
+        self.assertEqual(report['Claim-rate'], 25)
+        self.assertEqual(result[1]['Claim-rate'], 100)
+
+
+class InsightsExportTest(BadgrTestCase):
+
+    def test_issuer_members_export(self):
+        teacher1 = self.setup_teacher(authenticate=True)
+        issuer = self.setup_issuer(created_by=teacher1, name_english='Export Issuer')
+        self.setup_staff_membership(teacher1, issuer, may_update=True)
+        response = self.client.get('/insights/institution/issuer-members/export.csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'issuer_name,email,name,role')
+        self.assertTrue(lines[1].startswith('Export Issuer,'))
+        self.assertTrue(lines[1].endswith(',Issuer Admin'))
+        response = self.client.get('/insights/institution/issuer-members/export.ndjson')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        self.assertEqual(rows[0]['role'], 'Issuer Admin')
+
+
+@override_settings(INSIGHTS_CACHE_TIMEOUT=0)
+class InsightsViewTest(BadgrTestCase):
+
+    def setup_insights(self):
+        teacher1 = self.setup_teacher(authenticate=True)
+        self.setup_badgeclass(issuer=self.setup_issuer(created_by=teacher1), name=settings.EDUID_BADGE_CLASS_NAME)
+        return teacher1, self.setup_badgeclass(issuer=self.setup_issuer(created_by=teacher1))
+
+    def assertion_count(self, year):
+        response = self.client.post('/insights/insight', json.dumps({'year': year}), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return sum(row['nbr'] for row in response.data['assertions'])
+
+    def test_badges_overview_queries_do_not_grow_with_badgeclasses(self):
+        teacher1, badgeclass = self.setup_insights()
+        self.setup_assertion(recipient=self.setup_student(), badgeclass=badgeclass, created_by=teacher1)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/insights/institution/badges-overview')
+        self.assertEqual(response.status_code, 200)
+        badgeclass_count = len(response.data)
+        for _ in range(3):
+            badgeclass = self.setup_badgeclass(issuer=badgeclass.issuer)
+            self.setup_assertion(recipient=self.setup_student(), badgeclass=badgeclass, created_by=teacher1)
+        with self.assertNumQueries(len(queries)):
+            response = self.client.get('/insights/institution/badges-overview')
+        self.assertEqual(len(response.data), badgeclass_count + 3)
+
+    def test_year_runs_from_first_monday_to_first_monday(self):
+        teacher1, badgeclass = self.setup_insights()
+        # 2020 starts on monday January 6th, its week 53 ends on sunday January 3rd 2021
+        for created_on in (date(2020, 1, 5), date(2020, 1, 6), date(2021, 1, 3), date(2021, 1, 4)):
+            assertion = self.setup_assertion(recipient=self.setup_student(), badgeclass=badgeclass,
+                                             created_by=teacher1)
+            BadgeInstance.objects.filter(pk=assertion.pk) \
+                .update(created_at=timezone.make_aware(datetime(created_on.year, created_on.month, created_on.day, 12)))
+        list(backfill(ASSERTIONS))
+        self.assertEqual(self.assertion_count(2020), 2)
+        self.assertEqual(self.assertion_count(2021), 1)
+
+    def test_assertions_expiring_today_are_not_counted(self):
+        teacher1, badgeclass = self.setup_insights()
+        now = timezone.localtime()
+        for expires_at in (now.replace(hour=23, minute=59), now + timedelta(days=1)):
+            self.setup_assertion(recipient=self.setup_student(), badgeclass=badgeclass, created_by=teacher1,
+                                 expires_at=expires_at)
+        refresh_dirty_buckets(ASSERTIONS)
+        self.assertEqual(self.assertion_count('total'), 1)
+
+
+class SynchronousThread(object):
+    """Runs the target of the thread on start, so the background revalidation can be asserted"""
+
+    def __init__(self, target, daemon=None):
+        self.target = target
+
+    def start(self):
+        self.target()
+
+
+class InsightsTimeSeriesTest(BadgrTestCase):
+
+    def test_time_series(self):
+        teacher1 = self.setup_teacher(authenticate=True)
+        issuer = self.setup_issuer(created_by=teacher1)
+        badgeclass = self.setup_badgeclass(issuer=issuer)
+        self.setup_assertion(recipient=self.setup_student(), badgeclass=badgeclass, created_by=teacher1)
+        self.setup_assertion(recipient=self.setup_student(), badgeclass=badgeclass, created_by=teacher1)
+        refresh_dirty_buckets(ASSERTIONS)
+        today = timezone.localdate()
+        response = self.client.get('/insights/insight/time-series', {'granularity': 'day',
+                                                                      'start': str(today - timedelta(days=7)),
+                                                                      'end': str(today)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sum(row['nbr'] for row in response.data['assertions']), 2)
+        self.assertEqual({row['period'] for row in response.data['assertions']}, {today})
+        response = self.client.get('/insights/insight/time-series', {'granularity': 'quarter',
+                                                                      'start': str(today + timedelta(days=1)),
+                                                                      'end': str(today + timedelta(days=90))})
+        self.assertEqual(response.data['assertions'], [])
+        response = self.client.get('/insights/insight/time-series', {'granularity': 'fortnight'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_time_series_is_revalidated_in_the_background(self):
+        # The reports of earlier tests may be cached under the same institution pk
+        cache.clear()
+        teacher1 = self.setup_teacher(authenticate=True)
+        badgeclass = self.setup_badgeclass(issuer=self.setup_issuer(created_by=teacher1))
+        self.setup_assertion(recipient=self.setup_student(), badgeclass=badgeclass, created_by=teacher1)
+        refresh_dirty_buckets(ASSERTIONS)
+        today = timezone.localdate()
+        params = {'granularity': 'day', 'start': str(today - timedelta(days=7)), 'end': str(today)}
+
+        def assertion_count():
+            response = self.client.get('/insights/insight/time-series', params)
+            self.assertEqual(response.status_code, 200)
+            return sum(row['nbr'] for row in response.data['assertions'])
+
+        with override_settings(INSIGHTS_CACHE_TIMEOUT=60, INSIGHTS_CACHE_STALE_TIMEOUT=60), \
+                mock.patch('insights.caching.threading.Thread', SynchronousThread):
+            self.assertEqual(assertion_count(), 1)
+            self.setup_assertion(recipient=self.setup_student(), badgeclass=badgeclass, created_by=teacher1)
+            refresh_dirty_buckets(ASSERTIONS)
+            invalidate_insights()
+            # The stale report is served while the revalidation computes the fresh one
+            self.assertEqual(assertion_count(), 1)
+            self.assertEqual(assertion_count(), 2)
+
+
+class InstitutionReportEngineTest(BadgrTestCase):
+
+    def test_reports(self):
+        teacher1 = self.setup_teacher()
+        institution = teacher1.institution
+        self.setup_staff_membership(teacher1, institution, may_create=True, may_read=True, may_update=True,
+                                    may_delete=True, may_award=True, may_sign=True, may_administrate_users=True)
+        faculty = self.setup_faculty(institution=institution)
+        issuer = self.setup_issuer(created_by=teacher1, faculty=faculty)
+        badgeclass = self.setup_badgeclass(issuer=issuer)
+        other_badgeclass = self.setup_badgeclass(issuer=issuer)
+        other_badgeclass.formal = True
+        other_badgeclass.save()
+        archived_issuer = self.setup_issuer(created_by=teacher1, faculty=faculty, archived=True)
+        self.setup_badgeclass(issuer=archived_issuer)
+        student = self.setup_student()
+        self.setup_assertion(recipient=student, badgeclass=badgeclass, created_by=teacher1)
+        self.setup_assertion(recipient=student, badgeclass=other_badgeclass, created_by=teacher1).revoke('reason')
+        self.setup_assertion(recipient=self.setup_student(), badgeclass=badgeclass, created_by=teacher1)
+        self.enroll_user(self.setup_student(), badgeclass)
+        self.assertEqual(badgeclass.get_report(), {
+            'name': badgeclass.name, 'type': 'Badgeclass', 'id': badgeclass.pk, 'total_recipients': 2,
+            'total_enrollments': 1, 'total_assertions_formal': 0, 'total_assertions_informal': 2,
+            'total_assertions_revoked': 0})
+        self.assertEqual(issuer.get_report(), {
+            'name': issuer.name, 'type': 'Issuer', 'id': issuer.pk, 'total_badgeclasses': 2, 'total_enrollments': 1,
+            'total_recipients': 2, 'total_assertions_formal': 1, 'total_assertions_informal': 2,
+            'total_assertions_revoked': 1})
+        institution_report = institution.get_report()
+        self.assertEqual(institution_report['total_badgeclasses'], 2)
+        self.assertEqual(institution_report['total_issuers'], 1)
+        self.assertEqual(institution_report['total_recipients'], 2)
+        self.assertEqual(institution_report['total_admins'], 1)
+        self.assertEqual(institution_report['total_assertions_revoked'], 1)
+
+        rows = InstitutionReportEngine([institution.pk]).run()
+        entities = institution.get_all_entities_in_branch()
+        self.assertEqual([(row['type'], row['id']) for row in rows],
+                         [(entity.__class__.__name__.capitalize(), entity.pk) for entity in entities])
+        self.assertEqual(rows[0], {'institution': institution.name, **institution_report})
+
+
+class InsightsQueryPlanTest(BadgrTestCase):
+    """
+    The insights queries must be able to use the indexes made for them. The tables of the tests are too small for the
+    optimizer to prefer an index, so the possible keys of the plan are checked instead of the chosen one.
+    """
+
+    def index_names(self, table, columns):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, table)
+        return {name for name, constraint in constraints.items()
+                if constraint['index'] and constraint['columns'][:len(columns)] == list(columns)}
+
+    def assertIndexCandidate(self, sql, table, columns, alias=None, params=()):
+        index_names = self.index_names(table, columns)
+        self.assertTrue(index_names, f'No index on {table} starts with {columns}')
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN ' + sql, params)
+            plan = dict_fetch_all(cursor)
+        possible_keys = set()
+        for row in plan:
+            if row['table'] == (alias or table) and row['possible_keys']:
+                possible_keys.update(row['possible_keys'].split(','))
+        self.assertTrue(index_names & possible_keys,
+                        f'None of {index_names} is a possible key for {table} in {plan}')
+
+    def assertQuerySetIndexCandidate(self, query_set, columns):
+        sql, params = query_set.query.sql_with_params()
+        self.assertIndexCandidate(sql, query_set.model._meta.db_table, columns, params=params)
+
+    def test_overview_queries(self):
+        self.assertIndexCandidate(badges_overview_sql(), 'issuer_badgeinstance',
+                                  ('badgeclass_id', 'award_type', 'public', 'revoked', 'expires_at'), alias='bi')
+        self.assertIndexCandidate(DIRECT_AWARDS_OVERVIEW_SQL, 'directaward_directaward', ('status', 'created_at'))
+
+    def test_micro_credential_queries(self):
+        self.assertIndexCandidate(MICRO_CREDENTIALS_BADGES_SQL, 'issuer_badgeclass',
+                                  ('badge_class_type', 'issuer_id'), alias='b')
+        self.assertIndexCandidate(MICRO_CREDENTIALS_BADGES_SQL, 'issuer_badgeclassextension',
+                                  ('name', 'badgeclass_id'))
+        self.assertIndexCandidate(COUNT_MICRO_CREDENTIALS_SQL, 'issuer_badgeinstance',
+                                  ('badgeclass_id', 'user_id'), alias='bi')
+
+    def test_rollup_queries(self):
+        now = timezone.now()
+        start = now - timedelta(days=30)
+        self.assertQuerySetIndexCandidate(
+            BadgeInstance.objects.filter(badgeclass_id=1, created_at__gte=start, created_at__lt=now),
+            ('badgeclass_id', 'created_at'))
+        self.assertQuerySetIndexCandidate(
+            DirectAward.objects.filter(badgeclass_id=1, created_at__gte=start, created_at__lt=now),
+            ('badgeclass_id', 'created_at'))
+        self.assertQuerySetIndexCandidate(
+            StudentsEnrolled.objects.filter(badge_class_id=1, date_created__gte=start, date_created__lt=now),
+            ('badge_class_id', 'date_created'))
+        self.assertQuerySetIndexCandidate(BadgeInstance.objects.filter(updated_at__gte=start), ('updated_at',))
+        self.assertQuerySetIndexCandidate(DirectAward.objects.filter(updated_at__gte=start), ('updated_at',))
+        self.assertQuerySetIndexCandidate(AssertionRollup.objects.filter(institution_id=1, year=2024),
+                                          ('institution_id', 'year', 'month'))
+        self.assertQuerySetIndexCandidate(
+            AssertionRollup.objects.filter(institution_id=1, day__gte=start.date(), day__lte=now.date()),
+            ('institution_id', 'day'))
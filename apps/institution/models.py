@@ -115,34 +115,8 @@ class Institution(EntityUserProvisionmentMixin, PermissionedModelMixin,
                 raise ValidationError(f"Invalid Eppn reg exp format: {e}")
 
     def get_report(self):
-        total_assertions_formal = 0
-        total_assertions_informal = 0
-        total_assertions_revoked = 0
-        total_enrollments = 0
-        unique_recipients = set()
-        for badgeclass in self.cached_badgeclasses():
-            for assertion in badgeclass.cached_assertions():
-                if badgeclass.formal:
-                    total_assertions_formal += 1
-                else:
-                    total_assertions_informal += 1
-                if assertion.revoked:
-                    total_assertions_revoked += 1
-                unique_recipients.add(assertion.user)
-            total_enrollments += badgeclass.cached_enrollments().__len__()
-        return {'name': self.name,
-                'type': self.__class__.__name__.capitalize(),
-                'id': self.pk,
-                'total_badgeclasss': self.cached_badgeclasses().__len__(),
-                'total_issuers': self.cached_issuers().__len__(),
-                'total_faculties': self.cached_faculties().__len__(),
-                'total_enrollments': total_enrollments,
-                'total_recipients': unique_recipients.__len__(),
-                'total_admins': [staff for staff in self.cached_staff() if
-                                 staff.permissions == staff.full_permissions()].__len__(),
-                'total_assertions_formal': total_assertions_formal,
-                'total_assertions_informal': total_assertions_informal,
-                'total_assertions_revoked': total_assertions_revoked}
+        from insights.reports import get_report
+        return get_report(self)
 
     @property
     def name(self):
@@ -167,6 +141,20 @@ class Institution(EntityUserProvisionmentMixin, PermissionedModelMixin,
         self.validate_unique()
         return super(Institution, self).save(*args, **kwargs)
 
+    def publish(self):
+        super(Institution, self).publish()
+        self.remove_award_eligibility_caches()
+        from issuer.models import BadgeClass, remove_endorsements_json_caches
+        remove_endorsements_json_caches(BadgeClass.objects.filter(issuer__faculty__institution=self))
+
+    def remove_award_eligibility_caches(self):
+        """Removes the cached award eligibility of the badgeclasses of this institution and of those allowing it"""
+        from issuer.models import BadgeClass, remove_award_eligibility_caches
+        remove_award_eligibility_caches(BadgeClass.objects
+                                        .filter(Q(issuer__faculty__institution=self) |
+                                                Q(award_allowed_institutions=self))
+                                        .values_list('pk', flat=True).distinct())
+
     def validate_unique(self, exclude=None):
         if self.name_dutch and self.name_english:
             query = Q(name_english=self.name_english) | Q(name_dutch=self.name_dutch)
@@ -319,31 +307,8 @@ class Faculty(EntityUserProvisionmentMixin,
         return self.return_value_according_to_language(self.description_english, self.description_dutch)
 
     def get_report(self):
-        total_assertions_formal = 0
-        total_assertions_informal = 0
-        total_assertions_revoked = 0
-        total_enrollments = 0
-        unique_recipients = set()
-        for badgeclass in self.cached_badgeclasses():
-            for assertion in badgeclass.cached_assertions():
-                if badgeclass.formal:
-                    total_assertions_formal += 1
-                else:
-                    total_assertions_informal += 1
-                if assertion.revoked:
-                    total_assertions_revoked += 1
-                unique_recipients.add(assertion.user)
-            total_enrollments += badgeclass.cached_enrollments().__len__()
-        return {'name': self.name,
-                'type': self.__class__.__name__.capitalize(),
-                'id': self.pk,
-                'total_badgeclasss': self.cached_badgeclasses().__len__(),
-                'total_issuers': self.cached_issuers().__len__(),
-                'total_enrollments': total_enrollments,
-                'total_recipients': unique_recipients.__len__(),
-                'total_assertions_formal': total_assertions_formal,
-                'total_assertions_informal': total_assertions_informal,
-                'total_assertions_revoked': total_assertions_revoked}
+        from insights.reports import get_report
+        return get_report(self)
 
     def validate_unique(self, exclude=None):
         if not self.archived:
@@ -391,6 +356,14 @@ class Faculty(EntityUserProvisionmentMixin,
         self.validate_unique()
         return super(Faculty, self).save(*args, **kwargs)
 
+    def publish(self):
+        super(Faculty, self).publish()
+        # the institution of the badgeclasses changes when the faculty moves to another institution
+        from issuer.models import BadgeClass, remove_award_eligibility_caches, remove_endorsements_json_caches
+        badgeclasses = BadgeClass.objects.filter(issuer__faculty=self)
+        remove_award_eligibility_caches(badgeclasses.values_list('pk', flat=True))
+        remove_endorsements_json_caches(badgeclasses)
+
     def create_staff_membership(self, user, permissions):
         return FacultyStaff.objects.create(user=user, faculty=self, **permissions)
 
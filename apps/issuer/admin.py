@@ -117,6 +117,11 @@ class BadgeClassAdmin(DjangoObjectActions, ModelAdmin):
     ]
     change_actions = ['redirect_issuer', 'redirect_instances', 'redirect_pathwaybadges']
 
+    def save_related(self, request, form, formsets, change):
+        super(BadgeClassAdmin, self).save_related(request, form, formsets, change)
+        # The award_allowed_institutions are saved after the badgeclass was published
+        form.instance.remove_cached_data(['cached_award_eligibility'])
+
     def badge_image(self, obj):
         return '<img src="{}" width="32"/>'.format(obj.image.url) if obj.image else ''
 
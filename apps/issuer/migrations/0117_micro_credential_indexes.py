@@ -0,0 +1,25 @@
+# Generated by Django 3.2.24 on 2026-10-19 14:20
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('issuer', '0116_migrate_studyLoad_to_timeExtension'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='badgeclass',
+            index_together={('badge_class_type', 'issuer')},
+        ),
+        migrations.AlterIndexTogether(
+            name='badgeclassextension',
+            index_together={('name', 'badgeclass')},
+        ),
+        migrations.AlterIndexTogether(
+            name='badgeinstance',
+            index_together={('recipient_identifier', 'badgeclass', 'revoked'), ('badgeclass', 'user')},
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.24 on 2026-10-19 15:02
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('issuer', '0117_micro_credential_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='badgeinstance',
+            index_together={('recipient_identifier', 'badgeclass', 'revoked'), ('badgeclass', 'user'),
+                            ('badgeclass', 'created_at'),
+                            ('badgeclass', 'award_type', 'public', 'revoked', 'expires_at'),
+                            ('issuer', 'created_at'), ('updated_at',)},
+        ),
+    ]
@@ -8,7 +8,6 @@ from json import dumps as json_dumps
 from json import loads as json_loads
 from urllib.parse import urljoin
 
-import requests
 from django.apps import apps
 from django.conf import settings
 from django.core.exceptions import ValidationError
@@ -39,6 +38,8 @@ from staff.mixins import PermissionedModelMixin
 from staff.models import BadgeClassStaff, IssuerStaff
 from .utils import generate_sha256_hashstring, CURRENT_OBI_VERSION, get_obi_context, add_obi_version_ifneeded, \
     UNVERSIONED_BAKED_VERSION
+from .validation import validate_assertion, invalidate_validation
+from .verification import verify_hosted_assertion
 
 AUTH_USER_MODEL = getattr(settings, 'AUTH_USER_MODEL', 'auth.User')
 logger = logging.getLogger('Badgr.Debug')
@@ -166,30 +167,8 @@ class Issuer(EntityUserProvisionmentMixin,
         return self.return_value_according_to_language(self.url_english, self.url_dutch)
 
     def get_report(self):
-        total_assertions_formal = 0
-        total_assertions_informal = 0
-        total_assertions_revoked = 0
-        total_enrollments = 0
-        unique_recipients = set()
-        for badgeclass in self.cached_badgeclasses():
-            for assertion in badgeclass.cached_assertions():
-                if badgeclass.formal:
-                    total_assertions_formal += 1
-                else:
-                    total_assertions_informal += 1
-                if assertion.revoked:
-                    total_assertions_revoked += 1
-                unique_recipients.add(assertion.user)
-            total_enrollments += badgeclass.cached_enrollments().__len__()
-        return {'name': self.name,
-                'type': self.__class__.__name__.capitalize(),
-                'id': self.pk,
-                'total_badgeclasses': self.cached_badgeclasses().__len__(),
-                'total_enrollments': total_enrollments,
-                'total_recipients': unique_recipients.__len__(),
-                'total_assertions_formal': total_assertions_formal,
-                'total_assertions_informal': total_assertions_informal,
-                'total_assertions_revoked': total_assertions_revoked}
+        from insights.reports import get_report
+        return get_report(self)
 
     def validate_unique(self, exclude=None):
         if not self.archived:
@@ -237,6 +216,12 @@ class Issuer(EntityUserProvisionmentMixin,
         self.validate_unique()
         return super(Issuer, self).save(*args, **kwargs)
 
+    def publish(self):
+        super(Issuer, self).publish()
+        # the institution of the badgeclasses changes when the issuer moves to another faculty
+        remove_award_eligibility_caches(self.badgeclasses.values_list('pk', flat=True))
+        remove_endorsements_json_caches(self.badgeclasses.all())
+
     @property
     def parent(self):
         return self.faculty
@@ -530,32 +515,17 @@ class BadgeClass(EntityUserProvisionmentMixin,
     tags = models.ManyToManyField('institution.BadgeClassTag', blank=True)
     class Meta:
         verbose_name_plural = "Badge classes"
+        index_together = (
+            ('badge_class_type', 'issuer'),
+        )
 
     @property
     def may_archive(self):
         return True
 
     def get_report(self):
-        total_assertions_formal = 0
-        total_assertions_informal = 0
-        total_assertions_revoked = 0
-        unique_recipients = set()
-        for assertion in self.cached_assertions():
-            if self.formal:
-                total_assertions_formal += 1
-            else:
-                total_assertions_informal += 1
-            if assertion.revoked:
-                total_assertions_revoked += 1
-            unique_recipients.add(assertion.user)
-        return {'name': self.name,
-                'type': self.__class__.__name__.capitalize(),
-                'id': self.pk,
-                'total_recipients': unique_recipients.__len__(),
-                'total_enrollments': self.cached_enrollments().__len__(),
-                'total_assertions_formal': total_assertions_formal,
-                'total_assertions_informal': total_assertions_informal,
-                'total_assertions_revoked': total_assertions_revoked}
+        from insights.reports import get_report
+        return get_report(self)
 
     def validate_unique(self, exclude=None):
         if not self.archived:
@@ -589,11 +559,42 @@ class BadgeClass(EntityUserProvisionmentMixin,
 
     @cached_method(auto_publish=True)
     def cached_endorsements(self):
-        return list(self.endorsements.all())
+        # the joined endorsers are removed with remove_endorsements_json_caches when they or their parents change
+        return list(self.endorsements.select_related('endorser__issuer__faculty__institution'))
 
     @cached_method(auto_publish=True)
     def cached_endorsed(self):
-        return list(self.endorsed.all())
+        return list(self.endorsed.select_related('endorsee'))
+
+    @cached_method()
+    def cached_endorsements_json(self):
+        """
+        the rendered public json of all endorsements, removed on every publish of this badgeclass and of the endorsers
+        and their issuer, faculty and institution
+        """
+        from public.public_api import BadgeClassJson
+        return [BadgeClassJson.endorsement_to_json(endorsement) for endorsement in self.cached_endorsements()]
+
+    def clear_endorsed_cache(self):
+        """
+        Removes the cached endorsements and their rendered json of all badgeclasses endorsed by this badgeclass,
+        as both contain the details of this badgeclass and its issuer, faculty and institution
+        """
+        for endorsement in self.cached_endorsed():
+            endorsement.endorsee.remove_cached_data(['cached_endorsements', 'cached_endorsements_json'])
+
+    @cached_method()
+    def cached_award_eligibility(self):
+        """
+        The schac_homes of the recipients that may accept a direct award of this badgeclass, removed on every publish
+        of this badgeclass and of its issuer, faculty and institution
+        """
+        institution = self.institution
+        institution_identifiers = {institution.identifier, institution.alternative_identifier} - {None, ''}
+        allowed_identifiers = set(self.award_allowed_institutions.values_list('identifier', flat=True)) - {None, ''}
+        return {'formal': self.formal,
+                'institution_identifiers': frozenset(institution_identifiers),
+                'identifiers': frozenset(institution_identifiers | allowed_identifiers)}
 
     @cached_method(auto_publish=True)
     def cached_direct_awards(self):
@@ -614,6 +615,8 @@ class BadgeClass(EntityUserProvisionmentMixin,
 
     def publish(self):
         super(BadgeClass, self).publish()
+        self.remove_cached_data(['cached_endorsements_json', 'cached_award_eligibility'])
+        self.clear_endorsed_cache()
         self.issuer.publish()
 
     def _get_terms(self):
@@ -788,8 +791,8 @@ class BadgeClass(EntityUserProvisionmentMixin,
             user=recipient, extensions=extensions,
             **kwargs
         )
-        message = EmailMessageMaker.create_earned_badge_mail(assertion)
         if send_email:
+            message = EmailMessageMaker.create_earned_badge_mail(assertion)
             recipient.email_user(subject='Je hebt een edubadge ontvangen! You received an edubadge!',
                                  html_message=message)
         return assertion
@@ -887,6 +890,22 @@ class BadgeClass(EntityUserProvisionmentMixin,
         return self.cached_issuer.cached_badgrapp
 
 
+def remove_award_eligibility_caches(badgeclass_ids):
+    """Removes the cached award eligibility of the badgeclasses"""
+    for pk in badgeclass_ids:
+        BadgeClass(pk=pk).remove_cached_data(['cached_award_eligibility'])
+
+
+def remove_endorsements_json_caches(endorsers):
+    """
+    Removes the cached endorsements and their rendered json of the badgeclasses endorsed by the endorsers, as both
+    contain the details of the endorsers and their issuer, faculty and institution
+    """
+    endorsee_ids = BadgeClass.objects.filter(endorsements__endorser__in=endorsers).values_list('pk', flat=True)
+    for pk in endorsee_ids.distinct():
+        BadgeClass(pk=pk).remove_cached_data(['cached_endorsements', 'cached_endorsements_json'])
+
+
 class BadgeInstance(BaseAuditedModel,
                     ImageUrlGetterMixin,
                     BaseVersionedEntity,
@@ -970,14 +989,17 @@ class BadgeInstance(BaseAuditedModel,
     class Meta:
         index_together = (
             ('recipient_identifier', 'badgeclass', 'revoked'),
+            ('badgeclass', 'user'),
+            ('badgeclass', 'created_at'),
+            ('badgeclass', 'award_type', 'public', 'revoked', 'expires_at'),
+            ('issuer', 'created_at'),
+            ('updated_at',),
         )
 
     def validate(self):
-        data = {'profile': {'id': self.recipient_identifier}, 'data': self.get_json()}
-        response = requests.post(json=data,
-                                 url=urljoin(settings.VALIDATOR_URL, 'results'),
-                                 headers={'Accept': 'application/json'})
-        return response.json()
+        if settings.LOCAL_ASSERTION_VERIFICATION and not self.source_url:
+            return verify_hosted_assertion(self)
+        return validate_assertion(self.entity_id, self.recipient_identifier, self.get_json())
 
     @property
     def extended_json(self):
@@ -1094,6 +1116,8 @@ class BadgeInstance(BaseAuditedModel,
         super(BadgeInstance, self).save(*args, **kwargs)
         self.badgeclass.remove_cached_data(['cached_assertions'])
         self.user.remove_cached_data(['cached_badgeinstances'])
+        from insights.rollups import ASSERTIONS, mark_bucket_dirty
+        mark_bucket_dirty(ASSERTIONS, self.badgeclass_id, self.created_at)
 
     def rebake(self, obi_version=CURRENT_OBI_VERSION, save=True, signature=None, replace_image=False):
         if self.source_url:
@@ -1135,6 +1159,8 @@ class BadgeInstance(BaseAuditedModel,
         badgeclass = self.badgeclass
         super(BadgeInstance, self).delete(*args, **kwargs)
         badgeclass.publish()
+        from insights.rollups import ASSERTIONS, mark_bucket_dirty
+        mark_bucket_dirty(ASSERTIONS, badgeclass.pk, self.created_at)
         if self.user:
             self.user.publish()
         self.publish_delete('entity_id', 'revoked')
@@ -1150,6 +1176,7 @@ class BadgeInstance(BaseAuditedModel,
         self.revocation_reason = revocation_reason
         self.image.delete()
         self.save()
+        invalidate_validation(self.entity_id)
 
         html_message = EmailMessageMaker.create_assertion_revoked_email(self)
         send_mail(subject='eduBadge has been revoked',
@@ -1233,9 +1260,7 @@ class BadgeInstance(BaseAuditedModel,
 
             if expand_user:
                 json['badge']['user'] = self.user.get_full_name()
-                from public.public_api import BadgeClassJson
-                json['badge']['endorsements'] = [BadgeClassJson.endorsement_to_json(bc) for bc in
-                                                 badge_class.cached_endorsements()]
+                json['badge']['endorsements'] = badge_class.cached_endorsements_json()
 
         if self.revoked:
             return OrderedDict([
@@ -1465,6 +1490,11 @@ class IssuerExtension(BaseOpenBadgeExtension):
 class BadgeClassExtension(BaseOpenBadgeExtension):
     badgeclass = models.ForeignKey('issuer.BadgeClass', on_delete=models.CASCADE)
 
+    class Meta:
+        index_together = (
+            ('name', 'badgeclass'),
+        )
+
     def publish(self):
         super(BadgeClassExtension, self).publish()
         self.badgeclass.publish()
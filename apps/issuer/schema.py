@@ -5,6 +5,7 @@ from django.conf import settings
 from graphene.relay import ConnectionField
 from graphene_django.types import DjangoObjectType, Connection
 
+from directaward.models import DirectAwardBundle
 from directaward.schema import DirectAwardType, DirectAwardBundleType
 from endorsement.schema import EndorsementType
 from lti_edu.schema import StudentsEnrolledType
@@ -15,6 +16,7 @@ from mainsite.utils import generate_image_url
 from staff.schema import IssuerStaffType, BadgeClassStaffType
 from .models import Issuer, BadgeClass, BadgeInstance, BadgeClassExtension, IssuerExtension, BadgeInstanceExtension, \
     BadgeClassAlignment, BadgeInstanceEvidence, BadgeInstanceCollection
+from .validation import ValidatorUnavailable
 
 
 class ExtensionResolverMixin(object):
@@ -154,7 +156,10 @@ class BadgeInstanceType(ImageResolverMixin, ExtensionResolverMixin, DjangoObject
                   'public', 'award_type', 'grade_achieved')
 
     def resolve_validation(self, info, **kwargs):
-        return self.validate()
+        try:
+            return self.validate()
+        except ValidatorUnavailable:
+            return None
 
     def resolve_evidences(self, info, **kwargs):
         return self.cached_evidence()
@@ -249,7 +254,8 @@ class BadgeClassType(ContentTypeIdResolverMixin, PermissionsResolverMixin, Staff
 
     @resolver_blocker_for_students
     def resolve_direct_award_bundles(self, info, **kwargs):
-        return self.cached_direct_award_bundles()
+        # The counters of all bundles are queried at once
+        return list(DirectAwardBundle.objects.filter(badgeclass=self).with_counts())
 
     @resolver_blocker_for_students
     def resolve_enrollments(self, info, **kwargs):
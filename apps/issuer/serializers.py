@@ -17,6 +17,7 @@ from rest_framework.exceptions import ErrorDetail, ValidationError
 from rest_framework.serializers import PrimaryKeyRelatedField
 
 from badgeuser.serializers import BadgeUserIdentifierField
+from directaward.models import delete_direct_awards
 from institution.models import Institution, BadgeClassTag
 from institution.serializers import FacultySlugRelatedField
 from lti_edu.models import StudentsEnrolled
@@ -546,7 +547,7 @@ class BadgeInstanceSerializer(OriginalJsonSerializerMixin, serializers.Serialize
         enrollment.save()
         enrollment.user.remove_cached_data(['cached_pending_enrollments'])
         # delete the pending direct awards for this badgeclass and this user
-        badgeclass.cached_pending_direct_awards().filter(eppn__in=enrollment.user.eppns).delete()
+        delete_direct_awards(list(badgeclass.cached_pending_direct_awards().filter(eppn__in=enrollment.user.eppns)))
         return assertion
 
 
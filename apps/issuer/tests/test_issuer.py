@@ -1,17 +1,23 @@
 import copy
 import json
 import os
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
 
+from django.core.cache import cache
 from django.db import IntegrityError
 from django.db.models import ProtectedError
 from django.urls import reverse
 
 from directaward.models import DirectAward
+from endorsement.models import Endorsement
 from institution.models import Institution
-from issuer.models import Issuer
+from issuer.models import Issuer, BadgeClass
 from issuer.testfiles.helper import issuer_json, badgeclass_json
+from issuer.validation import validate_assertion, CIRCUIT_FAILURES_KEY, CIRCUIT_OPEN_KEY, CIRCUIT_TRIPPED_KEY
 from mainsite.exceptions import BadgrValidationFieldError, BadgrValidationMultipleFieldError
 from mainsite.tests import BadgrTestCase
+from public.public_api import BadgeClassJson
 
 
 class IssuerAPITest(BadgrTestCase):
@@ -304,6 +310,103 @@ class IssuerPublicAPITest(BadgrTestCase):
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.data['name'], assertion.get_recipient_name())
 
+    def test_unknown_legacy_slug_is_not_found(self):
+        response = self.client.get('/public/badges/some-legacy-slug')
+        self.assertEqual(response.status_code, 404)
+        with self.assertNumQueries(0):
+            self.assertIsNone(BadgeClassJson(model=BadgeClass).get_entity_id_by_slug('some-legacy-slug'))
+
+
+class StubValidatorHandler(BaseHTTPRequestHandler):
+    requests_received = 0
+    failing = False
+
+    def do_POST(self):
+        StubValidatorHandler.requests_received += 1
+        self.rfile.read(int(self.headers['Content-Length']))
+        status_code = 500 if StubValidatorHandler.failing else 200
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps({'report': {'valid': True}}).encode())
+
+    def log_message(self, *args):
+        pass
+
+
+class AssertionValidationTest(BadgrTestCase):
+
+    def setUp(self):
+        super(AssertionValidationTest, self).setUp()
+        cache.delete_many([CIRCUIT_FAILURES_KEY, CIRCUIT_OPEN_KEY, CIRCUIT_TRIPPED_KEY])
+        StubValidatorHandler.requests_received = 0
+        StubValidatorHandler.failing = False
+        self.stub_validator = HTTPServer(('127.0.0.1', 0), StubValidatorHandler)
+        threading.Thread(target=self.stub_validator.serve_forever, daemon=True).start()
+        self.stub_validator_url = 'http://127.0.0.1:{}/'.format(self.stub_validator.server_port)
+
+    def tearDown(self):
+        self.stub_validator.shutdown()
+        self.stub_validator.server_close()
+        super(AssertionValidationTest, self).tearDown()
+
+    def _setup_public_assertion(self):
+        teacher1 = self.setup_teacher()
+        student = self.setup_student()
+        faculty = self.setup_faculty(institution=teacher1.institution)
+        issuer = self.setup_issuer(teacher1, faculty=faculty)
+        badgeclass = self.setup_badgeclass(issuer)
+        assertion = self.setup_assertion(student, badgeclass, teacher1)
+        assertion.public = True
+        assertion.save()
+        return assertion
+
+    def test_validation_is_cached_and_invalidated_on_revoke(self):
+        assertion = self._setup_public_assertion()
+        with self.settings(VALIDATOR_URL=self.stub_validator_url, LOCAL_ASSERTION_VERIFICATION=False):
+            for _ in range(3):
+                response = self.client.get('/public/assertions/validate/{}'.format(assertion.entity_id))
+                self.assertEqual(response.status_code, 200)
+            self.assertEqual(StubValidatorHandler.requests_received, 1)
+            assertion.revoke('revocation_reason')
+            assertion.validate()
+            self.assertEqual(StubValidatorHandler.requests_received, 2)
+
+    def test_concurrent_validations_are_coalesced(self):
+        assertion = self._setup_public_assertion()
+        assertion_json = assertion.get_json()
+        with self.settings(VALIDATOR_URL=self.stub_validator_url):
+            threads = [threading.Thread(target=validate_assertion,
+                                        args=(assertion.entity_id, assertion.recipient_identifier, assertion_json))
+                       for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(StubValidatorHandler.requests_received, 1)
+
+    def test_circuit_opens_after_failures(self):
+        assertion = self._setup_public_assertion()
+        StubValidatorHandler.failing = True
+        with self.settings(VALIDATOR_URL=self.stub_validator_url, VALIDATOR_CIRCUIT_FAILURE_THRESHOLD=2,
+                           LOCAL_ASSERTION_VERIFICATION=False):
+            for _ in range(4):
+                response = self.client.get('/public/assertions/validate/{}'.format(assertion.entity_id))
+                self.assertEqual(response.status_code, 503)
+        self.assertEqual(StubValidatorHandler.requests_received, 2)
+
+    def test_hosted_assertion_is_verified_locally(self):
+        assertion = self._setup_public_assertion()
+        with self.settings(VALIDATOR_URL=self.stub_validator_url):
+            response = self.client.get('/public/assertions/validate/{}'.format(assertion.entity_id))
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.data['report']['valid'])
+            assertion.revoke('revocation_reason')
+            report = assertion.validate()['report']
+            self.assertFalse(report['valid'])
+            self.assertEqual(report['messages'][0]['name'], 'ASSERTION_NOT_REVOKED')
+        self.assertEqual(StubValidatorHandler.requests_received, 0)
+
 
 # class IssuerExtensionsTest(BadgrTestCase):
 #
@@ -433,6 +536,39 @@ class IssuerModelsTest(BadgrTestCase):
         self.assertEqual(assertion_data['evidence'][0]['id'], 'http://valid.com')
         self.assertEqual(assertion_data['narrative'], 'assertion narrative')
 
+    def test_cached_get_remembers_missing_entities_until_created(self):
+        teacher1 = self.setup_teacher()
+        faculty = self.setup_faculty(institution=teacher1.institution)
+        issuer = self.setup_issuer(faculty=faculty, created_by=teacher1)
+        negative_hits = BadgeClass.cached.negative_hits()
+        with self.assertRaises(BadgeClass.DoesNotExist):
+            BadgeClass.cached.get(entity_id='not-yet-created')
+        with self.assertNumQueries(0):
+            with self.assertRaises(BadgeClass.DoesNotExist):
+                BadgeClass.cached.get(entity_id='not-yet-created')
+        self.assertEqual(BadgeClass.cached.negative_hits(), negative_hits + 1)
+        badgeclass = self.setup_badgeclass(issuer=issuer, entity_id='not-yet-created')
+        self.assertEqual(BadgeClass.cached.get(entity_id='not-yet-created').pk, badgeclass.pk)
+
+    def test_endorsements_caches_are_removed_on_endorser_issuer_and_institution_change(self):
+        teacher1 = self.setup_teacher()
+        faculty = self.setup_faculty(institution=teacher1.institution)
+        endorser = self.setup_badgeclass(issuer=self.setup_issuer(created_by=teacher1, faculty=faculty))
+        endorsee = self.setup_badgeclass(issuer=self.setup_issuer(created_by=teacher1, faculty=faculty))
+        Endorsement.objects.create(endorser=endorser, endorsee=endorsee, claim='claim', description='description')
+        self.assertEqual(len(endorsee.cached_endorsements_json()), 1)
+        institution = teacher1.institution
+        institution.name_english = 'Renamed Institution'
+        institution.save()
+        endorsement_json = endorsee.cached_endorsements_json()[0]
+        self.assertEqual(endorsement_json['endorser']['issuer']['faculty']['institution']['nameEnglish'],
+                         'Renamed Institution')
+        issuer = endorser.issuer
+        issuer.name_english = 'Renamed Issuer'
+        issuer.save()
+        self.assertEqual(endorsee.cached_endorsements()[0].endorser.issuer.name_english, 'Renamed Issuer')
+        self.assertEqual(endorsee.cached_endorsements_json()[0]['endorser']['issuer']['nameEnglish'], 'Renamed Issuer')
+
 
 class IssuerSchemaTest(BadgrTestCase):
 
@@ -0,0 +1,136 @@
+import hashlib
+import logging
+import threading
+from json import dumps as json_dumps
+from urllib.parse import urljoin
+
+import requests
+from django.conf import settings
+from django.core.cache import cache
+
+from cachemodel.utils import generate_cache_key
+
+logger = logging.getLogger('Badgr.Debug')
+
+CIRCUIT_FAILURES_KEY = 'validator_circuit_failures'
+CIRCUIT_OPEN_KEY = 'validator_circuit_open'
+CIRCUIT_TRIPPED_KEY = 'validator_circuit_tripped'
+
+
+class ValidatorUnavailable(Exception):
+    pass
+
+
+class _InFlightValidation(object):
+    """A validation request other threads with the same payload can wait for"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def _result_cache_key(content_hash):
+    return generate_cache_key(['Validation', 'result'], content_hash=content_hash)
+
+
+def _assertion_cache_key(entity_id):
+    return generate_cache_key(['Validation', 'assertion'], entity_id=entity_id)
+
+
+def _content_hash(payload):
+    return hashlib.sha256(json_dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _circuit_is_open():
+    return bool(cache.get(CIRCUIT_OPEN_KEY))
+
+
+def _record_success():
+    cache.delete_many([CIRCUIT_FAILURES_KEY, CIRCUIT_TRIPPED_KEY])
+
+
+def _record_failure():
+    reset_timeout = settings.VALIDATOR_CIRCUIT_RESET_TIMEOUT
+    cache.add(CIRCUIT_FAILURES_KEY, 0, reset_timeout)
+    try:
+        failures = cache.incr(CIRCUIT_FAILURES_KEY)
+    except ValueError:
+        failures = 1
+    # a failure right after the circuit was closed again re-opens it immediately
+    if failures >= settings.VALIDATOR_CIRCUIT_FAILURE_THRESHOLD or cache.get(CIRCUIT_TRIPPED_KEY):
+        logger.warning('Validator circuit opened after {} failure(s)'.format(failures))
+        cache.set(CIRCUIT_OPEN_KEY, True, reset_timeout)
+        cache.set(CIRCUIT_TRIPPED_KEY, True, reset_timeout * 2)
+        cache.delete(CIRCUIT_FAILURES_KEY)
+
+
+def _post_to_validator(payload):
+    if _circuit_is_open():
+        raise ValidatorUnavailable('Validator circuit is open')
+    try:
+        response = requests.post(json=payload,
+                                 url=urljoin(settings.VALIDATOR_URL, 'results'),
+                                 headers={'Accept': 'application/json'},
+                                 timeout=settings.VALIDATOR_TIMEOUT)
+        response.raise_for_status()
+        result = response.json()
+    except (requests.RequestException, ValueError) as e:
+        _record_failure()
+        raise ValidatorUnavailable(str(e))
+    _record_success()
+    return result
+
+
+def validate_assertion(entity_id, recipient_identifier, assertion_json):
+    """
+    Returns the validator report for the assertion json. Reports are cached by the hash of the validated
+    content, so any change to the assertion results in a new validation. Concurrent requests for the same
+    content within this process share one request to the validator.
+    Raises ValidatorUnavailable when the validator times out, errors or the circuit is open.
+    """
+    payload = {'profile': {'id': recipient_identifier}, 'data': assertion_json}
+    result_key = _result_cache_key(_content_hash(payload))
+    result = cache.get(result_key)
+    if result is not None:
+        return result
+
+    with _in_flight_lock:
+        in_flight = _in_flight.get(result_key)
+        is_leader = in_flight is None
+        if is_leader:
+            in_flight = _in_flight[result_key] = _InFlightValidation()
+
+    if not is_leader:
+        if not in_flight.done.wait(settings.VALIDATOR_TIMEOUT + 1):
+            raise ValidatorUnavailable('Timed out waiting for a concurrent validation')
+        if in_flight.error is not None:
+            raise in_flight.error
+        return in_flight.result
+
+    try:
+        result = _post_to_validator(payload)
+        cache.set(result_key, result, settings.VALIDATOR_CACHE_TIMEOUT)
+        cache.set(_assertion_cache_key(entity_id), result_key, settings.VALIDATOR_CACHE_TIMEOUT)
+        in_flight.result = result
+        return result
+    except ValidatorUnavailable as e:
+        in_flight.error = e
+        raise
+    finally:
+        in_flight.done.set()
+        with _in_flight_lock:
+            _in_flight.pop(result_key, None)
+
+
+def invalidate_validation(entity_id):
+    """Removes the last cached validator report of the assertion, e.g. after it has been revoked"""
+    assertion_key = _assertion_cache_key(entity_id)
+    result_key = cache.get(assertion_key)
+    if result_key is not None:
+        cache.delete(result_key)
+    cache.delete(assertion_key)
@@ -0,0 +1,115 @@
+import base64
+import json
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from cryptography.hazmat.primitives.serialization import load_pem_public_key
+from django.utils import timezone
+
+from .utils import CURRENT_OBI_VERSION, generate_sha256_hashstring
+
+JWS_HASH_ALGORITHMS = {
+    'RS256': hashes.SHA256,
+    'RS384': hashes.SHA384,
+    'RS512': hashes.SHA512,
+}
+
+
+def _b64url_decode(value):
+    return base64.urlsafe_b64decode(value + '=' * (-len(value) % 4))
+
+
+def _message(name, success, result=''):
+    return {'name': name, 'messageLevel': 'ERROR', 'success': success, 'result': result}
+
+
+def _verify_jws(signature, public_key_pem):
+    """Verifies a compact JWS and returns the signed payload, raises ValueError if the signature is not valid"""
+    try:
+        encoded_header, encoded_payload, encoded_signature = signature.strip().split('.')
+        header = json.loads(_b64url_decode(encoded_header))
+    except ValueError:
+        raise ValueError('Signature is not a compact JWS')
+    hash_algorithm = JWS_HASH_ALGORITHMS.get(header.get('alg'))
+    if hash_algorithm is None:
+        raise ValueError('Unsupported JWS algorithm {}'.format(header.get('alg')))
+    public_key = load_pem_public_key(public_key_pem.encode('utf-8'))
+    try:
+        public_key.verify(_b64url_decode(encoded_signature),
+                          '{}.{}'.format(encoded_header, encoded_payload).encode('utf-8'),
+                          padding.PKCS1v15(),
+                          hash_algorithm())
+    except InvalidSignature:
+        raise ValueError('JWS signature does not match the public key')
+    return json.loads(_b64url_decode(encoded_payload))
+
+
+def verify_hosted_assertion(badge_instance, recipient_identifier=None):
+    """
+    Verifies an assertion hosted by this server without calling the remote validator.
+    Returns a report in the same format as the remote validator.
+    """
+    recipient_identifier = recipient_identifier or badge_instance.recipient_identifier
+    badgeclass = badge_instance.cached_badgeclass
+    issuer = badge_instance.cached_issuer
+    assertion_json = badge_instance.get_json()
+    messages = []
+
+    if badge_instance.revoked:
+        messages.append(_message('ASSERTION_NOT_REVOKED', False,
+                                 'Assertion {} has been revoked.'.format(badge_instance.jsonld_id)))
+    else:
+        now = timezone.now()
+        if badge_instance.expires_at and badge_instance.expires_at < now:
+            messages.append(_message('ASSERTION_NOT_EXPIRED', False,
+                                     'Assertion expired on {}.'.format(badge_instance.expires_at.isoformat())))
+        if badge_instance.issued_on > now:
+            messages.append(_message('ASSERTION_TIMESTAMP_CHECKS', False,
+                                     'Assertion is issued in the future.'))
+
+        recipient = assertion_json['recipient']
+        if recipient['hashed']:
+            expected_identity = generate_sha256_hashstring(recipient_identifier.lower(), recipient.get('salt'))
+        else:
+            expected_identity = recipient_identifier
+        if recipient['identity'] != expected_identity:
+            messages.append(_message('VERIFY_RECIPIENT_IDENTIFIER', False,
+                                     'Recipient identifier does not match the assertion.'))
+
+        if badge_instance.issuer_id != badgeclass.issuer_id or assertion_json['badge'] != badgeclass.jsonld_id:
+            messages.append(_message('ISSUER_PROPERTY_DEPENDENCIES', False,
+                                     'Assertion badge does not belong to the issuer of the assertion.'))
+
+        if badge_instance.signature:
+            public_key_issuer = badge_instance.public_key_issuer
+            if public_key_issuer is None or public_key_issuer.public_key is None:
+                messages.append(_message('VERIFY_JWS', False, 'No public key known for the signed assertion.'))
+            else:
+                try:
+                    signed_json = _verify_jws(badge_instance.signature, public_key_issuer.public_key.public_key_pem)
+                    if signed_json.get('verification', {}).get('creator') != public_key_issuer.public_url:
+                        messages.append(_message('VERIFY_KEY_OWNERSHIP', False,
+                                                 'Signing key is not the key of the issuer.'))
+                    if signed_json.get('recipient', {}).get('identity') != recipient['identity']:
+                        messages.append(_message('VERIFY_RECIPIENT_IDENTIFIER', False,
+                                                 'Recipient identifier does not match the signed assertion.'))
+                    assertion_json = signed_json
+                except ValueError as e:
+                    messages.append(_message('VERIFY_JWS', False, str(e)))
+
+    return {
+        'input': {'value': badge_instance.jsonld_id, 'input_type': 'url'},
+        'graph': [assertion_json,
+                  badgeclass.get_json(obi_version=CURRENT_OBI_VERSION),
+                  issuer.get_json(obi_version=CURRENT_OBI_VERSION)],
+        'report': {
+            'valid': not messages,
+            'errorCount': len(messages),
+            'warningCount': 0,
+            'messages': messages,
+            'validationSubject': badge_instance.jsonld_id,
+            'openBadgesVersion': '2.0',
+            'recipientProfile': {'id': recipient_identifier},
+        }
+    }
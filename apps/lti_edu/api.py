@@ -1,5 +1,3 @@
-import threading
-
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from lxml.etree import strip_tags
@@ -12,7 +10,8 @@ from lti_edu.models import StudentsEnrolled
 from lti_edu.serializers import StudentsEnrolledSerializerWithRelations
 from mainsite.exceptions import BadgrApiException400, BadgrValidationError
 from mainsite.permissions import AuthenticatedWithVerifiedEmail
-from mainsite.utils import EmailMessageMaker, send_mail
+from mainsite.outbox import queue_mail
+from mainsite.utils import EmailMessageMaker
 from notifications.models import BadgeClassUserNotification
 from staff.permissions import HasObjectPermission
 
@@ -87,14 +86,13 @@ class StudentsEnrolledList(BaseEntityListView):
                         html_message = EmailMessageMaker.create_enrolment_notification_mail(badge_class,
                                                                                             request.user,
                                                                                             created_enrollment)
-                        send_mail(subject='Een edubadge is aangevraagd! An edubadge is requested!',
-                                  message=None, html_message=html_message,
-                                  recipient_list=[user_notification.user.email])
+                        queue_mail(subject='Een edubadge is aangevraagd! An edubadge is requested!',
+                                   message=None, html_message=html_message,
+                                   recipient_list=[user_notification.user.email])
                     else:
                         user_notification.delete()
 
-            thread = threading.Thread(target=send_notifications, args=(badge_class, enrollment))
-            thread.start()
+            send_notifications(badge_class, enrollment)
             return Response(data={'status': 'enrolled', 'entity_id': enrollment.entity_id}, status=201)
         raise BadgrApiException400('Cannot enroll', 209)
 
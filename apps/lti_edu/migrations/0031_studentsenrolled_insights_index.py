@@ -0,0 +1,17 @@
+# Generated by Django 3.2.24 on 2026-10-19 15:02
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lti_edu', '0030_auto_20220315_1624'),
+    ]
+
+    operations = [
+        migrations.AlterIndexTogether(
+            name='studentsenrolled',
+            index_together={('badge_class', 'date_created')},
+        ),
+    ]
@@ -23,12 +23,27 @@ class StudentsEnrolled(BaseVersionedEntity, models.Model):
     evidence_url = models.CharField(max_length=512, blank=True, null=True, default=None)
     narrative = models.TextField(blank=True, null=True, default=None)
 
+    class Meta:
+        index_together = (
+            ('badge_class', 'date_created'),
+        )
+
     def __str__(self):
         return self.email
 
     def save(self, *args, **kwargs):
+        from insights.rollups import ENROLLMENTS, mark_bucket_dirty
+        self.badge_class.remove_cached_data(['cached_enrollments', 'cached_pending_enrollments'])
+        result = super(StudentsEnrolled, self).save(*args, **kwargs)
+        mark_bucket_dirty(ENROLLMENTS, self.badge_class_id, self.date_created)
+        return result
+
+    def delete(self, *args, **kwargs):
+        from insights.rollups import ENROLLMENTS, mark_bucket_dirty
         self.badge_class.remove_cached_data(['cached_enrollments', 'cached_pending_enrollments'])
-        return super(StudentsEnrolled, self).save(*args, **kwargs)
+        result = super(StudentsEnrolled, self).delete(*args, **kwargs)
+        mark_bucket_dirty(ENROLLMENTS, self.badge_class_id, self.date_created)
+        return result
 
     @property
     def assertion_slug(self):
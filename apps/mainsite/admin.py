@@ -13,7 +13,7 @@ from django.contrib.admin import AdminSite, ModelAdmin, StackedInline
 from django.utils.module_loading import autodiscover_modules
 from django.utils.translation import ugettext_lazy
 from mainsite.models import BadgrApp, EmailBlacklist, ApplicationInfo, AccessTokenProxy, LegacyTokenProxy, \
-    SystemNotification
+    SystemNotification, QueuedEmail
 from oauth2_provider.models import get_application_model, get_grant_model, get_access_token_model, \
     get_refresh_token_model
 
@@ -70,6 +70,16 @@ class EmailBlacklistAdmin(ModelAdmin):
 badgr_admin.register(EmailBlacklist, EmailBlacklistAdmin)
 
 
+class QueuedEmailAdmin(ModelAdmin):
+    list_display = ('subject', 'status', 'attempts', 'send_after', 'created_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('subject',)
+    readonly_fields = ('subject', 'body', 'html', 'to', 'bcc', 'attempts', 'last_error', 'created_at', 'sent_at')
+
+
+badgr_admin.register(QueuedEmail, QueuedEmailAdmin)
+
+
 # 3rd party apps
 
 class LegacyTokenAdmin(ModelAdmin):
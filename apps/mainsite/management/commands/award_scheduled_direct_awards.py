@@ -1,15 +1,38 @@
 import logging
 
 from django.core.management.base import BaseCommand
-from django.db import IntegrityError
 from django.db import connections
-from django.utils import timezone
+
+
+def award_scheduled_bundles(now):
+    """
+    Activates the due scheduled bundles, each in its own transaction. The bundle row is locked and skipped when it is
+    locked already, so overlapping runs never activate a bundle twice. Returns the activated bundles.
+    """
+    from django.db import transaction
+    from directaward.models import DirectAwardBundle
+
+    due = list(DirectAwardBundle.objects.filter(scheduled_at__lt=now, status=DirectAwardBundle.STATUS_SCHEDULED)
+               .values_list('pk', flat=True))
+    activated = []
+    for pk in due:
+        with transaction.atomic():
+            bundle = DirectAwardBundle.objects \
+                .select_for_update(skip_locked=True) \
+                .filter(pk=pk, status=DirectAwardBundle.STATUS_SCHEDULED) \
+                .first()
+            if bundle is None:
+                # Activated or being activated by another run
+                continue
+            bundle.award_scheduled()
+        activated.append(bundle)
+    return activated
 
 
 class Command(BaseCommand):
 
     def handle(self, *args, **kwargs):
-        from directaward.models import DirectAwardBundle, DirectAward
+        from django.utils import timezone
 
         # Prevent MySQLdb._exceptions.OperationalError: (2006, 'MySQL server has gone away')
         connections.close_all()
@@ -17,25 +40,6 @@ class Command(BaseCommand):
         logger = logging.getLogger('Badgr.Debug')
         logger.info("Running award_scheduled_direct_awards")
 
-        direct_award_bundles = DirectAwardBundle.objects.filter(scheduled_at__lt=timezone.now(),
-                                                                status=DirectAwardBundle.STATUS_SCHEDULED).all()
-
-        for bundle in direct_award_bundles:
-            for da in bundle.directaward_set.all():
-                da.status = DirectAward.STATUS_UNACCEPTED
-                da.badgeclass.remove_cached_data(['cached_direct_awards'])
-                da.badgeclass.remove_cached_data(['cached_direct_award_bundles'])
-                try:
-                    da.save()
-                    da.notify_recipient()
-                except IntegrityError:
-                    pass
-
-            bundle.status = DirectAwardBundle.STATUS_ACTIVE
-            bundle.scheduled_at = None
-            bundle.save()
-            bundle.notify_awarder()
-
-            bundle.remove_cached_data(['cached_direct_awards'])
+        bundles = award_scheduled_bundles(timezone.now())
 
-        logger.info(f"Finished {len(direct_award_bundles)} award_scheduled_direct_awards")
+        logger.info(f"Finished {len(bundles)} award_scheduled_direct_awards")
@@ -0,0 +1,124 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from insights.api import COUNT_MICRO_CREDENTIALS_SQL, MICRO_CREDENTIALS_BADGES_SQL, badges_overview, dict_fetch_all
+
+# The correlated subqueries the micro-credential insights used before, kept to compare against
+CORRELATED_COUNT_MICRO_CREDENTIALS_SQL = """
+select ins.identifier, count(u.id) as user_count, (select count(bi.id) from issuer_badgeinstance bi where bi.user_id = u.id ) as assertion_count
+from users u
+ inner join issuer_badgeinstance bi on bi.user_id = u.id
+ inner join issuer_badgeclass b on b.id = bi.badgeclass_id
+ inner join issuer_issuer i on i.id = b.issuer_id
+ inner join institution_faculty f on f.id = i.faculty_id
+ inner join institution_institution ins on ins.id = f.institution_id
+ where b.badge_class_type = 'micro_credential' and ins.institution_type is not null
+ group by assertion_count, ins.identifier ;
+"""
+
+CORRELATED_MICRO_CREDENTIALS_BADGES_SQL = """
+select b.id, b.name as badgeclass_name, ins.name_english as institution_name, ins.identifier, b.created_at ,
+(select original_json from issuer_badgeclassextension where name = 'extensions:EQFExtension' and badgeclass_id = b.id limit 1) as eqf_value,
+(select original_json from issuer_badgeclassextension where name = 'extensions:ECTSExtension' and badgeclass_id = b.id limit 1) as ects_value,
+ (select original_json from issuer_badgeclassextension where name = 'extensions:StudyLoadExtension' and badgeclass_id = b.id limit 1) as study_load
+ from issuer_badgeclass b
+ inner join issuer_issuer i on i.id = b.issuer_id
+ inner join institution_faculty f on f.id = i.faculty_id
+ inner join institution_institution ins on ins.id = f.institution_id
+ where b.badge_class_type = 'micro_credential' and ins.institution_type is not null;
+"""
+
+
+def badge_overview_rows(badgeclass_count):
+    """Assertion counts as returned by the InstitutionBadgesOverview query, 8 rows per badgeclass"""
+    rows = []
+    for badgeclass_id in range(1, badgeclass_count + 1):
+        for award_type in ('direct_award', 'requested'):
+            for public in (0, 1):
+                for revoked in (0, 1):
+                    rows.append({'badge_class_id': badgeclass_id, 'award_type': award_type,
+                                 'badge_name': f'Badge {badgeclass_id}', 'badge_class_type': 'regular',
+                                 'public_badge': public, 'revoked': revoked,
+                                 'institution_name': f'Institution {badgeclass_id % 50}', 'backpack_count': 1})
+    return rows
+
+
+def seed_micro_credentials(assertions):
+    """Clears and seeds the database with mainsite/seeds and marks the seeded badgeclasses as micro-credentials"""
+    from issuer.models import BadgeClass, BadgeClassExtension
+    from mainsite.management.commands.seed import clear_data, run_seeds, run_scaled_seed
+    clear_data()
+    run_seeds()
+    run_scaled_seed(scale=assertions)
+    BadgeClass.objects.update(badge_class_type=BadgeClass.BADGE_CLASS_TYPE_MICRO)
+    for badgeclass in BadgeClass.objects.all():
+        for name in ('extensions:EQFExtension', 'extensions:ECTSExtension'):
+            BadgeClassExtension.objects.get_or_create(badgeclass=badgeclass, name=name,
+                                                      defaults={'original_json': '{}'})
+
+
+class Command(BaseCommand):
+    """
+    A command to compare the micro-credential insights queries with the correlated subqueries they replaced and to time
+    the InstitutionBadgesOverview report for a number of badgeclasses.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('-s', '--seed', type=int,
+                            help='Clear and seed the database with this many extra assertions first')
+        parser.add_argument('--force', action="store_true", help='Allow --seed to clear the database without DEBUG')
+        parser.add_argument('-r', '--repeat', type=int, default=5)
+        parser.add_argument('-b', '--badges-overview', type=int, metavar='BADGECLASSES',
+                            help='Time the badges overview report for this many badgeclasses instead, 50000 took '
+                                 'minutes before the report was computed in one pass')
+
+    def timed(self, sql, repeat):
+        durations = []
+        with connection.cursor() as cursor:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                cursor.execute(sql, [])
+                rows = dict_fetch_all(cursor)
+                durations.append(time.perf_counter() - start)
+        return rows, min(durations)
+
+    def time_badges_overview(self, badgeclass_count, repeat):
+        badge_overview = badge_overview_rows(badgeclass_count)
+        da_overview = [{'badgeclass_id': badgeclass_id, 'da_count': 3}
+                       for badgeclass_id in range(1, badgeclass_count + 1)]
+        durations = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = badges_overview(badge_overview, da_overview)
+            durations.append(time.perf_counter() - start)
+        self.stdout.write(f"InstitutionBadgesOverview: {len(result)} badgeclasses, {min(durations) * 1000:.1f}ms")
+
+    def handle(self, *args, **options):
+        if options['badges_overview']:
+            self.time_badges_overview(options['badges_overview'], options['repeat'])
+            return
+
+        if options['seed']:
+            if not settings.ALLOW_SEEDS:
+                self.stderr.write('Seeding is not allowed, set ALLOW_SEEDS')
+                return
+            # Seeding clears all data first
+            if not settings.DEBUG and not options['force']:
+                self.stderr.write('Seeding clears the database, use --force when DEBUG is not set')
+                return
+            seed_micro_credentials(options['seed'])
+
+        for name, before, after in (
+                ('CountMicroCredentials', CORRELATED_COUNT_MICRO_CREDENTIALS_SQL, COUNT_MICRO_CREDENTIALS_SQL),
+                ('MicroCredentialsBadgeOverview', CORRELATED_MICRO_CREDENTIALS_BADGES_SQL,
+                 MICRO_CREDENTIALS_BADGES_SQL)):
+            before_rows, before_duration = self.timed(before, options['repeat'])
+            after_rows, after_duration = self.timed(after, options['repeat'])
+            same = sorted(map(str, before_rows)) == sorted(map(str, after_rows))
+            self.stdout.write(f"{name}: {len(after_rows)} rows, correlated {before_duration * 1000:.1f}ms, "
+                              f"joined {after_duration * 1000:.1f}ms, "
+                              f"speedup {before_duration / max(after_duration, 1e-9):.1f}x, "
+                              f"{'same results' if same else 'DIFFERENT RESULTS'}")
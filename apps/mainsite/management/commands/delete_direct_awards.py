@@ -1,27 +1,67 @@
 import logging
-from datetime import datetime
+import time
 
 from django.core.management.base import BaseCommand
 from django.db import connections
-from django.utils.timezone import make_aware
+
+logger = logging.getLogger('Badgr.Debug')
+
+
+def delete_expired_direct_awards(now, batch_size=1000, sleep=0):
+    """
+    Deletes the direct awards with the status Deleted and a delete_at before now, batch_size rows per transaction
+    with a pause of sleep seconds in between so other queries get the table. The cached direct awards are removed
+    once per badgeclass and bundle at the end. Returns the number of deleted direct awards.
+    """
+    from django.core.cache import cache
+    from django.db import transaction
+    from django.utils import timezone
+    from directaward.models import DirectAward, mark_direct_award_rollups, remove_direct_award_caches
+
+    deleted = 0
+    badgeclass_ids, bundle_ids, months = set(), set(), {}
+    while True:
+        chunk = list(DirectAward.objects
+                     .filter(delete_at__lt=now, status=DirectAward.STATUS_DELETED)
+                     .only('pk', 'entity_id', 'badgeclass_id', 'bundle_id', 'created_at')
+                     .order_by('pk')[:batch_size])
+        if not chunk:
+            break
+        with transaction.atomic():
+            DirectAward.objects.filter(pk__in=[direct_award.pk for direct_award in chunk]).delete()
+        # What CacheModel.delete removes for every single direct award
+        cache.delete_many([direct_award.publish_key(field) for direct_award in chunk for field in ('pk', 'entity_id')])
+        deleted += len(chunk)
+        for direct_award in chunk:
+            badgeclass_ids.add(direct_award.badgeclass_id)
+            bundle_ids.add(direct_award.bundle_id)
+            created_at = timezone.localtime(direct_award.created_at)
+            months[(direct_award.badgeclass_id, created_at.year, created_at.month)] = direct_award
+        logger.info(f"Deleted {deleted} direct_awards")
+        if sleep:
+            time.sleep(sleep)
+    remove_direct_award_caches(badgeclass_ids, bundle_ids)
+    mark_direct_award_rollups(months.values())
+    return deleted
 
 
 class Command(BaseCommand):
     """A command to delete direct awards with the status Deleted."""
 
-    def handle(self, *args, **kwargs):
-        from directaward.models import DirectAward
+    def add_arguments(self, parser):
+        parser.add_argument('-b', '--batch-size', type=int, default=1000,
+                            help='Number of direct awards deleted per transaction')
+        parser.add_argument('-s', '--sleep', type=float, default=0.5, help='Seconds to pause between the batches')
+
+    def handle(self, *args, **options):
+        from django.utils import timezone
 
         # Prevent MySQLdb._exceptions.OperationalError: (2006, 'MySQL server has gone away')
         connections.close_all()
 
-        logger = logging.getLogger('Badgr.Debug')
         logger.info("Running delete_direct_awards")
 
-        direct_awards = DirectAward.objects.filter(delete_at__lt=make_aware(datetime.utcnow()),
-                                                   status='Deleted').all()
-
-        for direct_award in direct_awards:
-            direct_award.delete()
+        deleted = delete_expired_direct_awards(timezone.now(), batch_size=options['batch_size'],
+                                               sleep=options['sleep'])
 
-        logger.info(f"Deleted {len(direct_awards)} direct_awards")
+        logger.info(f"Deleted {deleted} direct_awards")
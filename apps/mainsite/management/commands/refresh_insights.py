@@ -0,0 +1,39 @@
+import logging
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+class Command(BaseCommand):
+    """
+    A command to refresh the monthly insights rollups. By default only the months marked dirty by saves and deletes
+    and the months with assertions, direct awards or enrollments changed since the previous run are recounted. Run it
+    every few minutes to keep the insights current. Use --full to recount everything, this also happens when the last
+    full recount is older than INSIGHTS_FULL_REFRESH_DAYS.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('-f', '--full', action="store_true", help='Recount all rollups from scratch')
+        parser.add_argument('-c', '--chunk-size', type=int, default=1000,
+                            help='Number of badgeclasses recounted per transaction with --full')
+
+    def handle(self, *args, **options):
+        from insights.caching import invalidate_insights
+        from insights.rollups import ROLLUPS, backfill, refresh_dirty_buckets, refresh_touched_buckets
+
+        # Prevent MySQLdb._exceptions.OperationalError: (2006, 'MySQL server has gone away')
+        connections.close_all()
+
+        logger = logging.getLogger('Badgr.Debug')
+        logger.info(f"Running refresh_insights full={options['full']}")
+
+        for spec in ROLLUPS:
+            logger.info(f"Refreshed {refresh_dirty_buckets(spec)} dirty {spec.name} buckets")
+            refreshed = None if options['full'] else refresh_touched_buckets(spec)
+            if refreshed is None:
+                for done in backfill(spec, chunk_size=options['chunk_size']):
+                    logger.info(f"Backfilled {spec.name} for {done} badgeclasses")
+            else:
+                logger.info(f"Refreshed {refreshed} {spec.name} buckets")
+
+        invalidate_insights()
@@ -0,0 +1,108 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+logger = logging.getLogger('Badgr.Debug')
+
+
+def due_direct_awards(cutoff):
+    """
+    The querysets of the unaccepted direct awards that were created or last resent before cutoff. These are two
+    range queries, on the ('status', 'created_at') and the ('status', 'resend_at') index, instead of one query on the
+    coalesce of both columns which can not use an index.
+    """
+    from directaward.models import DirectAward
+    unaccepted = DirectAward.objects.filter(status=DirectAward.STATUS_UNACCEPTED)
+    return (unaccepted.filter(created_at__lt=cutoff, resend_at__isnull=True),
+            unaccepted.filter(resend_at__lt=cutoff))
+
+
+def process_in_chunks(queryset, handle, batch_size, sleep):
+    """
+    Calls handle with chunks of batch_size direct awards, each in its own transaction. handle must update the direct
+    awards so they no longer match the queryset. Returns the number of processed direct awards.
+    """
+    from django.db import transaction
+    processed = 0
+    while True:
+        chunk = list(queryset.select_related('badgeclass__issuer__faculty').order_by('pk')[:batch_size])
+        if not chunk:
+            return processed
+        with transaction.atomic():
+            handle(chunk)
+        processed += len(chunk)
+        logger.info(f"Processed {processed} direct_awards")
+        if sleep:
+            time.sleep(sleep)
+
+
+def expire_direct_awards(direct_awards):
+    """Marks the direct awards as deleted and queues the expired mail to the recipients"""
+    from django.conf import settings
+    from django.utils import timezone
+    from directaward.models import DirectAward, update_direct_awards
+    from mainsite.utils import EmailMessageMaker
+
+    delete_at = timezone.now() + timedelta(days=settings.DIRECT_AWARDS_DELETION_THRESHOLD_DAYS)
+    update_direct_awards(direct_awards, status=DirectAward.STATUS_DELETED, revocation_reason='Expired',
+                         delete_at=delete_at)
+    DirectAward.queue_notifications(direct_awards,
+                                    subject='Je edubadge is verlopen. Your edubadge has expired',
+                                    mail_maker=EmailMessageMaker.direct_award_expired_student_mail)
+
+
+def remind_direct_awards(direct_awards):
+    """Marks that the reminder was sent and queues the reminder mail to the recipients"""
+    from directaward.models import DirectAward, update_direct_awards
+    from mainsite.utils import EmailMessageMaker
+
+    update_direct_awards(direct_awards, warning_email_send=True)
+    DirectAward.queue_notifications(direct_awards,
+                                    subject='Je edubadge verloopt binnenkort. Your edubadge will expire soon',
+                                    mail_maker=EmailMessageMaker.direct_award_reminder_student_mail)
+
+
+def sweep_direct_awards(now, batch_size=1000, sleep=0):
+    """
+    Expires the unaccepted direct awards created or resent DIRECT_AWARDS_EXPIRATION_DAYS before now and sends a
+    reminder for the ones older than DIRECT_AWARDS_REMINDER_DAYS. Returns the counts.
+    """
+    from django.conf import settings
+
+    counts = {'expired': 0, 'reminded': 0}
+    expiration_cutoff = now - timedelta(days=settings.DIRECT_AWARDS_EXPIRATION_DAYS)
+    for queryset in due_direct_awards(expiration_cutoff):
+        counts['expired'] += process_in_chunks(queryset, expire_direct_awards, batch_size, sleep)
+    # Expired direct awards are no longer unaccepted, so these are the ones between both cutoffs
+    reminder_cutoff = now - timedelta(days=settings.DIRECT_AWARDS_REMINDER_DAYS)
+    for queryset in due_direct_awards(reminder_cutoff):
+        counts['reminded'] += process_in_chunks(queryset.filter(warning_email_send=False), remind_direct_awards,
+                                                batch_size, sleep)
+    return counts
+
+
+class Command(BaseCommand):
+    """
+    A command to send a reminder to the recipients of direct awards they did not accept, and to expire the direct
+    awards when they are still not accepted. The mails are sent through the outbox.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('-b', '--batch-size', type=int, default=1000,
+                            help='Number of direct awards updated per transaction')
+        parser.add_argument('-s', '--sleep', type=float, default=0.5, help='Seconds to pause between the batches')
+
+    def handle(self, *args, **options):
+        from django.utils import timezone
+
+        # Prevent MySQLdb._exceptions.OperationalError: (2006, 'MySQL server has gone away')
+        connections.close_all()
+
+        logger.info("Running remind_direct_awards")
+
+        counts = sweep_direct_awards(timezone.now(), batch_size=options['batch_size'], sleep=options['sleep'])
+
+        logger.info(f"Expired {counts['expired']} and reminded {counts['reminded']} direct_awards")
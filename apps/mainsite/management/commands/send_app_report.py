@@ -1,34 +1,43 @@
+import os
+import tempfile
+
+from backports import csv
 from django.core.mail import EmailMessage
 from django.core.management.base import BaseCommand
 from django.conf import settings
-from institution.models import Institution
 from datetime import datetime
-import pandas
+
+REPORT_FIELDNAMES = ('institution', 'name', 'type', 'id', 'total_badgeclasses', 'total_issuers', 'total_faculties',
+                     'total_enrollments', 'total_recipients', 'total_admins', 'total_assertions_formal',
+                     'total_assertions_informal', 'total_assertions_revoked')
 
 
 class Command(BaseCommand):
     """A command to create and send the application report."""
 
-    def handle(self, *args, **kwargs):
-        institutions = Institution.objects.all()
-        reports = []
-        for institution in institutions:
-            all_institution_entities = institution.get_all_entities_in_branch()
-            for entity in all_institution_entities:
-                report = {'institution': institution.name}
-                report.update(entity.get_report())
-                reports.append(report)
-        report = pandas.DataFrame(reports)
-        csv_string = report.to_csv(sep=',')
+    def add_arguments(self, parser):
+        parser.add_argument('-p', '--processes', type=int, default=None,
+                            help='Number of worker processes the institutions are divided over')
+
+    def handle(self, *args, **options):
+        from insights.reports import all_institution_reports
+
         filename = 'edubadges_report_{}.csv'.format(datetime.today().strftime('%Y-%m-%d'))
         body = 'Dear sir/madam, \n\n' \
                'In the attached csv file you will find your Edubadges report. \n\n' \
                'Regards \n\n' \
                'The Edubadges team'
-        if settings.REPORT_RECEIVER_EMAIL:
-            email = EmailMessage(subject='Your Edubadges report is here!',
-                                 body=body,
-                                 to=[settings.REPORT_RECEIVER_EMAIL],
-                                 # attachments=[(filename, report_file.getvalue(), 'text/csv')])
-                                 attachments=[(filename, csv_string, 'text/csv')])
-            email.send()
+        # The rows are written to a file one at a time, the file is attached from disk
+        with tempfile.TemporaryDirectory() as report_dir:
+            report_path = os.path.join(report_dir, filename)
+            with open(report_path, 'w', newline='') as report_file:
+                writer = csv.DictWriter(report_file, fieldnames=REPORT_FIELDNAMES, extrasaction='ignore')
+                writer.writeheader()
+                for report in all_institution_reports(processes=options['processes']):
+                    writer.writerow(report)
+            if settings.REPORT_RECEIVER_EMAIL:
+                email = EmailMessage(subject='Your Edubadges report is here!',
+                                     body=body,
+                                     to=[settings.REPORT_RECEIVER_EMAIL])
+                email.attach_file(report_path, 'text/csv')
+                email.send()
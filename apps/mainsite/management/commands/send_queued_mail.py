@@ -0,0 +1,44 @@
+import logging
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+
+class Command(BaseCommand):
+    """
+    A command to send the mails in the outbox. It sends the pending mails that are due and stops, or with --loop keeps
+    polling the outbox.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('-b', '--batch-size', type=int, default=None,
+                            help='Number of mails sent over one connection, defaults to OUTBOX_BATCH_SIZE')
+        parser.add_argument('-r', '--rate-limit', type=int, default=None,
+                            help='Maximum number of mails per second, defaults to OUTBOX_RATE_LIMIT')
+        parser.add_argument('-l', '--loop', action="store_true", help='Keep polling the outbox')
+        parser.add_argument('-s', '--sleep', type=int, default=10, help='Seconds between polls with --loop')
+
+    def handle(self, *args, **options):
+        from mainsite.outbox import outbox_metrics, purge_sent_mail, send_queued_mail
+
+        # Prevent MySQLdb._exceptions.OperationalError: (2006, 'MySQL server has gone away')
+        connections.close_all()
+
+        logger = logging.getLogger('Badgr.Debug')
+        logger.info("Running send_queued_mail")
+
+        while True:
+            try:
+                counts = send_queued_mail(batch_size=options['batch_size'], rate_limit=options['rate_limit'])
+                purged = purge_sent_mail()
+                logger.info(f"Outbox sent {counts['sent']}, retried {counts['retried']}, failed {counts['failed']}, "
+                            f"purged {purged}, now {outbox_metrics()}")
+            except Exception:
+                if not options['loop']:
+                    raise
+                logger.exception("Sending the outbox failed")
+                connections.close_all()
+            if not options['loop']:
+                break
+            time.sleep(options['sleep'])
@@ -0,0 +1,35 @@
+# Generated by Django 3.2.24 on 2026-10-19 15:02
+
+from django.db import migrations, models
+import django.utils.timezone
+import jsonfield.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mainsite', '0022_auto_20240719_1627'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedEmail',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=255)),
+                ('body', models.TextField()),
+                ('html', models.BooleanField(default=False)),
+                ('to', jsonfield.fields.JSONField(default=list)),
+                ('bcc', jsonfield.fields.JSONField(default=list)),
+                ('status', models.CharField(choices=[('Pending', 'Pending'), ('Sent', 'Sent'), ('Failed', 'Failed')], default='Pending', max_length=254)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('send_after', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_error', models.TextField(blank=True, default=None, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, default=None, null=True)),
+            ],
+            options={
+                'index_together': {('status', 'send_after')},
+            },
+        ),
+    ]
@@ -12,7 +12,9 @@ from django.core.exceptions import ImproperlyConfigured, ValidationError
 from django.db import models, transaction
 from django.db.models import Manager, ProtectedError
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.deconstruct import deconstructible
+from jsonfield import JSONField
 from oauth2_provider.models import AccessToken
 from rest_framework.authtoken.models import Token
 
@@ -246,3 +248,38 @@ class SystemNotification(models.Model):
     )
     notification_type = models.CharField(max_length=254, choices=NOTIFICATION_TYPE_CHOICES, blank=False, null=False,
                                          default=NOTIFICATION_TYPE_INFO)
+
+
+class QueuedEmail(models.Model):
+    """
+    An email in the outbox. The mails are added by mainsite.outbox.queue_mail and sent by the send_queued_mail command,
+    so they survive restarts of the web workers.
+    """
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    html = models.BooleanField(default=False)
+    to = JSONField(default=list)
+    bcc = JSONField(default=list)
+
+    STATUS_PENDING = 'Pending'
+    STATUS_SENT = 'Sent'
+    STATUS_FAILED = 'Failed'
+    STATUS_CHOICES = (
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    )
+    status = models.CharField(max_length=254, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    send_after = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, null=True, default=None)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True, default=None)
+
+    class Meta:
+        index_together = (
+            ('status', 'send_after'),
+        )
+
+    def __str__(self):
+        return '{} {}'.format(self.status, self.subject)
@@ -0,0 +1,113 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import mail
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from mainsite.models import QueuedEmail
+
+logger = logging.getLogger('Badgr.Debug')
+
+
+def queued_email(subject, message, recipient_list=None, html_message=None, bcc=None):
+    """Returns an unsaved QueuedEmail with the same arguments as mainsite.utils.send_mail"""
+    from mainsite.utils import inline_css, open_mail_in_browser
+    if settings.LOCAL_DEVELOPMENT_MODE:
+        open_mail_in_browser(html_message)
+    if html_message:
+        return QueuedEmail(subject=subject, body=inline_css(html_message), html=True, to=recipient_list or [],
+                           bcc=bcc or [])
+    return QueuedEmail(subject=subject, body=message, to=recipient_list or [], bcc=bcc or [])
+
+
+def queue_mail(subject, message, recipient_list=None, html_message=None, bcc=None):
+    """Adds the mail to the outbox, it is sent by the send_queued_mail command once the transaction commits"""
+    email = queued_email(subject, message, recipient_list=recipient_list, html_message=html_message, bcc=bcc)
+    email.save()
+    return email
+
+
+def email_message(email, connection):
+    message = mail.EmailMessage(subject=email.subject, body=email.body, from_email=None, to=email.to,
+                                bcc=email.bcc, connection=connection)
+    if email.html:
+        message.content_subtype = 'html'
+    return message
+
+
+def retry_delay(attempts):
+    """Exponential backoff, the delay doubles with every failed attempt"""
+    return timedelta(seconds=settings.OUTBOX_RETRY_DELAY * 2 ** (attempts - 1))
+
+
+def send_queued_mail(batch_size=None, rate_limit=None, max_attempts=None):
+    """
+    Sends the pending mails that are due, batch_size at a time over one connection to the mail server. Pending mails
+    are locked while they are sent so workers running at the same time skip them. With rate_limit at most that many
+    mails are sent per second. Failed mails are retried with backoff until max_attempts. Returns the counts.
+    """
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    rate_limit = settings.OUTBOX_RATE_LIMIT if rate_limit is None else rate_limit
+    max_attempts = max_attempts or settings.OUTBOX_MAX_ATTEMPTS
+    counts = {'sent': 0, 'retried': 0, 'failed': 0}
+    while True:
+        started = time.monotonic()
+        with transaction.atomic():
+            batch = list(QueuedEmail.objects
+                         .select_for_update(skip_locked=True)
+                         .filter(status=QueuedEmail.STATUS_PENDING, send_after__lte=timezone.now())
+                         .order_by('send_after')[:batch_size])
+            if not batch:
+                break
+            sent = []
+            with mail.get_connection(fail_silently=False) as connection:
+                for email in batch:
+                    email.attempts += 1
+                    try:
+                        connection.send_messages([email_message(email, connection)])
+                    except Exception as e:
+                        # The next message opens a new connection
+                        connection.close()
+                        email.last_error = str(e)
+                        if email.attempts >= max_attempts:
+                            email.status = QueuedEmail.STATUS_FAILED
+                            counts['failed'] += 1
+                            logger.error(f"Giving up on mail {email.pk} after {email.attempts} attempts: {e}")
+                        else:
+                            email.send_after = timezone.now() + retry_delay(email.attempts)
+                            counts['retried'] += 1
+                        email.save(update_fields=['attempts', 'last_error', 'status', 'send_after'])
+                    else:
+                        email.status = QueuedEmail.STATUS_SENT
+                        email.sent_at = timezone.now()
+                        sent.append(email)
+            QueuedEmail.objects.bulk_update(sent, ['status', 'sent_at', 'attempts'])
+            counts['sent'] += len(sent)
+        if rate_limit:
+            remaining = len(batch) / rate_limit - (time.monotonic() - started)
+            if remaining > 0:
+                time.sleep(remaining)
+    return counts
+
+
+def purge_sent_mail(days=None):
+    """Deletes the sent mails older than OUTBOX_KEEP_DAYS"""
+    days = settings.OUTBOX_KEEP_DAYS if days is None else days
+    deleted, _ = QueuedEmail.objects.filter(status=QueuedEmail.STATUS_SENT,
+                                            sent_at__lt=timezone.now() - timedelta(days=days)).delete()
+    return deleted
+
+
+def outbox_metrics():
+    """The number of mails per status and the age in seconds of the oldest pending mail that is due"""
+    metrics = {status: 0 for status, _ in QueuedEmail.STATUS_CHOICES}
+    for row in QueuedEmail.objects.values('status').annotate(count=Count('id')).order_by():
+        metrics[row['status']] = row['count']
+    oldest = QueuedEmail.objects.filter(status=QueuedEmail.STATUS_PENDING, send_after__lte=timezone.now()) \
+        .aggregate(oldest=Min('send_after'))['oldest']
+    metrics['oldest_pending_seconds'] = int((timezone.now() - oldest).total_seconds()) if oldest else 0
+    return metrics
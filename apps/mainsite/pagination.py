@@ -1,9 +1,10 @@
 from collections import OrderedDict
 
 import more_itertools
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, InvalidToken
 from django.conf import settings
 from django.db import transaction
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import BasePagination
 from rest_framework.response import Response
 from rest_framework.utils.urls import replace_query_param
@@ -152,7 +153,7 @@ class EncryptedCursorPagination(BasePagination):
         if cursor.endswith(':'):
             return cursor[:-1], None
 
-        raise ValueError('Malformed cursor')
+        raise NotFound('Invalid cursor')
 
     def _get_elem_key(self, elem):
         """
@@ -173,13 +174,16 @@ class EncryptedCursorPagination(BasePagination):
 
     def _decrypt_cursor(self, encrypted):
         if encrypted is not None:
-            return self.crypto.decrypt(bytes(encrypted))
+            try:
+                return self.crypto.decrypt(bytes(encrypted, encoding='utf8')).decode('utf8')
+            except InvalidToken:
+                raise NotFound('Invalid cursor')
         else:
             return encrypted
 
     def _encrypt_cursor(self, decrypted):
         if decrypted is not None:
-            return self.crypto.encrypt(bytes(decrypted, encoding='utf8'))
+            return self.crypto.encrypt(bytes(decrypted, encoding='utf8')).decode('utf8')
         else:
             return decrypted
 
@@ -1,6 +1,8 @@
 import io
+import json
 
 from backports import csv
+from django.core.serializers.json import DjangoJSONEncoder
 from rest_framework import renderers
 
 
@@ -40,3 +42,40 @@ class CSVDictRenderer(renderers.BaseRenderer):
         writer.writerows(rows)
 
         return buff.getvalue().encode(self.charset)
+
+
+class Echo(object):
+    """
+    A file-like object that returns what is written to it, so a csv writer produces the rows for a stream
+    """
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(fieldnames, rows):
+    """Yields the header and every row dict as csv lines, without keeping the rows in memory"""
+    writer = csv.DictWriter(Echo(), fieldnames=fieldnames, extrasaction='ignore')
+    yield writer.writerow(dict(zip(fieldnames, fieldnames)))
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def stream_ndjson(rows):
+    """Yields every row dict as a line of json"""
+    for row in rows:
+        yield json.dumps(row, cls=DjangoJSONEncoder) + '\n'
+
+
+def stream_json(data, lists):
+    """
+    Yields a json object with the items of data and the lists, the lists are iterables of dicts that are written
+    item by item so they never have to be in memory as a whole
+    """
+    yield json.dumps(data, cls=DjangoJSONEncoder)[:-1]
+    for index, (name, items) in enumerate(lists.items()):
+        yield '{}{}: ['.format(', ' if data or index else '', json.dumps(name))
+        for position, item in enumerate(items):
+            yield (', ' if position else '') + json.dumps(item, cls=DjangoJSONEncoder)
+        yield ']'
+    yield '}'
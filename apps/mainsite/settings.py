@@ -201,6 +201,9 @@ EDUID_API_BASE_URL = os.environ.get('EDUID_API_BASE_URL', 'https://login.test.ed
 EDUID_IDENTIFIER = os.environ.get('EDUID_IDENTIFIER', 'eduid')
 
 DIRECT_AWARDS_DELETION_THRESHOLD_DAYS = int(os.environ.get('DIRECT_AWARDS_DELETION_THRESHOLD_DAYS', 30))
+# Unaccepted direct awards get a reminder and expire this many days after they were created or resent
+DIRECT_AWARDS_REMINDER_DAYS = int(os.environ.get('DIRECT_AWARDS_REMINDER_DAYS', 150))
+DIRECT_AWARDS_EXPIRATION_DAYS = int(os.environ.get('DIRECT_AWARDS_EXPIRATION_DAYS', 180))
 OB3_API_URL = os.environ.get('OB3_API_URL', 'http://poc4.educredentials.eu:3033')
 
 # If you have an informational front page outside the Django site that can link back to '/login', specify it here
@@ -512,7 +515,8 @@ CELERY_ACCEPT_CONTENT = ['json']
 
 from cryptography.fernet import Fernet
 
-PAGINATION_SECRET_KEY = Fernet.generate_key()
+# The cursors of EncryptedCursorPagination must be readable by every process, base64-encoded 32 byte random string
+PAGINATION_SECRET_KEY = os.environ['PAGINATION_SECRET_KEY']
 AUTHCODE_SECRET_KEY = Fernet.generate_key()
 
 AUTHCODE_EXPIRES_SECONDS = 600  # needs to be long enough to fetch information from socialauth providers
@@ -574,6 +578,32 @@ LOCAL_DEVELOPMENT_MODE = legacy_boolean_parsing('LOCAL_DEVELOPMENT_MODE', '0')
 SUPERUSER_LOGIN_WITH_SURFCONEXT = legacy_boolean_parsing('SUPERUSER_LOGIN_WITH_SURFCONEXT', '0')
 
 VALIDATOR_URL = os.environ.get('VALIDATOR_URL', 'http://localhost:5000')
+VALIDATOR_TIMEOUT = int(os.environ.get('VALIDATOR_TIMEOUT', 10))
+VALIDATOR_CACHE_TIMEOUT = int(os.environ.get('VALIDATOR_CACHE_TIMEOUT', 60 * 60 * 24))
+VALIDATOR_CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('VALIDATOR_CIRCUIT_FAILURE_THRESHOLD', 5))
+VALIDATOR_CIRCUIT_RESET_TIMEOUT = int(os.environ.get('VALIDATOR_CIRCUIT_RESET_TIMEOUT', 60))
+# Verify assertions hosted by this server locally, only imported assertions are sent to the VALIDATOR_URL
+LOCAL_ASSERTION_VERIFICATION = legacy_boolean_parsing('LOCAL_ASSERTION_VERIFICATION', '1')
+
+# Legacy slug urls that do not resolve to an entity_id are remembered for this many seconds
+SLUG_REDIRECT_NOT_FOUND_CACHE_TIMEOUT = int(os.environ.get('SLUG_REDIRECT_NOT_FOUND_CACHE_TIMEOUT', 60 * 60))
+# Insights reports are cached for INSIGHTS_CACHE_TIMEOUT seconds, 0 disables the cache. Stale reports are served for
+# INSIGHTS_CACHE_STALE_TIMEOUT seconds longer while they are recomputed in the background, 0 recomputes them in the request
+INSIGHTS_CACHE_TIMEOUT = int(os.environ.get('INSIGHTS_CACHE_TIMEOUT', 60 * 5))
+INSIGHTS_CACHE_STALE_TIMEOUT = int(os.environ.get('INSIGHTS_CACHE_STALE_TIMEOUT', 60 * 60))
+# The incremental refresh of the insights rollups does not see deleted rows or moved issuers and faculties, the
+# refresh_insights command recounts the rollups completely when the last full recount is older than this many days
+INSIGHTS_FULL_REFRESH_DAYS = int(os.environ.get('INSIGHTS_FULL_REFRESH_DAYS', 7))
+# The outbox is sent in batches of OUTBOX_BATCH_SIZE mails at no more than OUTBOX_RATE_LIMIT mails per second, 0 is
+# unlimited. Failed mails are retried after OUTBOX_RETRY_DELAY seconds, doubling every attempt, until
+# OUTBOX_MAX_ATTEMPTS. Sent mails are kept for OUTBOX_KEEP_DAYS days
+OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', 100))
+OUTBOX_RATE_LIMIT = int(os.environ.get('OUTBOX_RATE_LIMIT', 10))
+OUTBOX_RETRY_DELAY = int(os.environ.get('OUTBOX_RETRY_DELAY', 60))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get('OUTBOX_MAX_ATTEMPTS', 5))
+OUTBOX_KEEP_DAYS = int(os.environ.get('OUTBOX_KEEP_DAYS', 7))
+# The badgeclass images with the example overlay in the mails are cached for this many seconds
+EMAIL_EXAMPLE_IMAGE_CACHE_TIMEOUT = int(os.environ.get('EMAIL_EXAMPLE_IMAGE_CACHE_TIMEOUT', 60 * 60 * 24))
 EXTENSIONS_ROOT_URL = os.environ.get('EXTENSIONS_ROOT_URL', 'http://127.0.0.1:8000/static')
 
 
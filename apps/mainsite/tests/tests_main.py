@@ -1,4 +1,11 @@
+import json
+
+from django.core import mail
+
+from mainsite.models import QueuedEmail
+from mainsite.outbox import outbox_metrics, queue_mail, send_queued_mail
 from mainsite.tests import BadgrTestCase
+from mainsite.utils import EmailMessageMaker, InlinedHtml, inline_css
 
 
 class MainGrapheneTest(BadgrTestCase):
@@ -47,3 +54,59 @@ class MainGrapheneTest(BadgrTestCase):
                                    response['data']['badgeClass']['assertionsPaginated']['edges']]
         self.assertEqual(assertions_entity_ids_2.__len__(), 3)
         self.assertFalse(all(entity_id in assertions_entity_ids_1 for entity_id in assertions_entity_ids_2))
+
+
+class OutboxTest(BadgrTestCase):
+
+    def test_direct_award_notifications_are_queued(self):
+        teacher1 = self.setup_teacher(authenticate=True)
+        self.setup_staff_membership(teacher1, teacher1.institution, may_award=True)
+        badgeclass = self.setup_badgeclass(issuer=self.setup_issuer(created_by=teacher1))
+        post_data = {'badgeclass': badgeclass.entity_id,
+                     'batch_mode': False,
+                     'notify_recipients': True,
+                     'direct_awards': [{'recipient_email': 'some@email.com', 'eppn': 'some_eppn'},
+                                       {'recipient_email': 'some@email2.com', 'eppn': 'some_eppn2'}]}
+        response = self.client.post('/directaward/create', json.dumps(post_data), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(QueuedEmail.objects.filter(status=QueuedEmail.STATUS_PENDING).count(), 2)
+        counts = send_queued_mail(batch_size=1, rate_limit=0)
+        self.assertEqual(counts, {'sent': 2, 'retried': 0, 'failed': 0})
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['some@email.com', 'some@email2.com'])
+        self.assertEqual(mail.outbox[0].content_subtype, 'html')
+        self.assertEqual(outbox_metrics()[QueuedEmail.STATUS_SENT], 2)
+
+    def test_failed_mail_is_retried(self):
+        # A newline in the subject makes the mail backend raise BadHeaderError
+        email = queue_mail(subject='Broken\nsubject', message='Body', recipient_list=['some@email.com'])
+        queue_mail(subject='Subject', message='Body', recipient_list=['other@email.com'])
+        self.assertEqual(send_queued_mail(rate_limit=0, max_attempts=2), {'sent': 1, 'retried': 1, 'failed': 0})
+        email.refresh_from_db()
+        self.assertEqual(email.attempts, 1)
+        self.assertEqual(email.status, QueuedEmail.STATUS_PENDING)
+        # Not due until the backoff has passed
+        self.assertEqual(send_queued_mail(rate_limit=0, max_attempts=2), {'sent': 0, 'retried': 0, 'failed': 0})
+        QueuedEmail.objects.filter(pk=email.pk).update(send_after=email.created_at)
+        self.assertEqual(send_queued_mail(rate_limit=0, max_attempts=2), {'sent': 0, 'retried': 0, 'failed': 1})
+        email.refresh_from_db()
+        self.assertEqual(email.status, QueuedEmail.STATUS_FAILED)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class EmailMessageMakerTest(BadgrTestCase):
+
+    def test_earned_badge_mail_is_inlined_once(self):
+        teacher1 = self.setup_teacher()
+        badgeclass = self.setup_badgeclass(issuer=self.setup_issuer(created_by=teacher1))
+        assertion = self.setup_assertion(recipient=self.setup_student(), badgeclass=badgeclass, created_by=teacher1)
+        other_assertion = self.setup_assertion(recipient=self.setup_student(), badgeclass=badgeclass,
+                                               created_by=teacher1)
+        html = EmailMessageMaker.create_earned_badge_mail(assertion)
+        other_html = EmailMessageMaker.create_earned_badge_mail(other_assertion)
+        self.assertIsInstance(html, InlinedHtml)
+        self.assertIs(inline_css(html), html)
+        self.assertIn(f'href="{assertion.student_url}"', html)
+        self.assertIn(f'href="{other_assertion.student_url}"', other_html)
+        self.assertEqual(html.replace(assertion.student_url, ''), other_html.replace(other_assertion.student_url, ''))
+        self.assertIn('style="', html)
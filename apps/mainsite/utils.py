@@ -23,15 +23,18 @@ from PIL import Image, ImageDraw, ImageFont, ImageEnhance
 from django.conf import settings
 from django.contrib.staticfiles import finders
 from django.core import mail
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
 from django.core.files.storage import DefaultStorage, default_storage
 from django.core.files.uploadedfile import InMemoryUploadedFile
 from django.template.loader import render_to_string
 from django.urls import get_callable, reverse
-from django.utils.html import format_html
+from django.utils.html import conditional_escape, format_html
 from premailer import transform
 from resizeimage.resizeimage import resize_contain
 
+from cachemodel.utils import generate_cache_key
+
 slugify_function_path = \
     getattr(settings, 'AUTOSLUG_SLUGIFY_FUNCTION', 'autoslug.utils.slugify')
 
@@ -147,10 +150,58 @@ def open_mail_in_browser(html):
     webbrowser.open("file://" + path)
 
 
+class InlinedHtml(str):
+    """Html of which the css has already been inlined"""
+
+
+# The inlined html of recent mails, keyed on the sha256 of the html so the html itself is not kept as well
+_inlined_html = {}
+INLINED_HTML_CACHE_SIZE = 32
+
+
+def inline_css(html):
+    """
+    Inlines the css of the html with premailer. Mails to many recipients are often identical, so the results for
+    recent html are kept.
+    """
+    if isinstance(html, InlinedHtml):
+        return html
+    digest = hashlib.sha256(html.encode('utf-8')).digest()
+    inlined = _inlined_html.get(digest)
+    if inlined is None:
+        if len(_inlined_html) >= INLINED_HTML_CACHE_SIZE:
+            _inlined_html.clear()
+        inlined = _inlined_html[digest] = transform(html)
+    return inlined
+
+
+def render_inlined(template, email_vars, recipient_vars):
+    """
+    Renders the template and inlines its css once for all recipients, only the recipient_vars are substituted per
+    recipient. The recipient_vars must be used as plain {{ variables }} in the template.
+    """
+    placeholders = {name: f'recipient-var-{name}' for name in recipient_vars}
+    html = inline_css(render_to_string(template, {**email_vars, **placeholders}))
+    for name, value in recipient_vars.items():
+        html = html.replace(placeholders[name], conditional_escape(value))
+    return InlinedHtml(html)
+
+
 class EmailMessageMaker:
 
     @staticmethod
     def _create_example_image(badgeclass):
+        """The data uri of the badgeclass image with the example overlay, cached until the image changes"""
+        key = generate_cache_key(['EmailMessageMaker', 'example_image'], pk=badgeclass.pk,
+                                 image=badgeclass.image.name)
+        data_uri = cache.get(key)
+        if data_uri is None:
+            data_uri = EmailMessageMaker._encode_example_image(badgeclass)
+            cache.set(key, data_uri, settings.EMAIL_EXAMPLE_IMAGE_CACHE_TIMEOUT)
+        return data_uri
+
+    @staticmethod
+    def _encode_example_image(badgeclass):
         path = badgeclass.image.path
         if path.endswith('.svg'):
             with open(path, 'rb') as input_svg:
@@ -197,10 +248,9 @@ class EmailMessageMaker:
         template = 'email/awarded_badge_deleted.html'
         email_vars = {'public_badge_url': direct_award.badgeclass.public_url,
                       'badgeclass_name': direct_award.badgeclass.name,
-                      'recipient_name': direct_award.recipient_email,
                       'ui_url': urllib.parse.urljoin(settings.UI_URL, 'archived'),
                       'revocation_reason': direct_award.revocation_reason}
-        return render_to_string(template, email_vars)
+        return render_inlined(template, email_vars, {'recipient_name': direct_award.recipient_email})
 
     @staticmethod
     def create_staff_rights_changed_email(staff_membership):
@@ -344,11 +394,10 @@ class EmailMessageMaker:
             'issuer_image': badgeclass.issuer.image_url(),
             'issuer_name': badgeclass.issuer.name,
             'faculty_name': badgeclass.issuer.faculty.name,
-            'assertion_url': assertion.student_url,
             'badgeclass_description': badgeclass.description,
             'badgeclass_name': badgeclass.name,
         }
-        return render_to_string(template, email_vars)
+        return render_inlined(template, email_vars, {'assertion_url': assertion.student_url})
 
     @staticmethod
     def create_direct_award_bundle_mail(direct_award_bundle):
@@ -400,7 +449,7 @@ def send_mail(subject, message, recipient_list=None, html_message=None, bcc=None
     if settings.LOCAL_DEVELOPMENT_MODE:
         open_mail_in_browser(html_message)
     if html_message:
-        html_with_inline_css = transform(html_message)
+        html_with_inline_css = inline_css(html_message)
         msg = mail.EmailMessage(subject=subject, body=html_with_inline_css, from_email=None, to=recipient_list, bcc=bcc)
         msg.content_subtype = "html"
         msg.send()
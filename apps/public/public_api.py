@@ -7,6 +7,7 @@ import cairosvg
 import requests
 from PIL import Image
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.storage import DefaultStorage
 from django.http import Http404, HttpResponseRedirect
 from django.shortcuts import redirect, render
@@ -19,10 +20,13 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 import badgrlog
+from cachemodel import CACHE_FOREVER_TIMEOUT
+from cachemodel.utils import generate_cache_key
 from entity.api import VersionedObjectMixin, BaseEntityDetailView
 from institution.models import Institution
 from issuer import utils
 from issuer.models import Issuer, BadgeClass, BadgeInstance
+from issuer.validation import ValidatorUnavailable
 from mainsite.exceptions import BadgrApiException400
 from mainsite.models import BadgrApp
 from mainsite.utils import OriginSetting
@@ -42,20 +46,36 @@ class AssertionValidate(BaseEntityDetailView):
     def get(self, request, **kwargs):
         assertion = self.get_object(request, **kwargs)
         if assertion.public:
-            return Response(assertion.validate(), status=status.HTTP_200_OK)
+            try:
+                return Response(assertion.validate(), status=status.HTTP_200_OK)
+            except ValidatorUnavailable:
+                return Response({'detail': 'Validator is unavailable, please try again later'},
+                                status=status.HTTP_503_SERVICE_UNAVAILABLE)
         else:
             raise Http404
 
 
 class SlugToEntityIdRedirectMixin(object):
     slugToEntityIdRedirect = False
+    # cached for slugs that do not exist, as None is a cache miss
+    SLUG_NOT_FOUND = ''
 
-    def get_entity_id_by_slug(self, slug):
-        try:
-            object = self.model.cached.get(slug=slug)
-            return getattr(object, 'entity_id', None)
-        except self.model.DoesNotExist:
+    def _lookup_entity_id_by_slug(self, slug):
+        # the slug columns of most entities have been removed, those can never match a legacy slug
+        if 'slug' not in [field.name for field in self.model._meta.get_fields()]:
             return None
+        return self.model.objects.filter(slug=slug).values_list('entity_id', flat=True).first()
+
+    def get_entity_id_by_slug(self, slug):
+        key = generate_cache_key([self.model.__name__, 'slug_entity_id'], slug=slug)
+        entity_id = cache.get(key)
+        if entity_id is None:
+            entity_id = self._lookup_entity_id_by_slug(slug)
+            if entity_id is None:
+                cache.set(key, self.SLUG_NOT_FOUND, settings.SLUG_REDIRECT_NOT_FOUND_CACHE_TIMEOUT)
+            else:
+                cache.set(key, entity_id, CACHE_FOREVER_TIMEOUT)
+        return entity_id or None
 
     def get_slug_to_entity_id_redirect_url(self, slug):
         try:
@@ -404,7 +424,7 @@ class BadgeClassJson(JSONComponentView):
                                                                 expand_institution=True,
                                                                 expand_awards=expand_awards)
         if 'endorsements' in expands:
-            json['endorsements'] = [self.endorsement_to_json(bc) for bc in badge_class.cached_endorsements()]
+            json['endorsements'] = badge_class.cached_endorsements_json()
             json['endorsed'] = [endorsement.endorsee.entity_id for endorsement in badge_class.cached_endorsed()]
         if 'micro' in expands:
             json['participation'] = badge_class.participation
@@ -429,8 +449,9 @@ class BadgeClassJson(JSONComponentView):
 
     @staticmethod
     def endorsement_to_json(endorsement):
+        # endorser, issuer, faculty and institution are joined in BadgeClass.cached_endorsements
         endorser = endorsement.endorser
-        issuer = endorser.cached_issuer
+        issuer = endorser.issuer
         faculty = issuer.faculty
         institution = faculty.institution
         to_json = {'claim': endorsement.claim,